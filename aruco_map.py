@@ -1,53 +1,69 @@
-PLAYER1_GUESS_CONFIRM = 100
-PLAYER2_GUESS_CONFIRM = 101
+import numpy as np
+
+from events import DEBUG, WARNING, events
+from geometry import CONFIRM, MAX_ARUCO_ID, TABLE, X_DIAL, Y_DIAL
+
+PLAYER1_GUESS_CONFIRM = TABLE.dial_ids[1][CONFIRM]
+PLAYER2_GUESS_CONFIRM = TABLE.dial_ids[2][CONFIRM]
 
 # Note that these are the arucos, that player x will be able to guess on
 # Note that when the player is sitting opposite, it will flip the y values, so 13 in airtable system
 # will be 0 for the player
-PLAYER1_VERTICAL_Y_COORD_TO_ARUCO_ID = {
-    10: 13,
-    11: 12,
-    12: 11,
-    13: 10,
-    14: 9,
-    15: 8,
-    16: 7,
-}
-PLAYER1_HORIZONTAL_X_COORD_TO_ARUCO_ID = {
-    17: 0,
-    18: 1,
-    19: 2,
-    20: 3,
-    21: 4,
-    22: 5,
-    23: 6,
-    24: 7,
-    25: 8,
-    26: 9,
-    27: 10,
-    28: 11,
-}
-
-PLAYER2_VERTICAL_Y_COORD_TO_ARUCO_ID = {
-    30: 0,
-    31: 1,
-    32: 2,
-    33: 3,
-    34: 4,
-    35: 5,
-    36: 6,
-}
-PLAYER2_HORIZONTAL_X_COORD_TO_ARUCO_ID = {
-    37: 11,
-    38: 10,
-    39: 9,
-    40: 8,
-    41: 7,
-    42: 6,
-    43: 5,
-    44: 4,
-    45: 3,
-    46: 2,
-    47: 1,
-    48: 0,
-}
+# The dials map the aruco id to the coordinate, as laid out by the table geometry
+PLAYER1_VERTICAL_Y_COORD_TO_ARUCO_ID = TABLE.dial(1, X_DIAL)
+PLAYER1_HORIZONTAL_X_COORD_TO_ARUCO_ID = TABLE.dial(1, Y_DIAL)
+PLAYER2_VERTICAL_Y_COORD_TO_ARUCO_ID = TABLE.dial(2, X_DIAL)
+PLAYER2_HORIZONTAL_X_COORD_TO_ARUCO_ID = TABLE.dial(2, Y_DIAL)
+
+# Dense decode table of the geometry, indexed by aruco id.
+# Every row is (player, axis, value) with player 0 for ids not on any dial.
+# Axis X_DIAL sets x of the guess, Y_DIAL sets y and CONFIRM confirms it.
+DECODE = TABLE.decode
+
+
+def decode_dials(
+    ids: list[int], ambiguous: set[int] | None = None
+) -> dict[int, tuple[tuple[int, int] | None, bool]]:
+    """
+    Decodes the dials of both players from the ids of the detected arucos.
+
+    Returns the player to the coordinate their dials show and whether it is confirmed.
+    The coordinate is None unless exactly one marker of each of their dials is detected.
+
+    ambiguous holds the players whose dials showed more than one marker at the
+    previous decode and is updated in place, so the warning is only emitted
+    when a dial becomes ambiguous rather than on every frame.
+    """
+    if ambiguous is None:
+        ambiguous = set()
+    ids = np.asarray(ids, dtype=np.int64)
+    rows = DECODE[ids[(ids >= 0) & (ids < MAX_ARUCO_ID)]]
+    rows = rows[rows[:, 0] > 0]
+    # one slot per player and axis
+    slots = (rows[:, 0].astype(np.int64) - 1) * 3 + rows[:, 1]
+    counts = np.bincount(slots, minlength=6)
+    values = np.zeros(6, dtype=np.int64)
+    values[slots] = rows[:, 2]
+
+    dials = {}
+    for player in (1, 2):
+        x_slot = (player - 1) * 3 + X_DIAL
+        y_slot = (player - 1) * 3 + Y_DIAL
+        coord = None
+        if counts[x_slot] == 1 and counts[y_slot] == 1:
+            coord = (int(values[x_slot]), int(values[y_slot]))
+        if counts[x_slot] > 1 or counts[y_slot] > 1:
+            if player not in ambiguous:
+                ambiguous.add(player)
+                events.emit(
+                    "detection_failure", f"More than one marker found on a dial of player {player}: {ids.tolist()}", WARNING,
+                    reason="ambiguous_dial", player=player, ids=ids.tolist(),
+                )
+        elif player in ambiguous:
+            ambiguous.discard(player)
+            events.emit(
+                "detection_recovered", f"The dials of player {player} show one marker each again", DEBUG,
+                reason="ambiguous_dial", player=player,
+            )
+        dials[player] = (coord, bool(counts[(player - 1) * 3 + CONFIRM]))
+    return dials
@@ -1,12 +1,14 @@
 from enum import Enum
-from typing import Literal
+from typing import TYPE_CHECKING, Literal
 
-from hardware_variables import Port, TableActive
+from events import DEBUG, events
 from shift_valves import Table
 
-if TableActive:
-    t = Table(Port)
-    t.clear()
+if TYPE_CHECKING:
+    from journal import GameJournal
+
+# guesses are journaled and sent as int16, so larger coordinates can not be recorded
+COORD_LIMIT = 2**15 - 1
 
 AVAILABLE_SHIPS = {
     2: 1,
@@ -16,6 +18,13 @@ AVAILABLE_SHIPS = {
 }
 
 
+def in_coord_range(coord: tuple[int, int]) -> bool:
+    """
+    Returns True if the coordinate fits the int16 fields guesses are journaled and sent in.
+    """
+    return all(-COORD_LIMIT <= value <= COORD_LIMIT for value in coord)
+
+
 class GuessReturn(Enum):
     hit = "hit"
     miss = "miss"
@@ -67,30 +76,45 @@ class Game:
     board_size is given as the dimensions of the board being played.
 
     ships are given as a list of Ship objects.
+
+    table is the air table the valves are fired on, if any.
+
+    journal records every state transition of the game, if given.
     """
 
-    def __init__(self, board_size: tuple[int, int], ships: list[Ship]) -> None:
+    def __init__(
+        self,
+        board_size: tuple[int, int],
+        ships: list[Ship],
+        table: Table | None = None,
+        journal: "GameJournal | None" = None,
+    ) -> None:
         self.width, self.height = board_size
+        self.ships = ships
+        self.journal = journal
+        self.moves: list[tuple[int, tuple[int, int], GuessReturn]] = []
         self.p1_board = PlayerBoard(
             (0, self.width // 2 - 1),
             (0, self.height - 1),
             [ship for ship in ships if ship.player == 1],
             1,
+            table,
         )
         self.p2_board = PlayerBoard(
             (self.width // 2, self.width - 1),
             (0, self.height - 1),
             [ship for ship in ships if ship.player == 2],
             2,
+            table,
         )
+        if self.journal is not None:
+            self.journal.start(board_size, ships)
         self.alternate = self.alternator()
         self.switch_turn()
-        print(self.width)
-        print(self.height)
-        print(self.p1_board.x)
-        print(self.p1_board.y)
-        print(self.p2_board.x)
-        print(self.p2_board.y)
+        events.debug(
+            f"Game of {self.width}x{self.height}, boards {self.p1_board.x}x{self.p1_board.y} and {self.p2_board.x}x{self.p2_board.y}",
+            "game_started", width=self.width, height=self.height, ships=len(ships),
+        )
 
     def alternator(self):
         """
@@ -105,6 +129,8 @@ class Game:
         Switches the turn
         """
         self.current_board = next(self.alternate)
+        if self.journal is not None:
+            self.journal.turn(self.current_player())
 
     def current_player(self) -> Literal[1, 2]:
         """
@@ -121,21 +147,32 @@ class Game:
     def make_guess(self, guess: tuple[int, int]) -> GuessReturn:
         """
         Places the guess on the current board.
+        A guess beyond COORD_LIMIT is rejected as out of bounds before it is recorded.
         
         Returns the game state the guess led to.
         """
+        player = self.current_player()
+        if not in_coord_range(guess):
+            events.warning(f"The guess {guess} is out of range", "out_of_bounds", player=player, guess=guess)
+            return GuessReturn.out_of_bounds
+        if self.journal is not None:
+            self.journal.guess(player, guess)
         game_state = self.current_board.make_guess(guess)
+        self.moves.append((player, guess, game_state))
+        if self.journal is not None:
+            self.journal.result(game_state)
         match game_state:
             case GuessReturn.out_of_bounds:
-                print(f"The guess was {guess}")
-                return game_state
+                events.warning(f"The guess was {guess}", "out_of_bounds", player=player, guess=guess)
             case GuessReturn.dupe_guess:
-                return game_state
+                pass
             case GuessReturn.finished_game:
-                return game_state
+                pass
             case _:
                 self.switch_turn()
-                return game_state
+        if self.journal is not None:
+            self.journal.checkpoint(self)
+        return game_state
 
 
 class PlayerBoard:
@@ -145,15 +182,19 @@ class PlayerBoard:
         height: tuple[int, int],
         ships: list[Ship],
         player_num: int,
+        table: Table | None = None,
     ) -> None:
         """
         ships are given as a list of Ship objects.
 
         player_num identifies which player the board belongs to.
+
+        table is the air table the valves are fired on, if any.
         """
         self.x = width
         self.y = height
         self.player_num = player_num
+        self.table = table
         self.ships = ships
         self.dead_ships = []
         self.guesses: set[tuple[int, int]] = set()
@@ -196,16 +237,16 @@ class PlayerBoard:
 
         self.guesses.add(coord)
 
-        if TableActive:
-            t.burst(coord)
+        if self.table is not None:
+            self.table.burst(coord)
         else:
-            print(coord)
+            events.emit("valve", f"No table to fire valve {coord}", DEBUG, coord=coord, open=True)
 
         if self.board.get(coord) is not None:
             self.board[coord].lives -= 1
             if self.board[coord].lives == 0:
                 self.dead_ships.append(self.board[coord])
-                print("A ship has been sunk")
+                events.info("A ship has been sunk", "ship_sunk", coord=coord, sections=sorted(self.board[coord].filled))
 
         if len(self.dead_ships) == len(self.ships):
             return GuessReturn.finished_game
@@ -0,0 +1,198 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+COORD = tuple[int, int]
+
+# hole areas in pixels used until a camera is calibrated
+DEFAULT_HOLE_AREA = (10.0, 100.0)
+
+
+class CalibrationProfile:
+    """
+    Calibration of one camera of a table, stored as JSON so it is loaded at once on startup.
+
+    homography maps board coordinates to image coordinates, so the cells are known without
+    counting holes. hsv_ranges are the bounds of the peg colors that were on the board while
+    calibrating, taken from the pixels of those pegs. hole_area are the bounds of the area of the holes.
+    Holes and pegs are only searched for within board_roi.
+    markers and brightness are what the camera saw while calibrating, to notice drift.
+    """
+
+    def __init__(
+        self,
+        homography: np.ndarray,
+        hsv_ranges: dict[str, tuple[np.ndarray, np.ndarray]],
+        hole_area: tuple[float, float],
+        board_roi: tuple[int, int, int, int],
+        pitch: float,
+        markers: dict[int, tuple[float, float]],
+        brightness: float,
+    ) -> None:
+        self.homography = homography
+        self.inverse = np.linalg.inv(homography)
+        self.hsv_ranges = hsv_ranges
+        self.hole_area = hole_area
+        self.board_roi = board_roi
+        self.pitch = pitch
+        self.markers = markers
+        self.brightness = brightness
+
+    @classmethod
+    def load(cls, path: str) -> "CalibrationProfile | None":
+        """
+        Returns the profile stored at path, or None if there is none.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        return cls(
+            np.array(data["homography"]),
+            {
+                color: (np.array(lower, dtype=np.uint8), np.array(upper, dtype=np.uint8))
+                for color, (lower, upper) in data["hsv_ranges"].items()
+            },
+            tuple(data["hole_area"]),
+            tuple(data["board_roi"]),
+            data["pitch"],
+            {int(id): tuple(center) for id, center in data["markers"].items()},
+            data["brightness"],
+        )
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "homography": self.homography.tolist(),
+                    "hsv_ranges": {
+                        color: [lower.tolist(), upper.tolist()]
+                        for color, (lower, upper) in self.hsv_ranges.items()
+                    },
+                    "hole_area": list(self.hole_area),
+                    "board_roi": list(self.board_roi),
+                    "pitch": self.pitch,
+                    "markers": {str(id): list(center) for id, center in self.markers.items()},
+                    "brightness": self.brightness,
+                },
+                f,
+                indent=2,
+            )
+
+    @classmethod
+    def from_frame(cls, frame, board_size: COORD) -> "CalibrationProfile | None":
+        """
+        Calibrates from an uncalibrated frame, on which every hole and peg in view must be found.
+
+        Returns the profile, or None if the cells could not be located.
+        """
+        cells = frame.cell_centers(board_size)
+        if cells is None or len(cells) < 4:
+            return None
+        coords = np.float32(list(cells))
+        centers = np.float32([cells[coord] for coord in cells])
+        homography, _ = cv2.findHomography(coords, centers)
+        if homography is None:
+            return None
+        distances = np.linalg.norm(centers[:, None] - centers[None, :], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        pitch = float(np.median(distances.min(axis=1)))
+
+        height, width = frame.image.shape[:2]
+        x0, y0 = np.maximum(centers.min(axis=0) - pitch, 0).astype(int)
+        x1, y1 = np.minimum(centers.max(axis=0) + pitch, (width, height)).astype(int)
+        board_roi = (int(x0), int(y0), int(x1), int(y1))
+
+        # the holes are the blobs of any size close to the cell centers
+        keypoints = frame.camera.detect_hole_keypoints(frame.image, (2.0, pitch * pitch))
+        areas = [
+            np.pi * (kp.size / 2) ** 2
+            for kp in keypoints
+            if np.linalg.norm(centers - kp.pt, axis=1).min() < pitch / 4
+        ]
+        hole_area = (float(min(areas)) * 0.5, float(max(areas)) * 1.5) if areas else DEFAULT_HOLE_AREA
+
+        hsv = cv2.cvtColor(frame.image, cv2.COLOR_BGR2HSV)
+        hsv_ranges = {}
+        for color, pegs in frame.colors().items():
+            hsv_ranges[color] = peg_hsv_range(hsv, pegs, max(2, int(pitch / 6)))
+
+        markers = {
+            id: tuple(float(v) for v in corners.reshape(-1, 2).mean(axis=0))
+            for id, corners in frame.markers().items()
+        }
+        return cls(
+            homography, hsv_ranges, hole_area, board_roi, pitch, markers, board_brightness(frame.image, board_roi)
+        )
+
+    def cell_centers(self, columns: range, rows: int) -> dict[COORD, COORD]:
+        """
+        Returns the board coordinate to the image coordinate of every cell in the columns.
+        """
+        coords = [(x, y) for x in columns for y in range(rows)]
+        points = cv2.perspectiveTransform(np.float32(coords).reshape(-1, 1, 2), self.homography)
+        return {coord: (int(round(p[0])), int(round(p[1]))) for coord, p in zip(coords, points.reshape(-1, 2))}
+
+    def board_coord(self, point: tuple[float, float]) -> COORD:
+        """
+        Returns the board coordinate of the cell closest to the image coordinate.
+        """
+        x, y = cv2.perspectiveTransform(np.float32([[point]]), self.inverse)[0, 0]
+        return int(round(x)), int(round(y))
+
+    def drift(self, frame) -> str | None:
+        """
+        Checks the frame against the calibration, using the markers already detected on it
+        and the mean brightness of the board on a downscaled copy.
+
+        Returns the reason the camera needs calibrating again, or None.
+        """
+        for id, corners in frame.markers().items():
+            center = corners.reshape(-1, 2).mean(axis=0)
+            if id not in self.markers:
+                # dials show markers at places that may not have been in view while calibrating
+                self.markers[id] = tuple(float(v) for v in center)
+                continue
+            moved = float(np.linalg.norm(center - self.markers[id]))
+            if moved > self.pitch / 2:
+                return f"marker {id} moved by {moved:.0f} pixels"
+        brightness = board_brightness(frame.image, self.board_roi)
+        change = brightness / max(self.brightness, 1.0) - 1
+        if abs(change) > 0.2:
+            return f"lighting changed by {change * 100:+.0f}%"
+        return None
+
+
+def peg_hsv_range(hsv: np.ndarray, pegs: list[COORD], radius: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Derives HSV bounds of a color from the histograms of the pixels around its pegs.
+
+    Hues of red wrap around 180, so they are counted from the wrap and the lower bound clamped at 0.
+    """
+    mask = np.zeros(hsv.shape[:2], dtype=np.uint8)
+    for center in pegs:
+        cv2.circle(mask, center, radius, 255, -1)
+    pixels = hsv[mask > 0].astype(np.int64)
+    hues = pixels[:, 0]
+    if np.mean(hues > 160) > 0.05:
+        hues = np.where(hues > 90, hues - 180, hues)
+    bounds = []
+    for values in (hues, pixels[:, 1], pixels[:, 2]):
+        cumulative = np.cumsum(np.bincount(values - values.min()))
+        low = values.min() + np.searchsorted(cumulative, cumulative[-1] * 0.02)
+        high = values.min() + np.searchsorted(cumulative, cumulative[-1] * 0.98)
+        bounds.append((low, high))
+    (h_low, h_high), (s_low, _), (v_low, _) = bounds
+    lower = np.array([max(0, h_low - 5), max(0, s_low - 40), max(0, v_low - 50)], dtype=np.uint8)
+    upper = np.array([min(179, h_high + 5), 255, 255], dtype=np.uint8)
+    return lower, upper
+
+
+def board_brightness(image: np.ndarray, roi: tuple[int, int, int, int]) -> float:
+    x0, y0, x1, y1 = roi
+    small = cv2.resize(image[y0:y1, x0:x1], None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
+    return float(small.mean())
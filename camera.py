@@ -1,9 +1,16 @@
-from datetime import datetime
+import queue
+import threading
+import time
 import cv2
 import imutils
 import numpy as np
 from cv2 import aruco, typing
 
+from calibration import DEFAULT_HOLE_AREA, CalibrationProfile
+from capture_config import CaptureConfig, decode_frame, negotiated, open_capture
+from events import WARNING, events
+from metrics import metrics
+
 COLOR_TO_BGR = {
     "blue": (255, 20, 20),
     "magenta": (236, 0, 252),
@@ -11,6 +18,64 @@ COLOR_TO_BGR = {
     "red": (20, 20, 255),
 }
 
+# lower and upper HSV bounds of the pegs of every color
+COLOR_TO_HSV_RANGE = {
+    "blue": (np.array([100, 70, 50]), np.array([140, 255, 255])),
+    "green": (np.array([35, 80, 50]), np.array([85, 255, 255])),
+    "magenta": (np.array([145, 80, 50]), np.array([175, 255, 255])),
+    "red": (np.array([0, 180, 100]), np.array([10, 255, 255])),
+}
+
+# buffer timestamps older than this many seconds are taken to be on another clock than time.monotonic
+MAX_FRAME_AGE = 1.0
+
+class CaptureError(RuntimeError):
+    """
+    Raised when the camera returns no frame, e.g. after it was unplugged.
+    """
+
+
+class VideoRecorder:
+    """
+    Records the frames captured for the game into a video, e.g. for reports.
+
+    The frames are handed over by the capture of the game, as the camera can only be read
+    from one place, and written on a background thread, so recording never delays the game.
+    A frame arriving while the writer is still busy is dropped.
+    """
+
+    def __init__(self, path: str, fps: float = 24) -> None:
+        self.path = path
+        self.fps = fps
+        self.frames: queue.Queue[np.ndarray | None] = queue.Queue(maxsize=2)
+        self.thread = threading.Thread(target=self.run, name="recorder", daemon=True)
+        self.thread.start()
+
+    def add(self, image: np.ndarray):
+        try:
+            self.frames.put_nowait(image)
+        except queue.Full:
+            metrics.count("frames_not_recorded")
+
+    def run(self):
+        writer = None
+        while (image := self.frames.get()) is not None:
+            if writer is None:
+                # the size of the decoded frames, which are smaller than the camera's when decoded at reduced scale
+                writer = cv2.VideoWriter(
+                    self.path, cv2.VideoWriter.fourcc(*"MJPG"), self.fps, (image.shape[1], image.shape[0])
+                )
+            writer.write(image)
+        if writer is not None:
+            writer.release()
+
+    def close(self):
+        """
+        Writes the frames still queued and closes the video.
+        """
+        self.frames.put(None)
+        self.thread.join()
+
 def img_show(img, title="debug"):
     """
     Shows an image.
@@ -21,9 +86,383 @@ def img_show(img, title="debug"):
     cv2.waitKey(0)
 
 
+def marker_side(corners: np.ndarray) -> float:
+    """
+    Returns the mean length of the sides of a marker with the given 4 corners.
+    """
+    return float(np.linalg.norm(corners - np.roll(corners, 1, axis=0), axis=1).mean())
+
+
+class MarkerTracker:
+    """
+    Finds the arucos of the previous frames again by decoding the bits at their last known corners.
+
+    Decoding a marker in place costs a small perspective warp, while a full detection searches
+    the whole frame. Every place a marker has been seen is remembered, so a dial turning to its
+    next marker or a confirm marker coming back into view is found in place as well.
+    A full detection runs on the first frame, on every refresh-th frame, and whenever
+    a marker visible on the previous frame can not be decoded at its corners anymore.
+    A marker at a place where none has been seen yet is found by the next full detection.
+
+    Once markers have been seen, a full detection searches a copy of the frame scaled down
+    as far as the smallest marker stays min_side pixels wide, and detects again at full
+    resolution only around the markers and marker candidates found on it.
+    """
+
+    def __init__(
+        self,
+        dictionary: aruco.Dictionary,
+        refresh: int = 10,
+        cell: int = 6,
+        pyramid: bool = True,
+        min_side: float = 16,
+        max_scale: int = 8,
+    ) -> None:
+        self.dictionary = dictionary
+        self.detector = aruco.ArucoDetector(dictionary)
+        self.refresh = refresh
+        self.cell = cell
+        self.pyramid = pyramid
+        self.min_side = min_side
+        self.max_scale = max_scale
+        # factor the frame is scaled down by for a full detection, and the side of the smallest marker seen
+        self.scale = 1
+        self.side: float | None = None
+        # cells along a side of a marker, including the border
+        self.cells = dictionary.markerSize + 2
+        side = self.cells * cell
+        self.square = np.float32([[0, 0], [side, 0], [side, side], [0, side]])
+        # corners of every place a marker has been seen, and whether it was visible on the previous frame
+        self.slots: list[np.ndarray] = []
+        self.visible: list[bool] = []
+        self.frames_since_full = 0
+
+    def detect(self, image: np.ndarray) -> dict[int, np.ndarray]:
+        """
+        Returns the id to the corners of every aruco on the image, shaped like cv2.aruco.detectMarkers returns them.
+        """
+        if self.slots and self.frames_since_full < self.refresh:
+            markers = self.track(image)
+            if markers is not None:
+                self.frames_since_full += 1
+                return markers
+        return self.detect_all(image)
+
+    def detect_all(self, image: np.ndarray) -> dict[int, np.ndarray]:
+        metrics.count("full_aruco_detections")
+        self.frames_since_full = 0
+        markers = self.detect_coarse(image) if self.scale > 1 else {}
+        if not markers:
+            corners, ids, _ = self.detector.detectMarkers(image)
+            if ids is None:
+                self.visible = [False] * len(self.slots)
+                return {}
+            markers = {int(id): c for id, c in zip(ids.reshape(-1), corners)}
+        if self.pyramid:
+            self.choose_scale(markers)
+        found = [c[0] for c in markers.values()]
+        # keep the places of markers that are not visible now, unless a visible marker covers them
+        hidden = [
+            slot for slot in self.slots
+            if all(np.abs(slot.mean(axis=0) - c.mean(axis=0)).max() > np.ptp(c[:, 0]) / 2 for c in found)
+        ]
+        self.slots = found + hidden
+        self.visible = [True] * len(found) + [False] * len(hidden)
+        return markers
+
+    def detect_coarse(self, image: np.ndarray) -> dict[int, np.ndarray]:
+        """
+        Detects the markers on the frame scaled down by scale and refines their corners at full resolution.
+
+        Candidates that could not be decoded at the reduced size are detected again
+        at full resolution in the region around them, unless they are too small to be a marker.
+        """
+        metrics.count("coarse_aruco_detections")
+        scale = self.scale
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        small = cv2.resize(gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+        corners, ids, rejected = self.detector.detectMarkers(small)
+        markers = {}
+        if ids is not None:
+            # the center of a pixel of the small image is at (x + 0.5) * scale - 0.5 on the frame
+            found = np.concatenate(corners).reshape(-1, 1, 2) * scale + (scale - 1) / 2
+            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 0.1)
+            cv2.cornerSubPix(gray, found, (scale + 1, scale + 1), (-1, -1), criteria)
+            for idx, id in enumerate(ids.reshape(-1)):
+                markers[int(id)] = found[4 * idx:4 * idx + 4].reshape(1, 4, 2)
+
+        height, width = gray.shape
+        for candidate in rejected:
+            candidate = candidate.reshape(4, 2) * scale
+            if marker_side(candidate) < self.side / 2:
+                continue
+            # the quiet zone around the marker is part of the region
+            margin = marker_side(candidate) / 4 + scale
+            (x0, y0), (x1, y1) = candidate.min(axis=0) - margin, candidate.max(axis=0) + margin
+            x0, y0 = max(int(x0), 0), max(int(y0), 0)
+            x1, y1 = min(int(x1) + 1, width), min(int(y1) + 1, height)
+            region_corners, region_ids, _ = self.detector.detectMarkers(gray[y0:y1, x0:x1])
+            if region_ids is None:
+                continue
+            for id, c in zip(region_ids.reshape(-1), region_corners):
+                markers.setdefault(int(id), c + np.float32([x0, y0]))
+        # noise the size of a few pixels of the small image can decode as a marker
+        return {id: c for id, c in markers.items() if marker_side(c[0]) >= self.side / 2}
+
+    def choose_scale(self, markers: dict[int, np.ndarray]):
+        """
+        Sets the scale of the next full detections from the size of the markers seen.
+        """
+        side = min(marker_side(c[0]) for c in markers.values())
+        self.side = side if self.side is None else min(self.side, side)
+        self.scale = int(np.clip(self.side // self.min_side, 1, self.max_scale))
+
+    def track(self, image: np.ndarray) -> dict[int, np.ndarray] | None:
+        """
+        Decodes the markers at the remembered places.
+
+        Returns None if a marker visible on the previous frame is lost.
+        """
+        markers = {}
+        for idx, slot in enumerate(self.slots):
+            decoded = self.decode(image, slot)
+            if decoded is None:
+                if self.visible[idx]:
+                    return None
+                continue
+            id, corners = decoded
+            self.slots[idx] = corners
+            self.visible[idx] = True
+            markers[id] = corners[np.newaxis]
+        return markers
+
+    def decode(self, image: np.ndarray, corners: np.ndarray) -> tuple[int, np.ndarray] | None:
+        """
+        Reads the marker with the given corners.
+
+        Returns the id and the corners starting at its top left corner, or None if there is no valid marker.
+        """
+        side = self.cells * self.cell
+        transform = cv2.getPerspectiveTransform(corners, self.square)
+        patch = cv2.warpPerspective(image, transform, (side, side), flags=cv2.INTER_NEAREST)
+        if patch.ndim == 3:
+            patch = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY)
+        # mean of the inner half of every cell, away from the edges of the neighbouring cells
+        quarter = self.cell // 4
+        inner = patch.reshape(self.cells, self.cell, self.cells, self.cell)[:, quarter:self.cell - quarter, :, quarter:self.cell - quarter]
+        means = inner.mean(axis=(1, 3))
+        low, high = means.min(), means.max()
+        if high - low < 40:
+            return None
+        bits = means > (low + high) / 2
+        if bits[0].any() or bits[-1].any() or bits[:, 0].any() or bits[:, -1].any():
+            return None
+        found, id, rotation = self.dictionary.identify(bits[1:-1, 1:-1].astype(np.uint8), 0.0)
+        if not found:
+            return None
+        return int(id), np.roll(corners, rotation, axis=0)
+
+
+class FrameAnalysis:
+    """
+    The detections on one camera frame.
+
+    Every detector runs when its result is first asked for and the result is kept,
+    so each detector runs at most once per frame however many consumers read it.
+    """
+
+    def __init__(self, camera: "Camera", image: np.ndarray, seq: int, captured: float | None = None) -> None:
+        self.camera = camera
+        self.image = image
+        self.seq = seq
+        # perf_counter time the frame was captured at
+        self.captured = time.perf_counter() if captured is None else captured
+        self._markers: dict[int, np.ndarray] | None = None
+        self._holes: list[tuple[float, float]] | None = None
+        self._colors: dict[str, list[tuple[int, int]]] | None = None
+
+    def markers(self) -> dict[int, np.ndarray]:
+        """
+        Returns the ids of the arucos on the frame to their corners.
+        """
+        if self._markers is None:
+            self.camera.get_ids_of_detected_arucos(self.image)
+            self._markers = self.camera.markers
+        return self._markers
+
+    def arucos(self) -> list[int]:
+        """
+        Returns the ids of the arucos on the frame.
+        """
+        return list(self.markers())
+
+    def set_detections(self, detections):
+        """
+        Takes over the detections run on the frame elsewhere, e.g. by a VisionPool worker.
+        """
+        if detections.holes is not None:
+            self._holes = detections.holes
+        if detections.colors is not None:
+            self._colors = self.camera.pegs = detections.colors
+
+    def board_image(self) -> tuple[np.ndarray, tuple[int, int]]:
+        """
+        Returns the part of the frame showing the board, and the image coordinate of its top left corner.
+        The whole frame is returned until the camera is calibrated.
+        """
+        profile = self.camera.profile
+        if profile is None:
+            return self.image, (0, 0)
+        x0, y0, x1, y1 = profile.board_roi
+        return self.image[y0:y1, x0:x1], (x0, y0)
+
+    def holes(self) -> list[tuple[float, float]]:
+        """
+        Returns the image coordinates of the empty holes on the frame.
+        """
+        if self._holes is None:
+            image, (x0, y0) = self.board_image()
+            self._holes = [(x + x0, y + y0) for x, y in self.camera.detect_holes(image, show_img=False)]
+        return self._holes
+
+    def colors(self) -> dict[str, list[tuple[int, int]]]:
+        """
+        Returns the color to the image coordinates of the pegs of that color on the frame.
+        """
+        if self._colors is None:
+            image, (x0, y0) = self.board_image()
+            self._colors = {
+                color: [(x + x0, y + y0) for x, y in centers]
+                for color, centers in self.camera.detect_colors(image, show_img=False).items()
+            }
+            self.camera.pegs = self._colors
+        return self._colors
+
+    def views(self) -> list["FrameAnalysis"]:
+        """
+        Returns the frames of the single cameras this frame consists of.
+        """
+        return [self]
+
+    def cell_centers(self, board_size: tuple[int, int]) -> dict[tuple[int, int], tuple[int, int]] | None:
+        """
+        Locates the cells of the board in the columns the camera sees, from the holes and pegs on the frame.
+
+        Returns the board coordinate to the image coordinate of every cell in view,
+        or None if not every hole in view is found.
+        """
+        columns = self.camera.columns or range(board_size[0])
+        if self.camera.profile is not None:
+            return self.camera.profile.cell_centers(columns, board_size[1])
+        width = len(columns)
+        detected_holes = self.holes()
+        if not detected_holes:
+            return None
+        color_coords = [
+            coord for coord_list in self.colors().values() for coord in coord_list
+        ]
+        board_coords = [
+            (int(detected_hole[0]), int(detected_hole[1]))
+            for detected_hole in detected_holes
+        ] + color_coords
+        if len(board_coords) != width * board_size[1]:
+            events.emit(
+                "detection_failure",
+                f"More holes than expected (actual, expected, colors, holes) {len(board_coords)} {width * board_size[1]} {len(color_coords)} {len(detected_holes)}",
+                WARNING, reason="hole_count", found=len(board_coords), expected=width * board_size[1],
+                pegs=len(color_coords), holes=len(detected_holes),
+            )
+            return None
+
+        board_coords_copy = board_coords.copy()
+        board_coord_to_image_coord: dict[tuple[int, int], tuple[int, int]] = {}
+        y_counter = 0
+        while y_counter <= board_size[1] - 1:
+            board_coords_copy.sort(key=lambda c: c[1])
+            row = board_coords_copy[0 : width]
+            row.sort(key=lambda c: c[0])
+            for i, c in enumerate(row):
+                board_coord_to_image_coord[(columns[-1] - i, y_counter)] = c
+            board_coords_copy = board_coords_copy[width :]
+            y_counter += 1
+        return board_coord_to_image_coord
+
+    def board_pegs(self, board_size: tuple[int, int]) -> dict[str, list[tuple[int, int]]] | None:
+        """
+        Locates the pegs on the board, from the holes and pegs in the columns of the board the camera sees.
+
+        Returns the color to the board coordinates of the pegs of that color,
+        or None if not every hole in view is found.
+        """
+        profile = self.camera.profile
+        if profile is not None:
+            columns = self.camera.columns or range(board_size[0])
+            color_to_board_coords: dict[str, list[tuple[int,int]]] = {}
+            for color, color_coords in self.colors().items():
+                for color_coord in color_coords:
+                    x, y = profile.board_coord(color_coord)
+                    if x in columns and 0 <= y < board_size[1]:
+                        color_to_board_coords.setdefault(color, []).append((x, y))
+            return color_to_board_coords
+
+        cells = self.cell_centers(board_size)
+        if cells is None:
+            return None
+        image_coord_to_board_coord = {image: board for board, image in cells.items()}
+
+        color_to_board_coords: dict[str, list[tuple[int,int]]] = {}
+        for color, color_coords in self.colors().items():
+            for color_coord in color_coords:
+                color_to_board_coords.setdefault(color, [])
+                color_to_board_coords[color].append(
+                    image_coord_to_board_coord[color_coord]
+                )
+        return color_to_board_coords
+
+
 class Camera:
-    def __init__(self, cam_num: int):
-        self.cam = cv2.VideoCapture(cam_num, cv2.CAP_DSHOW)
+    def __init__(
+        self,
+        cam_num: int,
+        columns: range | None = None,
+        profile_path: str | None = None,
+        config: CaptureConfig | None = None,
+    ):
+        """
+        columns are the columns of the board the camera sees, None for the whole board.
+        profile_path is where the calibration profile of the camera is stored.
+        config are the capture settings, the low latency defaults if None.
+        """
+        self.config = config or CaptureConfig()
+        self.cam, self.raw = open_capture(cam_num, self.config)
+        self.settings = negotiated(self.cam)
+        if self.settings:
+            events.info(
+                f"Camera {cam_num}: {self.settings['backend']} {self.settings['size'][0]}x{self.settings['size'][1]}"
+                f" {self.settings['fourcc']} at {self.settings['fps']:g} fps, buffer {self.settings['buffer_size']},"
+                f" exposure {self.settings['exposure']:g}, focus {self.settings['focus']:g}"
+                + (f", decoded at 1/{self.config.decode_scale}" if self.raw else ""),
+                "camera_opened", camera=cam_num, decode_scale=self.config.decode_scale if self.raw else 1, **self.settings,
+            )
+        else:
+            events.error(f"Camera {cam_num} could not be opened", "camera_failed", camera=cam_num)
+        self.columns = columns
+        self.profile_path = profile_path
+        self.profile = CalibrationProfile.load(profile_path) if profile_path else None
+        self.tracker = MarkerTracker(aruco.getPredefinedDictionary(aruco.DICT_4X4_250))
+        # sequence number of the latest frame returned by capture
+        self.seq = 0
+        # perf_counter time the latest image was captured at
+        self.captured = 0.0
+        # results of the latest detections, kept for the camera preview
+        self.markers: dict[int, np.ndarray] = {}
+        self.pegs: dict[str, list[tuple[int, int]]] = {}
+
+    def close(self):
+        """
+        Releases the camera.
+        """
+        self.cam.release()
 
     def get_image(self) -> np.ndarray:
         """
@@ -31,10 +470,43 @@ class Camera:
 
         Returns the captured image.
         """
-        result, image = self.cam.read()
+        with metrics.span("capture"):
+            grabbed = time.perf_counter()
+            result = self.cam.grab()
+            if result:
+                result, image = self.cam.retrieve()
         if result:
+            self.captured = self.capture_time(grabbed)
+            metrics.count("frames")
+            if self.raw:
+                with metrics.span("decode"):
+                    image = decode_frame(image, self.config.decode_scale)
             return image
-        raise RuntimeError("Could not capture image")
+        raise CaptureError("Could not capture image")
+
+    def capture_time(self, grabbed: float) -> float:
+        """
+        Returns the perf_counter time the latest grabbed frame was captured at.
+
+        Backends stamping their buffers with the monotonic clock, like V4L2, report the time
+        the driver captured the frame, so the time the frame waited in the buffer is included.
+        Otherwise the frame is taken to be captured when the grab began.
+        """
+        stamp = self.cam.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        age = time.monotonic() - stamp
+        if 0 < stamp and 0 <= age < MAX_FRAME_AGE:
+            return time.perf_counter() - age
+        return grabbed
+
+    def capture(self) -> FrameAnalysis:
+        """
+        Captures an image to run the detections on.
+
+        Returns the analysis of the new frame.
+        """
+        image = self.get_image()
+        self.seq += 1
+        return FrameAnalysis(self, image, self.seq, self.captured)
 
     def detect_holes(self, image: typing.MatLike, show_img: bool = False) -> list[tuple[float, float]]:
         """
@@ -42,16 +514,9 @@ class Camera:
 
         Returns a list of the found holes in image coordinates.
         """
-        params = cv2.SimpleBlobDetector.Params()
-        params.filterByArea = True
-        params.minArea = 10
-        params.maxArea = 100
-
-        params.filterByCircularity = True
-        params.minCircularity = 0.9
-
-        detector = cv2.SimpleBlobDetector.create(params)
-        keypoints = detector.detect(image)
+        area = self.profile.hole_area if self.profile is not None else DEFAULT_HOLE_AREA
+        with metrics.span("hole_detection"):
+            keypoints = self.detect_hole_keypoints(image, area)
 
         positions = [kp.pt for kp in keypoints]
         if show_img:
@@ -61,50 +526,59 @@ class Camera:
 
         return positions
 
-    def detect_colors(self, img, show_img: bool = True):
+    def detect_hole_keypoints(self, image: typing.MatLike, area: tuple[float, float]) -> list[cv2.KeyPoint]:
         """
-        Detect colors (blue, green, magenta, red) from given image.
-
-        Returns the name of the color to a list of centers of the colors in image coordinates.
+        Detects circular blobs with an area in pixels between the given bounds.
         """
+        params = cv2.SimpleBlobDetector.Params()
+        params.filterByArea = True
+        params.minArea, params.maxArea = area
 
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-        lower_blue = np.array([100, 70, 50])
-        upper_blue = np.array([140, 255, 255])
-        blue_mask = cv2.inRange(hsv, lower_blue, upper_blue)
+        params.filterByCircularity = True
+        params.minCircularity = 0.9
 
-        cnts_blue = imutils.grab_contours(
-            cv2.findContours(blue_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        )
+        detector = cv2.SimpleBlobDetector.create(params)
+        return list(detector.detect(image))
 
-        lower_green = np.array([35, 80, 50])
-        upper_green = np.array([85, 255, 255])
-        green_mask = cv2.inRange(hsv, lower_green, upper_green)
-        cnts_green = imutils.grab_contours(
-            cv2.findContours(green_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        )
+    def calibrate(self, frame: FrameAnalysis, board_size: tuple[int, int]) -> bool:
+        """
+        Calibrates the camera from a frame on which every hole and peg in view is found, and stores the profile.
 
-        lower_magenta = np.array([145, 80, 50])
-        upper_magenta = np.array([175, 255, 255])
-        magenta_mask = cv2.inRange(hsv, lower_magenta, upper_magenta)
-        cnts_magenta = imutils.grab_contours(
-            cv2.findContours(magenta_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+        Returns True if the camera was calibrated. Otherwise the previous profile is kept.
+        """
+        profile = self.profile
+        self.profile = None
+        calibrated = CalibrationProfile.from_frame(
+            FrameAnalysis(self, frame.image, frame.seq), board_size
         )
+        if calibrated is None:
+            self.profile = profile
+            return False
+        self.profile = calibrated
+        if self.profile_path is not None:
+            calibrated.save(self.profile_path)
+        return True
 
-        lower_red1 = np.array([0, 180, 100])
-        upper_red1 = np.array([10, 255, 255])
-        red_mask = cv2.inRange(hsv, lower_red1, upper_red1)
+    def detect_colors(self, img, show_img: bool = True, debug_path: str | None = None):
+        """
+        Detect colors (blue, green, magenta, red) from given image.
+        The found pegs are shown with show_img, and written to debug_path if given.
 
-        cnts_red = imutils.grab_contours(
-            cv2.findContours(red_mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-        )
+        Returns the name of the color to a list of centers of the colors in image coordinates.
+        """
+        with metrics.span("color_detection"):
+            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+            color_to_contours = {
+                clr: imutils.grab_contours(
+                    cv2.findContours(cv2.inRange(hsv, lower, upper), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+                )
+                for clr, (lower, upper) in self.hsv_ranges().items()
+            }
 
         color_to_centers: dict[str, list[tuple[int, int]]] = {}
-        image = img
-        for clr, contours in zip(
-            ("blue", "green", "magenta", "red"),
-            (cnts_blue, cnts_green, cnts_magenta, cnts_red),
-        ):
+        # contours are drawn on a copy, so other detectors can run on the same frame afterwards
+        image = img.copy() if show_img or debug_path is not None else None
+        for clr, contours in color_to_contours.items():
             for cnt in contours:
                 area = cv2.contourArea(cnt)
                 if area > 50 and area < 400:
@@ -113,6 +587,8 @@ class Camera:
                     cY = int(M["m01"] / M["m00"]) if M["m00"] != 0 else 0
                     color_to_centers.setdefault(clr, [])
                     color_to_centers[clr].append((cX, cY))
+                    if image is None:
+                        continue
                     cv2.drawContours(image, [cnt], -1, COLOR_TO_BGR[clr], 3)
                     cv2.circle(image, (cX, cY), 2, (255, 255, 255), -1)
                     cv2.putText(
@@ -126,23 +602,29 @@ class Camera:
                     )
         if show_img:
             cv2.imshow("colors", image)
-        else:
-            cv2.imwrite("DEBUG-colors.png", image)
+        if debug_path is not None:
+            cv2.imwrite(debug_path, image)
+        self.pegs = color_to_centers
         return color_to_centers
 
+    def hsv_ranges(self) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns the HSV bounds of every peg color, calibrated where the profile has them.
+        """
+        if self.profile is None:
+            return COLOR_TO_HSV_RANGE
+        return {**COLOR_TO_HSV_RANGE, **self.profile.hsv_ranges}
+
     def get_ids_of_detected_arucos(self, img) -> list[int]:
         """
         Detects aruco codes present in a given image.
+        Arucos of the previous images are tracked instead of detected again where possible.
 
         Returns a list of ids of the found arucos.
         """
-        _, ids, _ = aruco.detectMarkers(
-            img, aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
-        )
-        if ids is None:
-            return []
-        ids = ids.reshape((ids.shape[0],))
-        return [int(id) for id in ids]
+        with metrics.span("aruco_detection"):
+            self.markers = self.tracker.detect(img)
+        return list(self.markers)
 
     def detect_arucos(self, img):
         """
@@ -183,21 +665,3 @@ class Camera:
                 (255, 20, 20),
             )
         cv2.imshow("aruco", img)
-
-    def record(self, stop_event):
-        """
-        Records video from the connected camera.
-        
-        Primarily used for capturing video for report purposes.
-        """
-        video_capture = cv2.VideoWriter(
-            f'video{int(datetime.now().timestamp())}.avi',
-            cv2.VideoWriter.fourcc(*'MJPG'),
-            24,
-            (int(self.cam.get(3)),int(self.cam.get(4)))
-        )
-
-        while not stop_event.is_set():
-            frame = self.get_image()
-
-            video_capture.write(frame)
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from camera import Camera, FrameAnalysis
+from capture_config import CaptureConfig
+
+
+class RigFrame:
+    """
+    The frames captured at the same time by all cameras of a rig, read as one frame of the whole table.
+
+    Each detection runs on the frames of all cameras in parallel, one worker per camera,
+    and the results are fused: markers are unique per dial, so their ids are joined,
+    and every camera locates the pegs in its own columns of the board.
+    """
+
+    def __init__(self, rig: "CameraRig", frames: list[FrameAnalysis], seq: int) -> None:
+        self.rig = rig
+        self.frames = frames
+        self.seq = seq
+        self.captured = min(frame.captured for frame in frames)
+        # the preview shows the frame of the first camera
+        self.image = frames[0].image
+        self._arucos: list[int] | None = None
+
+    def views(self) -> list[FrameAnalysis]:
+        return self.frames
+
+    def arucos(self) -> list[int]:
+        if self._arucos is None:
+            ids = self.rig.map(FrameAnalysis.arucos, self.frames)
+            self._arucos = list(dict.fromkeys(id for frame_ids in ids for id in frame_ids))
+        return self._arucos
+
+    def board_pegs(self, board_size: tuple[int, int]) -> dict[str, list[tuple[int, int]]] | None:
+        """
+        Returns the color to the board coordinates of the pegs seen by all cameras,
+        or None if a camera does not find every hole in view.
+        """
+        color_to_board_coords: dict[str, list[tuple[int, int]]] = {}
+        for pegs in self.rig.map(lambda frame: frame.board_pegs(board_size), self.frames):
+            if pegs is None:
+                return None
+            for color, coords in pegs.items():
+                color_to_board_coords.setdefault(color, []).extend(coords)
+        return color_to_board_coords
+
+
+class CameraRig:
+    """
+    Several cameras looking at the table together, each at its own columns of the board and the dials next to them.
+
+    A camera seeing only a part of the table gets the same pixel density at a lower resolution,
+    so every stream is cheaper to capture and detect on, and the cameras are processed in parallel.
+    The rig is used in place of a single Camera.
+    """
+
+    def __init__(self, cameras: list[Camera]) -> None:
+        self.cameras = cameras
+        self.workers = ThreadPoolExecutor(max_workers=len(cameras))
+        self.seq = 0
+
+    def map(self, fn, frames: list):
+        return list(self.workers.map(fn, frames))
+
+    def capture(self) -> RigFrame:
+        """
+        Captures a frame with every camera at the same time.
+        """
+        frames = self.map(Camera.capture, self.cameras)
+        self.seq += 1
+        return RigFrame(self, frames, self.seq)
+
+    @property
+    def markers(self) -> dict[int, np.ndarray]:
+        return self.cameras[0].markers
+
+    @property
+    def pegs(self) -> dict[str, list[tuple[int, int]]]:
+        return self.cameras[0].pegs
+
+    def close(self):
+        self.workers.shutdown()
+        for camera in self.cameras:
+            camera.close()
+
+
+def open_cameras(
+    cameras: list[tuple[int, tuple[int, int] | None]],
+    config: CaptureConfig,
+    profile_path: str = "calibration/camera{}.json",
+) -> Camera | CameraRig:
+    """
+    Opens the cameras of a table, given as the camera number and the columns (start, end)
+    of the board it sees, None for the whole board.
+    The calibration profile of every camera is profile_path with {} replaced by its number.
+
+    Returns the camera, or a rig of all cameras if there are several.
+    """
+    opened = [
+        Camera(num, range(*columns) if columns else None, profile_path.format(num), config)
+        for num, columns in cameras
+    ]
+    return opened[0] if len(opened) == 1 else CameraRig(opened)
@@ -0,0 +1,147 @@
+import sys
+
+import cv2
+import numpy as np
+
+# flags of cv2.imdecode decoding a JPEG at a fraction of its size
+REDUCED_DECODE = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class CaptureConfig:
+    """
+    Settings a camera is opened with to get the latest frame with as little lag as possible.
+
+    size is the requested (width, height), None for the driver default. Frames are requested
+    as fourcc, and the driver keeps at most buffer_size frames, so a read never returns a stale frame.
+    After warmup frames the automatic exposure and focus have settled and are locked,
+    so they do not change between frames and confuse the change detection.
+    With a decode_scale above 1 the MJPEG frames are decoded at that fraction of their size,
+    which is cheaper than decoding the full frame when it is only used for detection.
+    """
+
+    def __init__(
+        self,
+        size: tuple[int, int] | None = None,
+        fps: int = 30,
+        fourcc: str = "MJPG",
+        buffer_size: int = 1,
+        warmup: int = 30,
+        lock_exposure: bool = True,
+        lock_focus: bool = True,
+        decode_scale: int = 1,
+    ) -> None:
+        if decode_scale not in REDUCED_DECODE:
+            raise ValueError(f"decode_scale must be one of {sorted(REDUCED_DECODE)}")
+        self.size = size
+        self.fps = fps
+        self.fourcc = fourcc
+        self.buffer_size = buffer_size
+        self.warmup = warmup
+        self.lock_exposure = lock_exposure
+        self.lock_focus = lock_focus
+        self.decode_scale = decode_scale
+
+
+def backend(platform: str = sys.platform) -> int:
+    """
+    Returns the capture backend with the least lag on the platform.
+    """
+    if platform.startswith("win"):
+        return cv2.CAP_DSHOW
+    if platform.startswith("linux"):
+        return cv2.CAP_V4L2
+    if platform == "darwin":
+        return cv2.CAP_AVFOUNDATION
+    return cv2.CAP_ANY
+
+
+def manual_exposure(backend_name: str) -> float:
+    """
+    Returns the value of CAP_PROP_AUTO_EXPOSURE turning automatic exposure off, which differs per backend.
+    """
+    return 1 if backend_name == "V4L2" else 0.25
+
+
+def fourcc_name(code: float) -> str:
+    code = int(code)
+    return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4))
+
+
+def open_capture(cam_num: int, config: CaptureConfig) -> tuple[cv2.VideoCapture, bool]:
+    """
+    Opens the camera with the settings of config.
+
+    Returns the capture and whether its frames are MJPEG buffers left for decode_frame to decode.
+    """
+    cam = cv2.VideoCapture(cam_num, backend())
+    if not cam.isOpened():
+        # e.g. in developer mode without a camera, where no frame is ever read
+        return cam, False
+    # the pixel format is set before the size, as some drivers only offer larger sizes in MJPG
+    cam.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter.fourcc(*config.fourcc))
+    if config.size is not None:
+        cam.set(cv2.CAP_PROP_FRAME_WIDTH, config.size[0])
+        cam.set(cv2.CAP_PROP_FRAME_HEIGHT, config.size[1])
+    cam.set(cv2.CAP_PROP_FPS, config.fps)
+    cam.set(cv2.CAP_PROP_BUFFERSIZE, config.buffer_size)
+    raw = False
+    if config.decode_scale > 1 and config.fourcc == "MJPG":
+        # only some backends hand out the undecoded buffers
+        raw = bool(cam.set(cv2.CAP_PROP_CONVERT_RGB, 0))
+    for _ in range(config.warmup):
+        cam.grab()
+    lock_controls(cam, config)
+    return cam, raw
+
+
+def lock_controls(cam: cv2.VideoCapture, config: CaptureConfig):
+    """
+    Fixes exposure and focus at the values the automatic controls settled on.
+    """
+    if config.lock_exposure:
+        exposure = cam.get(cv2.CAP_PROP_EXPOSURE)
+        cam.set(cv2.CAP_PROP_AUTO_EXPOSURE, manual_exposure(cam.getBackendName()))
+        cam.set(cv2.CAP_PROP_EXPOSURE, exposure)
+    if config.lock_focus:
+        focus = cam.get(cv2.CAP_PROP_FOCUS)
+        cam.set(cv2.CAP_PROP_AUTOFOCUS, 0)
+        cam.set(cv2.CAP_PROP_FOCUS, focus)
+
+
+def negotiated(cam: cv2.VideoCapture) -> dict[str, object]:
+    """
+    Returns the settings the driver actually agreed to, which may differ from the requested ones,
+    or an empty dict if the camera could not be opened.
+    """
+    if not cam.isOpened():
+        return {}
+    return {
+        "backend": cam.getBackendName(),
+        "size": (int(cam.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))),
+        "fps": cam.get(cv2.CAP_PROP_FPS),
+        "fourcc": fourcc_name(cam.get(cv2.CAP_PROP_FOURCC)),
+        "buffer_size": int(cam.get(cv2.CAP_PROP_BUFFERSIZE)),
+        "auto_exposure": cam.get(cv2.CAP_PROP_AUTO_EXPOSURE),
+        "exposure": cam.get(cv2.CAP_PROP_EXPOSURE),
+        "autofocus": cam.get(cv2.CAP_PROP_AUTOFOCUS),
+        "focus": cam.get(cv2.CAP_PROP_FOCUS),
+    }
+
+
+def decode_frame(frame: np.ndarray, scale: int) -> np.ndarray:
+    """
+    Decodes an MJPEG buffer at 1/scale of its size.
+
+    Frames the backend already decoded are returned as they are.
+    """
+    if frame.ndim == 3:
+        return frame
+    image = cv2.imdecode(frame.reshape(-1), REDUCED_DECODE[scale])
+    if image is None:
+        raise RuntimeError("Could not decode image")
+    return image
@@ -0,0 +1,209 @@
+import atexit
+import enum
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {level: name for name, level in LEVELS.items()}
+
+
+class Event:
+    """
+    Something that happened in the game, e.g. a guess, its result, a failed detection or a valve command.
+
+    kind names the type of event and fields hold its data, so tools read the event without parsing
+    the message, which is only meant for humans.
+    """
+
+    __slots__ = ("seq", "time", "level", "kind", "message", "fields")
+
+    def __init__(self, seq: int, time: float, level: int, kind: str, message: str, fields: dict) -> None:
+        self.seq = seq
+        self.time = time
+        self.level = level
+        self.kind = kind
+        self.message = message
+        self.fields = fields
+
+    def to_json(self) -> dict:
+        return {
+            "seq": self.seq,
+            "time": self.time,
+            "level": LEVEL_NAMES.get(self.level, self.level),
+            "kind": self.kind,
+            "message": self.message,
+            **self.fields,
+        }
+
+
+def _json_default(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+class ConsoleSink:
+    """
+    Writes the messages of the events to stdout.
+    """
+
+    def __init__(self, level: int = INFO) -> None:
+        self.level = level
+
+    def write(self, event: Event):
+        # stdout is looked up on every write, so it can be redirected while running
+        sys.stdout.write(event.message + "\n")
+
+    def flush(self):
+        sys.stdout.flush()
+
+    def close(self):
+        self.flush()
+
+
+class JsonLinesSink:
+    """
+    Appends the events to a JSON lines file, for tools to read.
+    """
+
+    def __init__(self, path: str, level: int = DEBUG) -> None:
+        self.level = level
+        self.file = open(path, "a")
+
+    def write(self, event: Event):
+        self.file.write(json.dumps(event.to_json(), default=_json_default) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class EventBus:
+    """
+    Records the events of the game without ever blocking on their output.
+
+    Emitting an event only appends it to a ring buffer, a deque that threads append to without a lock.
+    A background thread drains the buffer every interval seconds and writes every event to the
+    sinks whose level it reaches. If the sinks fall behind by size events, the oldest are dropped
+    and counted instead of blocking the game. Events below the level of every sink are not recorded.
+    The latest events are kept in recent for tools reading them in process.
+    """
+
+    def __init__(self, size: int = 4096, interval: float = 0.05) -> None:
+        self.pending: deque[Event] = deque(maxlen=size)
+        self.recent: deque[Event] = deque(maxlen=size)
+        self.interval = interval
+        self.seq = itertools.count(1)
+        self.dropped = 0
+        self.sinks: list = []
+        self.level = ERROR + 1
+        self.thread: threading.Thread | None = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.add_sink(ConsoleSink())
+
+    def add_sink(self, sink):
+        with self.lock:
+            self.sinks.append(sink)
+            self.level = min(s.level for s in self.sinks)
+
+    def remove_sink(self, sink):
+        with self.lock:
+            self.sinks.remove(sink)
+            self.level = min((s.level for s in self.sinks), default=ERROR + 1)
+
+    def set_console_level(self, level: int):
+        with self.lock:
+            for sink in self.sinks:
+                if isinstance(sink, ConsoleSink):
+                    sink.level = level
+            self.level = min(s.level for s in self.sinks)
+
+    def emit(self, kind: str, message: str, level: int = INFO, **fields):
+        """
+        Records an event of the kind, with its fields.
+        """
+        if level < self.level:
+            return
+        event = Event(next(self.seq), time.time(), level, kind, message, fields)
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(event)
+        self.recent.append(event)
+        if self.thread is None:
+            self.start()
+
+    def debug(self, message: str, kind: str = "message", **fields):
+        self.emit(kind, message, DEBUG, **fields)
+
+    def info(self, message: str, kind: str = "message", **fields):
+        self.emit(kind, message, INFO, **fields)
+
+    def warning(self, message: str, kind: str = "message", **fields):
+        self.emit(kind, message, WARNING, **fields)
+
+    def error(self, message: str, kind: str = "message", **fields):
+        self.emit(kind, message, ERROR, **fields)
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="events", daemon=True)
+            self.thread.start()
+        atexit.register(self.close)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.drain()
+
+    def drain(self):
+        """
+        Writes the pending events to the sinks.
+        """
+        with self.lock:
+            written = False
+            while self.pending:
+                event = self.pending.popleft()
+                for sink in self.sinks:
+                    if event.level >= sink.level:
+                        try:
+                            sink.write(event)
+                            written = True
+                        except Exception:
+                            # a broken sink must not stop the others
+                            pass
+            if written:
+                for sink in self.sinks:
+                    try:
+                        sink.flush()
+                    except Exception:
+                        pass
+
+    def close(self):
+        """
+        Writes the events still pending and closes the sinks, except the console.
+        """
+        self.stopped.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.drain()
+        with self.lock:
+            for sink in self.sinks:
+                if not isinstance(sink, ConsoleSink):
+                    sink.close()
+
+
+events = EventBus()
@@ -0,0 +1,150 @@
+import cv2
+import numpy as np
+
+from camera import FrameAnalysis
+from geometry import TABLE
+from metrics import metrics
+
+COORD = tuple[int, int]
+
+
+class FleetTracker:
+    """
+    Keeps the occupancy and color of every cell in view of one camera while the ships are placed.
+
+    The cells are located once on a frame where every hole is found. From then on only
+    cells whose pixels changed since they were last classified are classified again,
+    by the share of their pixels within the HSV range of each peg color.
+    A cell settles on a new state once it has been classified the same stable_frames frames in a row,
+    so a hand reaching over the board does not change the fleet.
+    """
+
+    def __init__(
+        self,
+        board_size: COORD = TABLE.size,
+        stable_frames: int = 3,
+        change_threshold: float = 12,
+        peg_share: float = 0.25,
+    ) -> None:
+        self.board_size = board_size
+        self.stable_frames = stable_frames
+        self.change_threshold = change_threshold
+        self.peg_share = peg_share
+        self.coords: list[COORD] = []
+        # corners of the square window around every cell, in the order of coords
+        self.windows: np.ndarray | None = None
+        self.reference: np.ndarray | None = None
+        self.colors: dict[COORD, str | None] = {}
+        # cells classified differently than settled, with the new state and the frames it has been seen
+        self.pending: dict[COORD, tuple[str | None, int]] = {}
+
+    @property
+    def located(self) -> bool:
+        return self.windows is not None
+
+    def settled(self) -> bool:
+        """
+        Returns True if the cells are located and no cell is changing.
+        """
+        return self.located and not self.pending
+
+    def pegs(self) -> dict[str, list[COORD]]:
+        """
+        Returns the color to the board coordinates of the settled pegs of that color.
+        """
+        color_to_board_coords: dict[str, list[COORD]] = {}
+        for coord, color in self.colors.items():
+            if color is not None:
+                color_to_board_coords.setdefault(color, []).append(coord)
+        return color_to_board_coords
+
+    def update(self, frame: FrameAnalysis) -> bool:
+        """
+        Updates the cells from a new frame.
+
+        Returns True if a cell settled on a new state.
+        """
+        with metrics.span("fleet_tracking"):
+            gray = cv2.cvtColor(frame.image, cv2.COLOR_BGR2GRAY)
+            if not self.located:
+                if not self.locate(frame):
+                    return False
+                changed = list(range(len(self.coords)))
+            else:
+                changed = self.changed_cells(gray)
+                # changing cells are classified on every frame until they settle
+                changed += [idx for idx, coord in enumerate(self.coords) if coord in self.pending and idx not in changed]
+            if not changed:
+                return False
+
+            hsv = cv2.cvtColor(frame.image, cv2.COLOR_BGR2HSV)
+            ranges = frame.camera.hsv_ranges()
+            settled = False
+            for idx in changed:
+                x0, y0, x1, y1 = self.windows[idx]
+                self.reference[y0:y1, x0:x1] = gray[y0:y1, x0:x1]
+                settled |= self.classify(self.coords[idx], hsv[y0:y1, x0:x1], ranges)
+            return settled
+
+    def locate(self, frame: FrameAnalysis) -> bool:
+        cells = frame.cell_centers(self.board_size)
+        if cells is None:
+            return False
+        self.coords = list(cells)
+        centers = np.array([cells[coord] for coord in self.coords])
+        # the windows reach a quarter of the way to the nearest hole
+        distances = np.linalg.norm(centers[:, None] - centers[None, :], axis=2)
+        np.fill_diagonal(distances, np.inf)
+        radius = max(2, int(np.median(distances.min(axis=1)) / 4))
+        height, width = frame.image.shape[:2]
+        self.windows = np.stack(
+            [
+                (centers[:, 0] - radius).clip(0, width),
+                (centers[:, 1] - radius).clip(0, height),
+                (centers[:, 0] + radius + 1).clip(0, width),
+                (centers[:, 1] + radius + 1).clip(0, height),
+            ],
+            axis=1,
+        ).astype(np.int64)
+        self.reference = np.zeros((height, width), dtype=np.uint8)
+        self.colors = {coord: None for coord in self.coords}
+        # the pegs found while locating the cells are taken over right away
+        for color, coords in (frame.board_pegs(self.board_size) or {}).items():
+            for coord in coords:
+                self.colors[coord] = color
+        return True
+
+    def changed_cells(self, gray: np.ndarray) -> list[int]:
+        """
+        Returns the indices of the cells whose mean absolute difference to the reference exceeds the threshold.
+        """
+        diff = cv2.integral(cv2.absdiff(gray, self.reference))
+        x0, y0, x1, y1 = self.windows.T
+        sums = diff[y1, x1] - diff[y0, x1] - diff[y1, x0] + diff[y0, x0]
+        areas = np.maximum((x1 - x0) * (y1 - y0), 1)
+        return np.flatnonzero(sums / areas > self.change_threshold).tolist()
+
+    def classify(self, coord: COORD, hsv: np.ndarray, ranges: dict[str, tuple[np.ndarray, np.ndarray]]) -> bool:
+        """
+        Classifies a cell from its pixels and the HSV bounds of the camera.
+
+        Returns True if the cell settled on a new state.
+        """
+        area = hsv.shape[0] * hsv.shape[1]
+        shares = {
+            color: cv2.countNonZero(cv2.inRange(hsv, lower, upper)) / area
+            for color, (lower, upper) in ranges.items()
+        }
+        color = max(shares, key=shares.get)
+        state = color if shares[color] >= self.peg_share else None
+        if state == self.colors[coord]:
+            self.pending.pop(coord, None)
+            return False
+        previous, frames = self.pending.get(coord, (state, 0))
+        frames = frames + 1 if previous == state else 1
+        if frames < self.stable_frames:
+            self.pending[coord] = (state, frames)
+            return False
+        self.pending.pop(coord, None)
+        self.colors[coord] = state
+        return True
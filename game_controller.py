@@ -1,12 +1,23 @@
+import asyncio
+import sys
 import time
-from time import sleep
-import cv2
+from concurrent.futures import Executor
 import pyglet
 
 import aruco_map
 from battleships import Game, GuessReturn, Ship
-from camera import Camera
+from camera import Camera, FrameAnalysis, VideoRecorder
+from events import DEBUG, WARNING, events
+from fleet_tracker import FleetTracker
+from geometry import TABLE
+from history import GameHistory
+from journal import GameJournal, restore_game
+from metrics import metrics
+from network import RemotePlayerServer
+from shift_valves import Table, ValveScheduler
+from tracing import Trace, tracer
 from ui import GameStatus, Interface
+from vision_pool import VisionPool
 import threading
 
 SHIP_SIZE_MM = 15
@@ -15,13 +26,57 @@ COORD = tuple[int, int]
 
 
 class GameController:
-    def __init__(self, camera: Camera, dev: bool):
+    """
+    Runs a game on one air table.
+
+    The game is driven by a single asyncio event loop with a periodic task per concern:
+    capturing frames, detecting ships and guesses on the newest frame, closing valves
+    and rendering the UI, each at its own rate. Guesses from the camera, the terminal in
+    developer mode and the remote player all end up in one queue the game waits on.
+
+    While tracing is enabled, a guess seen by the camera is traced from the capture of its
+    frame through making the guess and opening the valve to the UI frame showing it.
+    """
+
+    capture_fps = 30
+    render_fps = 60
+    valve_hz = 100
+    # seconds between checks whether the cameras drifted from their calibration
+    calibration_interval = 5
+
+    def __init__(
+        self,
+        camera: Camera,
+        dev: bool,
+        journal_path: str | None = None,
+        table: Table | None = None,
+        remote: RemotePlayerServer | None = None,
+        history: GameHistory | None = None,
+        vision: VisionPool | None = None,
+        archive_dir: str | None = None,
+        recorder: VideoRecorder | None = None,
+    ):
+        """
+        vision runs the detectors in worker processes, if given, instead of on the executor of play.
+        The journal of a finished game is moved into archive_dir, if given.
+        recorder records every captured frame into a video, if given.
+        """
         self.camera = camera
-        self.board_size = (14, 12)
+        self.board_size = TABLE.size
         self.ships: list[Ship] | None = None
         self.game = None
         self.dev = dev
-        self.stop_event = threading.Event()
+        self.journal = GameJournal(journal_path, archive_dir=archive_dir) if journal_path else None
+        self.table = table
+        self.valves = ValveScheduler(table) if table is not None else None
+        self.remote = remote
+        self.history = history
+        self.vision = vision
+        self.recorder = recorder
+        # one per camera, keeping the pegs placed while waiting for the ships to be confirmed
+        self.fleet_trackers: list[FleetTracker] = []
+        # players whose dials showed more than one marker in the last frame
+        self.ambiguous_dials: set[int] = set()
 
     def reset(self):
         """
@@ -29,6 +84,7 @@ class GameController:
         """
         self.ships = None
         self.game = None
+        self.fleet_trackers = []
 
     def split_coords(self, board_x_len: int, points: list[tuple[int, int]]):
         """
@@ -44,18 +100,23 @@ class GameController:
             raise ValueError("More ship sections on one side")
         return ((left_half, 1), (right_half, 2))
 
-    def try_initialize(self):
+    def try_initialize(self, frame: FrameAnalysis | None = None):
         """
         Tries to initialize the game.
         """
-        if self.dev:
-            self.ships = self.get_dev_ships()
-            self.game = Game(board_size=self.board_size, ships=self.ships)
+        ships = self.get_dev_ships() if self.dev else self.detect_ships(frame)
+        if ships is not None:
+            self.start_game(ships)
 
+    def detect_ships(self, frame: FrameAnalysis | None = None) -> list[Ship] | None:
+        """
+        Detects the confirmed ships, once both players set their dials to zero.
+        Only reads the state of the controller, so it can run on the executor.
 
-        detected_arucos = self.camera.get_ids_of_detected_arucos(
-            self.camera.get_image()
-        )
+        Returns the ships, or None if they are not confirmed or could not be detected.
+        """
+        frame = frame if frame is not None else self.camera.capture()
+        detected_arucos = frame.arucos()
         pl1x = aruco_map.PLAYER1_VERTICAL_Y_COORD_TO_ARUCO_ID
         pl1y = aruco_map.PLAYER1_HORIZONTAL_X_COORD_TO_ARUCO_ID
         pl2x = aruco_map.PLAYER2_VERTICAL_Y_COORD_TO_ARUCO_ID
@@ -64,11 +125,51 @@ class GameController:
         zero_ids = {min(pl_dict.keys()) for pl_dict in (pl1x, pl1y, pl2x, pl2y)}
         detected_arucos_set = set(detected_arucos)
         if not zero_ids.issubset(detected_arucos_set):
+            return None
+        if self.fleet_trackers and all(tracker.settled() for tracker in self.fleet_trackers):
+            ships = self.ships_from_pegs(self.tracked_pegs())
+        else:
+            ships = self.get_ships(frame)
+        if ships is None:
+            metrics.count("ship_detection_failures")
+        return ships
+
+    def start_game(self, ships: list[Ship]):
+        """
+        Starts the game with the confirmed ships.
+        """
+        self.ships = ships
+        self.game = Game(board_size=self.board_size, ships=self.ships, table=self.valves, journal=self.journal)
+
+    def try_resume(self, interface: Interface):
+        """
+        Tries to resume an unfinished game from the journal, skipping ship detection.
+        The UI is brought back to the state of the resumed game.
+        """
+        if self.journal is None:
             return
-        self.ships = self.get_ships()
-        if self.ships is None:
+        try:
+            restored = restore_game(self.journal, self.valves)
+        except ValueError as e:
+            events.error(f"Could not resume game from journal: {e}", "resume_failed", reason=str(e))
             return
-        self.game = Game(board_size=self.board_size, ships=self.ships)
+        if restored is None:
+            return
+        self.game, moves = restored
+        self.ships = self.game.ships
+        for _, guess, result in moves:
+            match result:
+                case GuessReturn.hit:
+                    interface.hit(guess)
+                case GuessReturn.miss:
+                    interface.miss(guess)
+        sunk = [
+            sorted(ship.filled) for board in (self.game.p1_board, self.game.p2_board) for ship in board.dead_ships
+        ]
+        events.info(
+            f"Resumed game from journal after {len(moves)} guesses", "resumed",
+            guesses=len(moves), moves=moves, sunk=sunk,
+        )
 
     def get_dev_ships(self) -> list[Ship]:
         """
@@ -89,7 +190,7 @@ class GameController:
             right_half = all(x >= self.board_size[0] // 2 for x, _ in sections)
 
             if not (left_half or right_half):
-                print(f"Skipping ship crossing center line: {sections}")
+                events.warning(f"Skipping ship crossing center line: {sections}", "invalid_ship", sections=sections)
                 continue  # Invalid: ship crosses boundary
 
             player = 1 if left_half else 2
@@ -97,12 +198,11 @@ class GameController:
                 ship = Ship(sections, player)
                 ships.append(ship)
             except ValueError as e:
-                print(f"Skipping invalid ship: {e}")
-                print(f"Found at: {sections}")
+                events.warning(f"Skipping invalid ship: {e}\nFound at: {sections}", "invalid_ship", reason=str(e), sections=sections)
 
         return ships
 
-    def get_ships(self, image: cv2.typing.MatLike | None = None) -> list[Ship] | None:
+    def get_ships(self, frame: FrameAnalysis | None = None) -> list[Ship] | None:
         """
         Converts raw ship data from the camera into Ship objects.
         Each ship is a list of coordinates.
@@ -110,49 +210,19 @@ class GameController:
         Returns list of ships if creation was succesful. Else it returns None.
         """
 
-        img = image if image is not None else self.camera.get_image()
-        detected_holes = self.camera.detect_holes(img, show_img=False)
-        if not detected_holes:
-            return None
-        color_to_coords = self.camera.detect_colors(img, show_img=False)
-        coord_to_color = {
-            coord: color
-            for color, coord_lst in color_to_coords.items()
-            for coord in coord_lst
-        }
-        color_coords = [
-            coord for coord_list in color_to_coords.values() for coord in coord_list
-        ]
-        board_coords = [
-            (int(detected_hole[0]), int(detected_hole[1]))
-            for detected_hole in detected_holes
-        ] + color_coords
-        if len(board_coords) != self.board_size[0] * self.board_size[1]:
-            print("More holes than expected (actual, expected, colors, holes)", len(board_coords), self.board_size[0] * self.board_size[1], len(color_coords), len(detected_holes))
+        frame = frame if frame is not None else self.camera.capture()
+        color_to_board_coords = frame.board_pegs(self.board_size)
+        if color_to_board_coords is None:
             return None
+        return self.ships_from_pegs(color_to_board_coords)
 
-        board_coords_copy = board_coords.copy()
-        image_coord_to_board_coord: dict[tuple[int, int], tuple[int, int]] = {}
-        y_counter = 0
-        while y_counter <= self.board_size[1] - 1:
-            board_coords_copy.sort(key=lambda c: c[1])
-            row = board_coords_copy[0 : self.board_size[0]]
-            row.sort(key=lambda c: c[0])
-            for i, c in enumerate(row):
-                image_coord_to_board_coord[c] = (
-                    (self.board_size[0] - 1) - i,
-                    y_counter,
-                )
-            board_coords_copy = board_coords_copy[self.board_size[0] :]
-            y_counter += 1
-
-        color_to_board_coords: dict[str, list[tuple[int,int]]] = {}
-        for color_coord in color_coords:
-            color_to_board_coords.setdefault(coord_to_color[color_coord], [])
-            color_to_board_coords[coord_to_color[color_coord]].append(
-                image_coord_to_board_coord[color_coord]
-            )
-        print(color_to_board_coords)
+    def ships_from_pegs(self, color_to_board_coords: dict[str, list[tuple[int, int]]]) -> list[Ship] | None:
+        """
+        Converts the board coordinates of the pegs of every color into Ship objects.
+
+        Returns list of ships if creation was succesful. Else it returns None.
+        """
+        events.debug(str(color_to_board_coords), "pegs", pegs=color_to_board_coords)
 
         ships = []
 
@@ -160,9 +230,10 @@ class GameController:
             coord for coords in color_to_board_coords.values() for coord in coords
         ]
         if len(set(coords)) != len(coords):
-            print(
-                "Duplicate ship coords found",
-                next(coord for coord in coords if coords.count(coord) > 1),
+            duplicate = next(coord for coord in coords if coords.count(coord) > 1)
+            events.emit(
+                "detection_failure", f"Duplicate ship coords found {duplicate}", WARNING,
+                reason="duplicate_coord", coord=duplicate,
             )
             return None
 
@@ -172,7 +243,10 @@ class GameController:
                     self.board_size[0], board_coords
                 )
             except ValueError as e:
-                print(f"Invalid ship formation: {e}")
+                events.emit(
+                    "detection_failure", f"Invalid ship formation: {e}", WARNING,
+                    reason="invalid_formation", detail=str(e),
+                )
                 return None
 
             for side in (left, right):
@@ -180,133 +254,406 @@ class GameController:
                     ship = Ship(*side)
                     ships.append(ship)
                 except ValueError as e:
-                    print(f"Skipping invalid ship: {e}")
-                    print(f"Found at: {side}")
+                    events.emit(
+                        "detection_failure", f"Skipping invalid ship: {e}\nFound at: {side}", WARNING,
+                        reason="invalid_ship", detail=str(e), sections=side[0],
+                    )
                     return None
 
         return ships
 
+    def track_fleet(
+        self, frame: FrameAnalysis, trackers: list[FleetTracker]
+    ) -> tuple[list[FleetTracker], bool]:
+        """
+        Updates the trackers of the placed pegs from a new frame, only looking at the cells that changed.
+        A tracker per camera is created if none are given.
+
+        Returns the trackers and whether the placed pegs changed.
+        """
+        views = frame.views()
+        if not trackers:
+            trackers = [FleetTracker(self.board_size) for _ in views]
+        changed = False
+        for tracker, view in zip(trackers, views):
+            changed |= tracker.update(view)
+        return trackers, changed
+
+    def tracked_pegs(self) -> dict[str, list[tuple[int, int]]]:
+        """
+        Returns the color to the board coordinates of the pegs placed in view of all cameras.
+        """
+        color_to_board_coords: dict[str, list[tuple[int, int]]] = {}
+        for tracker in self.fleet_trackers:
+            for color, coords in tracker.pegs().items():
+                color_to_board_coords.setdefault(color, []).extend(coords)
+        return color_to_board_coords
+
     def get_guess(
-        self, img: cv2.typing.MatLike | None = None, player_num: int | None = None
+        self, frame: FrameAnalysis | None = None, player_num: int | None = None
     ) -> tuple[int, int] | None:
         """
         Tries to read the guess from the camera
 
         Returns guess if present. Else it returns None
         """
-        img = img if img is not None else self.camera.get_image()
-        ids = self.camera.get_ids_of_detected_arucos(img)
         if not player_num:
             player_num = self.game.current_player()
+        return self.get_dials(frame)[player_num]
 
-        if player_num == 1:
-            x_map = aruco_map.PLAYER1_HORIZONTAL_X_COORD_TO_ARUCO_ID
-            y_map = aruco_map.PLAYER1_VERTICAL_Y_COORD_TO_ARUCO_ID
-            confirm = aruco_map.PLAYER1_GUESS_CONFIRM
-        else:
-            x_map = aruco_map.PLAYER2_HORIZONTAL_X_COORD_TO_ARUCO_ID
-            y_map = aruco_map.PLAYER2_VERTICAL_Y_COORD_TO_ARUCO_ID
-            confirm = aruco_map.PLAYER2_GUESS_CONFIRM
-        if confirm not in ids:
-            return None
-
-        x_range = range(min(x_map), max(x_map) + 1)
-        y_range = range(min(y_map), max(y_map) + 1)
-
-        xs = [id for id in ids if id in x_range]
-        ys = [id for id in ids if id in y_range]
-
-        if not xs or not ys:
-            return None
-
-        if len(xs) > 1 or len(ys) > 1:
-            print("More than one guess coord id found: xs", xs, "ys", ys)
-            return None
-
-        if xs[0] not in x_map or ys[0] not in y_map:
-            print("KeyError: xs0", xs[0], "ys0", ys[0])
-            return None
+    def get_dials(self, frame: FrameAnalysis | None = None) -> dict[int, tuple[int, int] | None]:
+        """
+        Reads the dials of both players from the camera.
 
-        return y_map[ys[0]], x_map[xs[0]]
+        Returns the player to their confirmed guess, or None if they have not confirmed one.
+        """
+        frame = frame if frame is not None else self.camera.capture()
+        ids = frame.arucos()
+        with metrics.span("guess_decoding"):
+            return self.decode_dials(ids)
 
-    def handle_next_frame(self, last_time: float, interface: Interface):
+    def decode_dials(self, ids: list[int]) -> dict[int, tuple[int, int] | None]:
         """
-        Generates the next frame for the UI.
+        Decodes the guesses of both players from the ids of the detected arucos.
 
-        Returns the last time the UI was updated.
+        A guess is present if the confirm marker and one marker per dial of the player are detected.
         """
-        if interface.key_handler[pyglet.window.key.ESCAPE]:
-            self.stop_event.set()
-            exit(0)
+        return {
+            player: coord if confirmed else None
+            for player, (coord, confirmed) in aruco_map.decode_dials(ids, self.ambiguous_dials).items()
+        }
 
-        elapsed_time = time.perf_counter() - last_time
-        if elapsed_time > 1 / 60:
-            last_time = time.perf_counter()
-            interface.next_frame()
-        return last_time
+    def apply_guess(
+        self, guess: tuple[int, int], interface: Interface, trace: Trace | None = None
+    ) -> GuessReturn:
+        """
+        Makes the guess for the current player and shows the outcome on the UI.
 
-    def run(self):
+        Returns the game state the guess led to.
         """
-        Main game loop.
+        current_player = self.game.current_player()
+        last_burst = self.valves.last_burst if self.valves is not None else None
+        with metrics.span("make_guess"):
+            result = self.game.make_guess(guess)
+        metrics.count(f"guess_{result.value}")
+        if trace is not None:
+            trace.hop("make_guess")
+            trace.result = result.value
+            if self.valves is not None and self.valves.last_burst != last_burst:
+                trace.hop("valve", self.valves.last_burst)
+        if self.remote is not None:
+            self.remote.send_result(current_player, guess, result)
+            if result in (GuessReturn.hit, GuessReturn.miss):
+                self.remote.send_turn(self.game.current_player())
+
+        match result:
+            case GuessReturn.hit:
+                interface.hit(guess)
+            case GuessReturn.miss:
+                interface.miss(guess)
+            case GuessReturn.dupe_guess:
+                interface.handle_game_status(GameStatus.repeat_guess)
+
+        events.info(f"Guess at {guess}: {result.value}", "result", player=current_player, guess=guess, result=result)
+
+        if trace is not None:
+            if interface.dirty:
+                self.unrendered.append(trace)
+            else:
+                tracer.finish(trace)
+
+        if result == GuessReturn.finished_game:
+            events.info(f"Game Over! Player {self.game.current_player()} wins! ", "game_over", winner=self.game.current_player())
+        return result
+
+    async def play(self, interface: Interface, executor: Executor | None = None):
         """
-        interface = Interface()
-        last_time = time.perf_counter()
+        Plays a game without blocking the event loop.
 
-        if not self.dev:
-            recording_thread = threading.Thread(target=self.camera.record, args=(self.stop_event,))
-            recording_thread.start()
-            
-        while self.game is None:
+        Capturing and detection run on the given executor, so several tables can share one process.
+        """
+        self.guesses: asyncio.Queue[tuple[COORD, Trace | None]] = asyncio.Queue()
+        self.unrendered: list[Trace] = []
+        self.frame: FrameAnalysis | None = None
+        self.new_frame = asyncio.Event()
+        self.started = asyncio.Event()
+        tasks = []
+        if self.valves is not None:
+            tasks.append(asyncio.create_task(self.periodic(self.valves.update, self.valve_hz)))
+        if self.journal is not None:
+            # the last guess of a quiet stretch is synced as well
+            tasks.append(asyncio.create_task(self.periodic(self.journal.sync, 1 / self.journal.fsync_interval)))
+        if self.remote is not None:
+            loop = asyncio.get_running_loop()
+            self.remote.notify = lambda: loop.call_soon_threadsafe(self.poll_remote)
+        if self.dev:
+            self.read_terminal()
+        else:
+            tasks.append(asyncio.create_task(self.capture(executor)))
+            tasks.append(asyncio.create_task(self.detect(executor, interface)))
+            if self.vision is not None:
+                tasks.append(asyncio.create_task(self.deliver()))
+
+        turns = asyncio.create_task(self.turns(interface))
+        render = asyncio.create_task(self.render(interface))
+        try:
+            # a failing capture or detection ends the game as well
+            await asyncio.wait((turns, render, *tasks), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if self.remote is not None:
+                self.remote.notify = None
+            for task in (*tasks, turns, render):
+                task.cancel()
+            if self.valves is not None:
+                self.valves.update(closing_all=True)
+            for trace in self.unrendered:
+                tracer.finish(trace)
+        for task in (turns, render, *tasks):
+            if task.done() and not task.cancelled():
+                task.result()
+
+    async def turns(self, interface: Interface):
+        """
+        Waits for the ships to be confirmed, then makes the guesses of the players until the game is finished.
+        """
+        self.try_resume(interface)
+        interface.handle_game_status(GameStatus.await_ship_confirmation)
+        if self.dev and self.game is None:
             self.try_initialize()
-            interface.handle_game_status(GameStatus.await_ship_confirmation)
-            last_time = self.handle_next_frame(last_time, interface)
-            sleep(0.2)
+        if self.game is None:
+            await self.started.wait()
 
-        print([ship.filled for ship in self.ships])
+        interface.show_pegs({})
+        events.debug(str([ship.filled for ship in self.ships]), "ships", ships=[(ship.player, ship.filled) for ship in self.ships])
+        if self.remote is not None:
+            self.remote.send_turn(self.game.current_player())
         dupe_guess = False
         while True:
-            print(f"Player {self.game.current_player()}'s turn")
+            events.info(f"Player {self.game.current_player()}'s turn", "turn", player=self.game.current_player())
             if not dupe_guess:
                 interface.handle_game_status(
                     GameStatus.player_num_to_await(self.game.current_player())
                 )
-            if self.dev:
+            if self.dev and not self.is_remote_turn():
+                events.info("Enter your guess (x,y): ", "prompt")
+            if self.is_remote_turn() and self.guesses.empty():
+                # a guess sent before the turn began
+                self.poll_remote()
+            guess, trace = await self.guesses.get()
+            result = self.apply_guess(guess, interface, trace)
+            dupe_guess = result == GuessReturn.dupe_guess
+            if result == GuessReturn.finished_game:
+                break
+        self.finish()
+        while self.valves is not None and self.valves.closing:
+            await asyncio.sleep(1 / self.valve_hz)
+
+    async def periodic(self, callback, rate: float):
+        """
+        Calls the callback rate times per second.
+        """
+        interval = 1 / rate
+        next_time = time.perf_counter()
+        while True:
+            callback()
+            next_time += interval
+            await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+
+    async def capture(self, executor: Executor | None):
+        """
+        Captures frames from the camera and signals every new frame.
+        """
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.capture_fps
+        while True:
+            started = time.perf_counter()
+            frame = await loop.run_in_executor(executor, self.camera.capture)
+            if self.recorder is not None:
+                self.recorder.add(frame.image)
+            if self.vision is None:
+                self.frame = frame
+                self.new_frame.set()
+            else:
+                self.vision.submit(frame, self.needed_detections())
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+    async def deliver(self):
+        """
+        Signals every frame the vision pool is done with, in the order they were captured.
+        """
+        async for frame in self.vision.results():
+            self.frame = frame
+            self.new_frame.set()
+
+    def needed_detections(self) -> tuple[str, ...]:
+        """
+        Returns the detections the vision pool runs on the next frame.
+
+        The board is located and the ships are detected until the pegs have settled,
+        afterwards only the dials are read, which the pool leaves to the game process.
+        """
+        if self.game is None and not (self.fleet_trackers and all(tracker.settled() for tracker in self.fleet_trackers)):
+            return ("holes", "colors")
+        return ()
+
+    async def detect(self, executor: Executor | None, interface: Interface):
+        """
+        Detects the ships, or the guesses of both players, on the newest frame.
+
+        A guess is queued once when it appears, and not again while the dials stay the same.
+        The dials of the player waiting for their turn are tracked as well, so a guess they
+        confirm before their turn is queued as soon as the turn begins.
+        The frame and its detections are handed to the camera preview, if shown.
+        """
+        loop = asyncio.get_running_loop()
+        last_guess: dict[int, COORD | None] = {}
+        # guesses that appeared and have not been queued yet, with the capture time of the frame they appeared on
+        ready: dict[int, tuple[COORD, float]] = {}
+        last_calibration_check = 0.0
+        while True:
+            await self.new_frame.wait()
+            self.new_frame.clear()
+            frame = self.frame
+            if self.game is None:
+                # the results are assigned here, as turns and render read them on the loop
+                self.fleet_trackers, changed = await loop.run_in_executor(
+                    executor, self.track_fleet, frame, self.fleet_trackers
+                )
+                if changed:
+                    interface.show_pegs(self.tracked_pegs())
+                ships = await loop.run_in_executor(executor, self.detect_ships, frame)
+                # unless a game was resumed meanwhile
+                if ships is not None and self.game is None:
+                    self.start_game(ships)
+                    self.started.set()
+            else:
+                dials = await loop.run_in_executor(executor, self.get_dials, frame)
+                for player, guess in dials.items():
+                    if guess != last_guess.get(player):
+                        if guess is None:
+                            ready.pop(player, None)
+                        else:
+                            ready[player] = (guess, frame.captured)
+                    last_guess[player] = guess
+                player = self.game.current_player()
+                if not self.is_remote_turn() and player in ready:
+                    guess, captured = ready.pop(player)
+                    trace = tracer.start(player, guess, captured)
+                    if trace is not None:
+                        trace.hop("decoded")
+                    events.emit("guess", f"Player {player} guessed {guess} on the dials", DEBUG, player=player, guess=guess, source="camera")
+                    self.guesses.put_nowait((guess, trace))
+            if interface.preview is not None:
+                interface.preview.show(frame.image, self.camera.markers, self.camera.pegs)
+            if time.monotonic() - last_calibration_check > self.calibration_interval:
+                last_calibration_check = time.monotonic()
+                await loop.run_in_executor(executor, self.check_calibration, frame)
+
+    def check_calibration(self, frame: FrameAnalysis):
+        """
+        Calibrates the cameras that are not calibrated yet, or whose markers or lighting drifted.
+        Once the ships are placed, cameras calibrated without pegs in view are calibrated again for the peg colors.
+        """
+        for view in frame.views():
+            camera = view.camera
+            if camera.profile is not None:
+                reason = camera.profile.drift(view)
+                if reason is None and (self.game is None or camera.profile.hsv_ranges):
+                    continue
+                events.info(f"Calibrating camera again: {reason or 'peg colors'}", "calibration_drift", reason=reason or "peg colors")
+            if camera.calibrate(view, self.board_size):
+                events.info(f"Calibrated camera, profile stored at {camera.profile_path}", "calibrated", path=camera.profile_path)
+
+    def queue_local_guess(self, guess: COORD):
+        """
+        Queues a guess typed in the terminal, unless it is the turn of the remote player.
+        """
+        if self.game is not None and not self.is_remote_turn():
+            events.emit("guess", f"Guess {guess} typed in", DEBUG, player=self.game.current_player(), guess=guess, source="terminal")
+            self.guesses.put_nowait((guess, None))
+
+    def poll_remote(self):
+        """
+        Queues the guess of the remote player, if it is their turn.
+        Called by the remote server as soon as a guess arrives, and when the turn of the remote player begins.
+        """
+        if self.game is None or not self.is_remote_turn():
+            return
+        guess = self.remote.poll_guess()
+        if guess is not None:
+            events.emit("guess", f"Remote guess {guess}", DEBUG, player=self.remote.player, guess=guess, source="remote")
+            self.guesses.put_nowait((guess, None))
+
+    def read_terminal(self):
+        """
+        Reads guesses from the terminal on a separate thread, so the UI keeps running while waiting.
+        """
+        loop = asyncio.get_running_loop()
+
+        def read():
+            for line in sys.stdin:
                 try:
-                    last_time = self.handle_next_frame(last_time, interface)
-                    sleep(0.2)
-                    raw_input = input("Enter your guess (x,y): ").strip()
-                    x_str, y_str = raw_input.split(",")
+                    x_str, y_str = line.strip().split(",")
                     guess = (int(x_str), int(y_str))
                 except ValueError:
-                    print(
-                        "Invalid input format. Please enter coordinates like '3,5'.\n"
-                    )
+                    events.warning("Invalid input format. Please enter coordinates like '3,5'.\n", "invalid_input", line=line.strip())
                     continue
-            if not self.dev:
-                guess = None
-                while guess is None:
-                    guess = self.get_guess()
-                    last_time = self.handle_next_frame(last_time, interface)
-                    sleep(0.2)
-
-            current_player = self.game.current_player()
-            result = self.game.make_guess(guess)
+                loop.call_soon_threadsafe(self.queue_local_guess, guess)
 
-            dupe_guess = False
-            match result:
-                case GuessReturn.hit:
-                    interface.hit(current_player, guess)
-                case GuessReturn.miss:
-                    interface.miss(current_player, guess)
-                case GuessReturn.dupe_guess:
-                    interface.handle_game_status(GameStatus.repeat_guess)
-                    dupe_guess = True
+        threading.Thread(target=read, daemon=True).start()
 
-            print(f"Guess at {guess}: {result.value}")
+    async def render(self, interface: Interface):
+        """
+        Draws the UI until escape is pressed.
+        """
+        while not interface.key_handler[pyglet.window.key.ESCAPE]:
+            if interface.next_frame() and self.unrendered:
+                for trace in self.unrendered:
+                    trace.hop("ui")
+                    tracer.finish(trace)
+                self.unrendered.clear()
+            await asyncio.sleep(1 / self.render_fps)
+
+    def finish(self):
+        """
+        Stores the finished game, archives its journal and closes the remote connection.
+        """
+        if self.history is not None:
+            self.history.add_game(self.game)
+        if self.journal is not None:
+            archived = self.journal.finish()
+            if archived is not None:
+                events.info(f"Journal archived as {archived}", "journal_archived", path=archived)
+        if self.remote is not None:
+            self.remote.close()
+
+    def close(self):
+        """
+        Shuts down the vision workers and the recorder, and releases the camera and the air table.
+        """
+        if self.vision is not None:
+            self.vision.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.camera.close()
+        if self.table is not None:
+            self.table.close()
+
+    def is_remote_turn(self) -> bool:
+        """
+        Returns True if the player guessing now plays from a remote client.
+        """
+        return self.remote is not None and self.game.current_player() == self.remote.player
 
-            if result == GuessReturn.finished_game:
-                print(f"Game Over! Player {self.game.current_player()} wins! ")
-                break
-            print(result)
-        self.stop_event.set()
-        exit(0)
+    def run(self, preview: bool = False):
+        """
+        Main game loop.
+
+        preview shows the camera frames with the detected markers and pegs in the UI.
+        """
+        interface = Interface(preview)
+        try:
+            asyncio.run(self.play(interface))
+        finally:
+            interface.close()
+            self.close()
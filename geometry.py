@@ -0,0 +1,134 @@
+import numpy as np
+
+from hardware_variables import TableSize
+from mappings import board19_mapping, flipped_mapping, normal_board_mapping
+
+COORD = tuple[int, int]
+
+# axes of the dials, as in the rows of TableGeometry.decode
+X_DIAL = 0
+Y_DIAL = 1
+CONFIRM = 2
+MAX_ARUCO_ID = 250
+
+
+class TableGeometry:
+    """
+    The layout of an air table, from which every transform between its coordinate systems is precomputed.
+
+    Table coordinates (x, y) address the cells of the whole table. Player 1 owns the columns
+    left of the middle and player 2 the rest, sitting opposite, so the coordinates of player 2
+    are those of player 1 turned by 180 degrees. Each player's half is shown on their UI board,
+    turned so the player reads it from their seat.
+
+    dial_ids are the first aruco ids of the x dial and the y dial and the id of the confirm marker of player 1
+    and player 2. The x dial of player 1 runs from the far edge of the table to the middle, and the y dial
+    from y 0 up, and the dials of player 2 the same way from their seat.
+
+    The valves are driven by shift register boards of valve_board cells, daisy chained in columns
+    from the right edge, running down and up in turns. Boards running up are mounted flipped,
+    and valve_mappings gives the pin mapping of boards wired differently, by their place in the chain.
+
+    The per cell transforms are arrays indexed [y, x], so they apply to single cells
+    and to whole boards at once.
+    """
+
+    def __init__(
+        self,
+        size: COORD = (14, 12),
+        dial_ids: dict[int, tuple[int, int, int]] | None = None,
+        valve_board: COORD = (2, 4),
+        valve_mappings: dict[int, dict[COORD, int]] | None = None,
+    ) -> None:
+        self.size = size
+        self.width, self.height = size
+        self.half = self.width // 2
+        self.dial_ids = dial_ids or {1: (10, 17, 100), 2: (30, 37, 101)}
+        self.valve_board = valve_board
+        self.valve_mappings = {2: board19_mapping} if valve_mappings is None else valve_mappings
+
+        ys, xs = np.mgrid[0:self.height, 0:self.width]
+        # player owning every cell, and the cell as the owner sees it from their seat
+        self.owner = np.where(xs < self.half, 1, 2)
+        self.player_x = np.where(self.owner == 1, xs, self.width - 1 - xs)
+        self.player_y = np.where(self.owner == 1, ys, self.height - 1 - ys)
+        # the cell on the UI board of its owner
+        self.ui_size = (self.height, self.half)
+        self.ui_x = self.height - 1 - self.player_y
+        self.ui_y = self.player_x
+        # the cells of the table shown at every place of a UI board, indexed [player - 1, ui_y, ui_x]
+        self.ui_table_x = np.zeros((2, self.half, self.height), dtype=np.int64)
+        self.ui_table_y = np.zeros((2, self.half, self.height), dtype=np.int64)
+        self.ui_table_x[self.owner - 1, self.ui_y, self.ui_x] = xs
+        self.ui_table_y[self.owner - 1, self.ui_y, self.ui_x] = ys
+
+        self.layout = self.valve_layout()
+        # the byte of the shift string and the bit in it of the valve of every cell
+        self.valve_byte = np.full((self.height, self.width), -1, dtype=np.int64)
+        self.valve_mask = np.zeros((self.height, self.width), dtype=np.uint8)
+        for bid, ((x0, y0), mapping) in enumerate(self.layout):
+            for (x, y), pin in mapping.items():
+                # the last board of the chain is shifted out first
+                self.valve_byte[y0 + y, x0 + x] = len(self.layout) - 1 - bid
+                self.valve_mask[y0 + y, x0 + x] = 0x80 >> pin
+
+        self.decode = np.zeros((MAX_ARUCO_ID, 3), dtype=np.int8)
+        for player in (1, 2):
+            for axis in (X_DIAL, Y_DIAL):
+                for id, value in self.dial(player, axis).items():
+                    self.decode[id] = (player, axis, value)
+            self.decode[self.dial_ids[player][CONFIRM]] = (player, CONFIRM, 0)
+
+    def valve_layout(self) -> list[tuple[COORD, dict[COORD, int]]]:
+        """
+        Returns the offset and pin mapping of every shift register board, in the order they are chained.
+        """
+        board_width, board_height = self.valve_board
+        layout = []
+        for column, x in enumerate(range(self.width - board_width, -1, -board_width)):
+            if column % 2 == 0:
+                layout += [((x, y), normal_board_mapping) for y in range(self.height - board_height, -1, -board_height)]
+            else:
+                layout += [((x, y), flipped_mapping) for y in range(0, self.height, board_height)]
+        for bid, mapping in self.valve_mappings.items():
+            layout[bid] = (layout[bid][0], mapping)
+        return layout
+
+    def dial(self, player: int, axis: int) -> dict[int, int]:
+        """
+        Returns the aruco id to the coordinate of every position of a dial of the player.
+        """
+        first = self.dial_ids[player][axis]
+        if axis == X_DIAL:
+            # the dial guesses on the half of the opponent
+            values = range(self.width - 1, self.half - 1, -1)
+        else:
+            values = range(self.height)
+        if player == 2:
+            values = [(self.width if axis == X_DIAL else self.height) - 1 - value for value in values]
+        return {first + idx: value for idx, value in enumerate(values)}
+
+    def to_ui(self, coord: COORD) -> tuple[int, COORD]:
+        """
+        Returns the player whose UI board shows the cell, and the cell on that board.
+        """
+        x, y = coord
+        return int(self.owner[y, x]), (int(self.ui_x[y, x]), int(self.ui_y[y, x]))
+
+    def ui_board(self, values: np.ndarray, player: int) -> np.ndarray:
+        """
+        Returns the values of a whole table, e.g. a heatmap indexed [y, x], laid out as the UI board of the player.
+        """
+        return values[self.ui_table_y[player - 1], self.ui_table_x[player - 1]]
+
+    def valve_frame(self, open_cells: np.ndarray) -> bytes:
+        """
+        Returns the shift string opening the valves of the cells set in open_cells, indexed [y, x].
+        """
+        frame = np.zeros(len(self.layout), dtype=np.uint8)
+        cells = open_cells.astype(bool) & (self.valve_byte >= 0)
+        np.bitwise_or.at(frame, self.valve_byte[cells], self.valve_mask[cells])
+        return frame.tobytes()
+
+
+TABLE = TableGeometry(TableSize)
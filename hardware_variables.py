@@ -1,4 +1,15 @@
 #!/usr/bin/env python3
+#Serial port of the air table, None to use the first Arduino found
 Port='COM3'
 CameraNum=1
 TableActive = False
+#Camera number and the columns of the board (start, end) seen by every camera of the table, None for the whole board
+#e.g. one camera per player half: [(1, (0, 7)), (2, (7, 14))]
+Cameras = [(CameraNum, None)]
+#Cameras (like Cameras above) and air table port of every table run by the orchestrator
+Tables = [(Cameras, Port)]
+#Resolution (width, height) and frame rate requested from the cameras, None for the driver default resolution
+CaptureSize = None
+CaptureFps = 30
+#Size of the air table in cells (width, height)
+TableSize = (14, 12)
@@ -0,0 +1,189 @@
+import argparse
+import sqlite3
+import time
+from collections import Counter
+
+import numpy as np
+
+from battleships import Game, GuessReturn
+from geometry import TABLE
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    winner INTEGER,
+    shots INTEGER NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ships (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    player INTEGER NOT NULL,
+    ship INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS guesses (
+    game_id INTEGER NOT NULL REFERENCES games(id),
+    turn INTEGER NOT NULL,
+    player INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cell_counts (
+    kind TEXT NOT NULL,
+    player INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (kind, player, x, y)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS games_winner ON games(winner, shots);
+CREATE INDEX IF NOT EXISTS ships_player ON ships(player);
+CREATE INDEX IF NOT EXISTS ships_cell ON ships(x, y);
+CREATE INDEX IF NOT EXISTS guesses_game ON guesses(game_id, turn);
+CREATE INDEX IF NOT EXISTS guesses_player ON guesses(player);
+CREATE INDEX IF NOT EXISTS guesses_cell ON guesses(x, y);
+CREATE INDEX IF NOT EXISTS guesses_turn ON guesses(turn);
+"""
+
+# kinds of per cell counts kept up to date when a game is added
+HEATMAP_KINDS = ("guesses", "hits", "first_hits", "ships")
+
+# results of guesses that landed on the board, the winning guess being a hit
+SHOT_RESULTS = (GuessReturn.hit, GuessReturn.miss, GuessReturn.finished_game)
+
+
+class GameHistory:
+    """
+    Store of finished games in a local SQLite database.
+
+    Besides the raw guesses and fleets, counts per cell are updated when a game is added,
+    so heatmaps are read from at most one row per cell regardless of the number of games.
+    """
+
+    def __init__(self, path: str = "history.sqlite") -> None:
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def add_game(self, game: Game) -> int:
+        """
+        Adds the fleets and guesses of a game in a single transaction.
+
+        Returns the id of the game.
+        """
+        winner = None
+        if game.moves and game.moves[-1][2] == GuessReturn.finished_game:
+            winner = game.moves[-1][0]
+        shots = sum(1 for player, _, result in game.moves if player == winner and result in SHOT_RESULTS)
+
+        counts = Counter()
+        ships = []
+        for idx, ship in enumerate(game.ships):
+            for x, y in ship.filled:
+                ships.append((idx, ship.player, x, y))
+                counts["ships", ship.player, x, y] += 1
+        guesses = []
+        first_hit = set()
+        for turn, (player, (x, y), result) in enumerate(game.moves):
+            guesses.append((turn, player, x, y, result.value))
+            if result not in SHOT_RESULTS:
+                continue
+            counts["guesses", player, x, y] += 1
+            if result != GuessReturn.miss:
+                counts["hits", player, x, y] += 1
+                if player not in first_hit:
+                    first_hit.add(player)
+                    counts["first_hits", player, x, y] += 1
+
+        with self.db:
+            game_id = self.db.execute(
+                "INSERT INTO games (width, height, winner, shots, finished) VALUES (?, ?, ?, ?, ?)",
+                (game.width, game.height, winner, shots, time.time()),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO ships VALUES (?, ?, ?, ?, ?)",
+                [(game_id, player, idx, x, y) for idx, player, x, y in ships],
+            )
+            self.db.executemany(
+                "INSERT INTO guesses VALUES (?, ?, ?, ?, ?, ?)",
+                [(game_id, *guess) for guess in guesses],
+            )
+            self.db.executemany(
+                "INSERT INTO cell_counts VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT DO UPDATE SET n = n + excluded.n",
+                [(*key, n) for key, n in counts.items()],
+            )
+        return game_id
+
+    def heatmap(
+        self, kind: str, player: int | None = None, board_size: tuple[int, int] = TABLE.size
+    ) -> np.ndarray:
+        """
+        Counts per cell over all games. kind is one of HEATMAP_KINDS.
+        player is the guessing player, or the owner of the ships. None counts both players.
+
+        Returns an array indexed by [y, x] in the coordinates of the air table.
+        """
+        if kind not in HEATMAP_KINDS:
+            raise ValueError(f"Unknown heatmap kind {kind}")
+        query = "SELECT x, y, SUM(n) FROM cell_counts WHERE kind = ?"
+        params: tuple = (kind,)
+        if player is not None:
+            query += " AND player = ?"
+            params += (player,)
+        rows = np.array(self.db.execute(query + " GROUP BY x, y", params).fetchall(), dtype=np.int64)
+        heatmap = np.zeros((board_size[1], board_size[0]), dtype=np.int64)
+        if len(rows):
+            heatmap[rows[:, 1], rows[:, 0]] = rows[:, 2]
+        return heatmap
+
+    def average_shots_to_win(self, player: int | None = None) -> float | None:
+        """
+        Returns the average number of guesses the winner made, or None if no game has been won.
+        """
+        query = "SELECT AVG(shots) FROM games WHERE winner IS NOT NULL"
+        params: tuple = ()
+        if player is not None:
+            query = "SELECT AVG(shots) FROM games WHERE winner = ?"
+            params = (player,)
+        return self.db.execute(query, params).fetchone()[0]
+
+    def shots_to_win(self) -> np.ndarray:
+        """
+        Returns the number of guesses the winner made in every won game.
+        """
+        return np.array(
+            self.db.execute("SELECT shots FROM games WHERE winner IS NOT NULL").fetchall(),
+            dtype=np.int64,
+        ).reshape(-1)
+
+    def close(self):
+        self.db.close()
+
+
+if __name__ == "__main__":
+    from replay import Replay
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('journals', nargs='*', help='Game journals to add to the history')
+    parser.add_argument('-history', default='history.sqlite', help='Game history database')
+    args = parser.parse_args()
+
+    history = GameHistory(args.history)
+    for path in args.journals:
+        replay = Replay(path, speed=None)
+        replay.run()
+        if replay.game.moves and replay.game.moves[-1][2] == GuessReturn.finished_game:
+            history.add_game(replay.game)
+    print(f"Average shots to win: {history.average_shots_to_win()}")
+    first_hits = history.heatmap("first_hits")
+    for player in (1, 2):
+        # rows are printed top down, as the board is shown in the UI
+        print(f"First hits on the board of player {player}:")
+        print(TABLE.ui_board(first_hits, player)[::-1])
+    history.close()
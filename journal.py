@@ -0,0 +1,318 @@
+import os
+import struct
+import time
+import zlib
+from enum import IntEnum
+
+from battleships import Game, GuessReturn, Ship
+from shift_valves import Table
+
+MAGIC = b"IBJ1"
+
+# magic, board width, board height, wall clock time the journal was started
+HEADER = struct.Struct("<4sBBd")
+# record kind, payload length, milliseconds since the journal was started
+RECORD_HEAD = struct.Struct("<BHI")
+RECORD_CRC = struct.Struct("<I")
+# number of guesses made, player currently guessing
+SNAPSHOT_HEAD = struct.Struct("<HB")
+# player and coordinate of a guess
+GUESS = struct.Struct("<Bhh")
+
+RESULT_TO_CODE = {
+    GuessReturn.hit: 0,
+    GuessReturn.miss: 1,
+    GuessReturn.dupe_guess: 2,
+    GuessReturn.out_of_bounds: 3,
+    GuessReturn.finished_game: 4,
+}
+CODE_TO_RESULT = {code: result for result, code in RESULT_TO_CODE.items()}
+
+
+class Record(IntEnum):
+    fleet = 1
+    guess = 2
+    result = 3
+    turn = 4
+    snapshot = 5
+
+
+class GameJournal:
+    """
+    Append-only binary journal of a single game.
+
+    Every record is written straight to the file descriptor, so it survives the process dying.
+    fsync is batched: it happens every fsync_every records or fsync_interval seconds,
+    and always when the fleet is confirmed or the game is finished. The record ending a quiet
+    stretch is only synced by the next append, so sync is also meant to be called every
+    fsync_interval seconds while the game runs.
+
+    A snapshot of the full game state is recorded every snapshot_every guesses,
+    which lets a replay seek and a restore start without applying every guess from the start.
+
+    The journal of a finished game is moved into archive_dir, if given, as
+    <name of the journal>-<start time>.journal, so the next game does not overwrite it.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fsync_every: int = 8,
+        fsync_interval: float = 1.0,
+        snapshot_every: int = 16,
+        archive_dir: str | None = None,
+    ) -> None:
+        self.path = path
+        self.archive_dir = archive_dir
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.snapshot_every = snapshot_every
+        self.fd: int | None = None
+        self.started = 0.0
+        self.guesses = 0
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def start(self, board_size: tuple[int, int], ships: list[Ship]):
+        """
+        Truncates the journal and records the confirmed fleet of a new game.
+        """
+        self.close()
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        self.started = time.time()
+        self.guesses = 0
+        os.write(self.fd, HEADER.pack(MAGIC, *board_size, self.started))
+
+        payload = bytearray()
+        for ship in ships:
+            payload += bytes((ship.player, len(ship.filled)))
+            for x, y in sorted(ship.filled):
+                payload += bytes((x, y))
+        self.append(Record.fleet, bytes(payload))
+        self.sync()
+
+    def resume(self, started: float, valid_length: int, guesses: int):
+        """
+        Reopens an existing journal for appending after the last valid record.
+        """
+        self.close()
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        os.truncate(self.path, valid_length)
+        self.started = started
+        self.guesses = guesses
+
+    def guess(self, player: int, coord: tuple[int, int]):
+        self.append(Record.guess, GUESS.pack(player, *coord))
+
+    def result(self, result: GuessReturn):
+        self.guesses += 1
+        self.append(Record.result, bytes((RESULT_TO_CODE[result],)))
+        if result == GuessReturn.finished_game:
+            self.sync()
+
+    def checkpoint(self, game: Game):
+        """
+        Records a snapshot of the game if one is due.
+        """
+        if self.snapshot_every and self.guesses % self.snapshot_every == 0:
+            self.append(Record.snapshot, encode_snapshot(game, self.guesses))
+
+    def turn(self, player: int):
+        self.append(Record.turn, bytes((player,)))
+
+    def append(self, kind: Record, payload: bytes):
+        """
+        Writes a single framed record to the journal.
+        """
+        if self.fd is None:
+            return
+        t_ms = int((time.time() - self.started) * 1000)
+        record = RECORD_HEAD.pack(kind, len(payload), t_ms) + payload
+        os.write(self.fd, record + RECORD_CRC.pack(zlib.crc32(record)))
+        self.pending += 1
+        if (
+            self.pending >= self.fsync_every
+            or time.monotonic() - self.last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def sync(self):
+        """
+        Forces the written records to disk.
+        """
+        if self.fd is None or not self.pending:
+            return
+        os.fsync(self.fd)
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def finish(self) -> str | None:
+        """
+        Closes the journal of a finished game and moves it into the archive.
+
+        Returns the path of the archived journal, or None if it is not archived.
+        """
+        started = self.fd is not None
+        self.close()
+        if self.archive_dir is None or not started:
+            return None
+        os.makedirs(self.archive_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        archived = os.path.join(self.archive_dir, f"{name}-{stamp}.journal")
+        os.replace(self.path, archived)
+        return archived
+
+    def close(self):
+        if self.fd is None:
+            return
+        self.sync()
+        os.close(self.fd)
+        self.fd = None
+
+
+def read_journal(path: str):
+    """
+    Reads all intact records of a journal. Reading stops at the first torn or corrupt record.
+
+    Returns the header (board size and start time), the records as (kind, t_ms, payload)
+    and the length of the valid part of the file.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError("Journal is too short")
+    magic, width, height, started = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a game journal")
+
+    records: list[tuple[Record, int, bytes]] = []
+    offset = HEADER.size
+    while offset + RECORD_HEAD.size <= len(data):
+        kind, length, t_ms = RECORD_HEAD.unpack_from(data, offset)
+        end = offset + RECORD_HEAD.size + length
+        if end + RECORD_CRC.size > len(data):
+            break
+        (crc,) = RECORD_CRC.unpack_from(data, end)
+        if crc != zlib.crc32(data[offset:end]):
+            break
+        records.append((Record(kind), t_ms, data[offset + RECORD_HEAD.size : end]))
+        offset = end + RECORD_CRC.size
+    return ((width, height), started), records, offset
+
+
+def decode_guess(payload: bytes) -> tuple[int, tuple[int, int]]:
+    """
+    Decodes the payload of a guess record into the player and the coordinate.
+    """
+    player, x, y = GUESS.unpack(payload)
+    return player, (x, y)
+
+
+def decode_fleet(payload: bytes) -> list[Ship]:
+    """
+    Decodes the payload of a fleet record into Ship objects.
+    """
+    ships = []
+    offset = 0
+    while offset < len(payload):
+        player, sections = payload[offset], payload[offset + 1]
+        coords = payload[offset + 2 : offset + 2 + 2 * sections]
+        ships.append(Ship([(coords[i], coords[i + 1]) for i in range(0, len(coords), 2)], player))
+        offset += 2 + 2 * sections
+    return ships
+
+
+def encode_snapshot(game: Game, guesses: int) -> bytes:
+    """
+    Encodes the state of the game as the player on turn and a bitmask of all guessed cells.
+    """
+    mask = bytearray((game.width * game.height + 7) // 8)
+    for board in (game.p1_board, game.p2_board):
+        for x, y in board.guesses:
+            cell = y * game.width + x
+            mask[cell // 8] |= 1 << (cell % 8)
+    return SNAPSHOT_HEAD.pack(guesses, game.current_player()) + bytes(mask)
+
+
+def apply_snapshot(game: Game, payload: bytes) -> int:
+    """
+    Brings a freshly created game to the state of a snapshot.
+
+    Returns the number of guesses made at the time of the snapshot.
+    """
+    guesses, player = SNAPSHOT_HEAD.unpack_from(payload)
+    mask = payload[SNAPSHOT_HEAD.size :]
+    for board in (game.p1_board, game.p2_board):
+        board.guesses = {
+            (x, y)
+            for x in range(board.x[0], board.x[1] + 1)
+            for y in range(board.y[0], board.y[1] + 1)
+            if mask[(y * game.width + x) // 8] >> ((y * game.width + x) % 8) & 1
+        }
+        board.dead_ships = []
+        for ship in board.ships:
+            ship.lives = len(ship.filled - board.guesses)
+            if ship.lives == 0:
+                board.dead_ships.append(ship)
+    if game.current_player() != player:
+        game.switch_turn()
+    return guesses
+
+
+def restore_game(
+    journal: GameJournal, table: Table | None = None
+) -> tuple[Game, list[tuple[int, tuple[int, int], GuessReturn]]] | None:
+    """
+    Rebuilds the game recorded in the journal without firing any valves.
+    The game is brought to the state of the last snapshot, and only the guesses after it are replayed.
+    The journal is reopened for appending, so the restored game keeps recording.
+
+    Returns the game and the guesses made as (player, guess, result).
+    Returns None if there is no unfinished game in the journal.
+    """
+    if not os.path.exists(journal.path):
+        return None
+    try:
+        (board_size, started), records, valid_length = read_journal(journal.path)
+    except ValueError:
+        return None
+    if not records or records[0][0] != Record.fleet:
+        return None
+
+    game = Game(board_size, decode_fleet(records[0][2]), table=None)
+    snapshot = max((index for index, (kind, _, _) in enumerate(records) if kind == Record.snapshot), default=0)
+    player, guess = None, None
+    # the guesses up to the snapshot are taken as recorded
+    for kind, _, payload in records[1:snapshot]:
+        match kind:
+            case Record.guess:
+                player, guess = decode_guess(payload)
+            case Record.result:
+                if CODE_TO_RESULT[payload[0]] == GuessReturn.finished_game:
+                    return None
+                game.moves.append((player, guess, CODE_TO_RESULT[payload[0]]))
+    if snapshot and apply_snapshot(game, records[snapshot][2]) != len(game.moves):
+        raise ValueError(f"Journal snapshot differs from the {len(game.moves)} guesses before it")
+
+    for kind, _, payload in records[snapshot + 1 :]:
+        match kind:
+            case Record.guess:
+                player, guess = decode_guess(payload)
+                if player != game.current_player():
+                    raise ValueError(f"Journal guess by player {player} out of turn")
+            case Record.result:
+                result = game.make_guess(guess)
+                if result != CODE_TO_RESULT[payload[0]]:
+                    raise ValueError(f"Journal result {CODE_TO_RESULT[payload[0]]} differs from replay {result}")
+                if result == GuessReturn.finished_game:
+                    return None
+            case Record.turn:
+                if payload[0] != game.current_player():
+                    raise ValueError(f"Journal turn of player {payload[0]} differs from replay")
+
+    game.p1_board.table = table
+    game.p2_board.table = table
+    journal.resume(started, valid_length, len(game.moves))
+    game.journal = journal
+    return game, list(game.moves)
@@ -1,16 +1,82 @@
-from camera import Camera
+from camera import VideoRecorder
+from camera_rig import open_cameras
+from capture_config import CaptureConfig
+from events import LEVELS, JsonLinesSink, events
 from game_controller import GameController
-from hardware_variables import CameraNum
+from hardware_variables import Cameras, CaptureFps, CaptureSize, Port, TableActive
+from history import GameHistory
+from metrics import metrics
+from network import RemotePlayerServer
+from shift_valves import Table
+from spectator import SpectatorServer
+from tracing import tracer
+from vision_pool import VisionPool
 import argparse
+import time
 
-def main(dev_mode=False):
-    camera = Camera(CameraNum)
-    game_controller = GameController(camera, dev_mode)
-    game_controller.run()
+def main(dev_mode=False, journal_path=None, remote_player=None, remote_port=7777, history_path=None, preview=False, decode_scale=1, vision_workers=0, spectator_port=None, archive_dir=None, record=True):
+    config = CaptureConfig(CaptureSize, CaptureFps, decode_scale=decode_scale)
+    camera = open_cameras(Cameras, config)
+    table = None
+    if TableActive:
+        table = Table(Port)
+        table.clear()
+    remote = None
+    if remote_player is not None:
+        remote = RemotePlayerServer(remote_player, port=remote_port)
+        remote.start()
+        events.info(f"Waiting for player {remote_player} on port {remote.port}", "remote_waiting", player=remote_player, port=remote.port)
+    if spectator_port is not None:
+        spectators = SpectatorServer(port=spectator_port)
+        spectators.start()
+        events.add_sink(spectators)
+        events.info(f"Spectators can watch on port {spectators.port}", "spectators", port=spectators.port)
+    history = GameHistory(history_path) if history_path else None
+    vision = VisionPool(vision_workers) if vision_workers and not dev_mode else None
+    recorder = VideoRecorder(f"video{int(time.time())}.avi", GameController.capture_fps) if record and not dev_mode else None
+    game_controller = GameController(camera, dev_mode, journal_path, table, remote, history, vision, archive_dir, recorder)
+    game_controller.run(preview)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-dev', action='store_true', help='Run in development mode')
+    parser.add_argument('-journal', default='battleships.journal', help='Game journal used to resume an unfinished game')
+    parser.add_argument('-archive', default='archive', help='Directory the journals of finished games are moved into')
+    parser.add_argument('-remote', type=int, choices=(1, 2), default=None, help='Player who plays from a remote client')
+    parser.add_argument('-port', type=int, default=7777, help='Port the remote player connects to')
+    parser.add_argument('-history', default='history.sqlite', help='Database finished games are stored in')
+    parser.add_argument('-no-record', dest='record', action='store_false', help='Do not record the camera frames of the game into a video')
+    parser.add_argument('-preview', action='store_true', help='Show the camera preview in the UI')
+    parser.add_argument('-decode-scale', type=int, choices=(1, 2, 4, 8), default=1, help='Decode the camera frames at 1/N of their size')
+    parser.add_argument('-vision-workers', type=int, default=0, help='Run the detectors in this many worker processes')
+    parser.add_argument('-spectators', type=int, default=None, metavar='PORT', help='Serve a web view of the game to spectators on this port')
+    parser.add_argument('-metrics', action='store_true', help='Record stage timings, shown with F3 and written to metrics.json on exit')
+    parser.add_argument('-metrics-port', type=int, default=None, help='Port serving the stage timings for Prometheus')
+    parser.add_argument('-trace', action='store_true', help='Trace guesses from the camera frame to the valves and UI into traces.jsonl')
+    parser.add_argument('-log-level', choices=list(LEVELS), default='info', help='Lowest level of the events printed')
+    parser.add_argument('-events', action='store_true', help='Write all events as JSON lines into events.jsonl')
     args = parser.parse_args()
 
-    main(dev_mode=args.dev)
+    if args.metrics or args.metrics_port is not None:
+        metrics.enable('metrics.json')
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.trace:
+        tracer.enable('traces.jsonl')
+    events.set_console_level(LEVELS[args.log_level])
+    if args.events:
+        events.add_sink(JsonLinesSink('events.jsonl'))
+
+    main(
+        dev_mode=args.dev,
+        journal_path=args.journal,
+        remote_player=args.remote,
+        remote_port=args.port,
+        history_path=args.history,
+        preview=args.preview,
+        decode_scale=args.decode_scale,
+        vision_workers=args.vision_workers,
+        spectator_port=args.spectators,
+        archive_dir=args.archive,
+        record=args.record,
+    )
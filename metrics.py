@@ -0,0 +1,192 @@
+import atexit
+import bisect
+import json
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# upper bounds of the latency buckets in seconds, from 1 µs doubling up to about 17 s
+BUCKETS = tuple(1e-6 * 2**i for i in range(25))
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """
+    Latency histogram with fixed, exponentially growing buckets.
+    """
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the given quantile.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.max
+
+
+class Span:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """
+    In-memory latency histograms and counters for the stages of a turn.
+
+    While disabled, span returns a shared no-op context manager and count returns right away,
+    so instrumented code costs about one attribute lookup and call.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.histograms: dict[str, Histogram] = {}
+        self.counters: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server: ThreadingHTTPServer | None = None
+
+    def enable(self, dump_path: str | None = None):
+        """
+        Starts recording. If dump_path is given, the metrics are written to it as JSON on exit.
+        """
+        self.enabled = True
+        if dump_path is not None:
+            atexit.register(self.dump_json, dump_path)
+
+    def span(self, name: str):
+        """
+        Returns a context manager timing the enclosed block as the stage name.
+        """
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name)
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict:
+        """
+        Returns count, mean, p50, p99 and max in seconds per stage, and the counters.
+        """
+        with self.lock:
+            return {
+                "stages": {
+                    name: {
+                        "count": h.count,
+                        "mean": h.total / h.count if h.count else 0.0,
+                        "p50": h.quantile(0.5),
+                        "p99": h.quantile(0.99),
+                        "max": h.max,
+                    }
+                    for name, h in sorted(self.histograms.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def overlay_text(self) -> str:
+        """
+        Returns the summary as lines of text for the on-screen overlay.
+        """
+        summary = self.summary()
+        lines = [
+            f"{name}: n={s['count']} p50={s['p50'] * 1000:.2f}ms p99={s['p99'] * 1000:.2f}ms max={s['max'] * 1000:.2f}ms"
+            for name, s in summary["stages"].items()
+        ]
+        lines += [f"{name}: {n}" for name, n in summary["counters"].items()]
+        return "\n".join(lines)
+
+    def dump_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def prometheus(self) -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP battleships_stage_seconds Latency of the stages of a turn.",
+            "# TYPE battleships_stage_seconds histogram",
+        ]
+        with self.lock:
+            for name, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'battleships_stage_seconds_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'battleships_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'battleships_stage_seconds_sum{{stage="{name}"}} {h.total}')
+                lines.append(f'battleships_stage_seconds_count{{stage="{name}"}} {h.count}')
+            lines.append("# TYPE battleships_events_total counter")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f'battleships_events_total{{event="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serves the metrics for Prometheus on /metrics from a background thread.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+metrics = Metrics()
@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import queue
+import struct
+import threading
+import time
+from enum import IntEnum
+from typing import Callable
+
+from battleships import GuessReturn, in_coord_range
+from events import events
+from journal import CODE_TO_RESULT, RESULT_TO_CODE
+
+# payload length, message kind, sequence number of the sender
+FRAME = struct.Struct("<HBI")
+GUESS = struct.Struct("<hh")
+# sequence number of the answered guess (0 for local guesses), guessing player, guess, result
+RESULT = struct.Struct("<IBhhB")
+PING = struct.Struct("<d")
+
+
+class Message(IntEnum):
+    hello = 1
+    guess = 2
+    result = 3
+    turn = 4
+    ping = 5
+    pong = 6
+
+
+class Connection:
+    """
+    Framed messages over a stream, numbered with a sequence number per direction.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.sent = 0
+        self.received = 0
+        self.gaps = 0
+
+    def send(self, kind: Message, payload: bytes = b"") -> int:
+        """
+        Sends a message.
+
+        Returns the sequence number of the message.
+        """
+        self.sent += 1
+        self.writer.write(FRAME.pack(len(payload), kind, self.sent) + payload)
+        return self.sent
+
+    async def receive(self) -> tuple[Message, int, bytes]:
+        """
+        Reads the next message.
+
+        Returns the kind, sequence number and payload of the message.
+        """
+        length, kind, seq = FRAME.unpack(await self.reader.readexactly(FRAME.size))
+        payload = await self.reader.readexactly(length) if length else b""
+        if seq != self.received + 1:
+            self.gaps += 1
+        self.received = seq
+        return Message(kind), seq, payload
+
+    def close(self):
+        self.writer.close()
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def network_loop() -> asyncio.AbstractEventLoop:
+    """
+    Returns the event loop shared by all remote games of the process, running on its own thread.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+        return _loop
+
+
+class RemotePlayerServer:
+    """
+    Lets one player of a game guess from a remote client over TCP.
+
+    Networking runs on the shared network loop, so the game thread never blocks on it.
+    Guesses of the remote player are polled with poll_guess, and every guess result
+    and turn switch is sent to the client as a state diff. notify, if set, is called
+    on the network loop as soon as a guess arrives, so it can be polled right away.
+    A client sending a malformed message is disconnected.
+    """
+
+    def __init__(self, player: int, host: str = "0.0.0.0", port: int = 7777) -> None:
+        self.player = player
+        self.host = host
+        self.port = port
+        self.loop = network_loop()
+        self.guesses: queue.Queue[tuple[int, tuple[int, int]]] = queue.Queue()
+        self.connection: Connection | None = None
+        self.server: asyncio.Server | None = None
+        self.turn: int | None = None
+        self.last_guess_seq = 0
+        self.round_trips: list[float] = []
+        self.notify: Callable[[], None] | None = None
+
+    def start(self):
+        """
+        Starts listening for the remote client.
+        """
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle_client, self.host, self.port), self.loop
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def close(self):
+        if self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+        if self.connection is not None:
+            self.loop.call_soon_threadsafe(self.connection.close)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self.connection is not None:
+            writer.close()
+            return
+        connection = Connection(reader, writer)
+        self.connection = connection
+        connection.send(Message.hello, bytes((self.player,)))
+        if self.turn is not None:
+            connection.send(Message.turn, bytes((self.turn,)))
+        try:
+            while True:
+                kind, seq, payload = await connection.receive()
+                match kind:
+                    case Message.guess:
+                        self.guesses.put((seq, GUESS.unpack(payload)))
+                        if self.notify is not None:
+                            self.notify()
+                    case Message.ping:
+                        connection.send(Message.pong, payload)
+                    case Message.pong:
+                        (sent,) = PING.unpack(payload)
+                        self.round_trips.append(time.perf_counter() - sent)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except (ValueError, struct.error) as e:
+            events.warning(f"Dropped the remote client: {e}", "remote_protocol_error", player=self.player, error=str(e))
+        finally:
+            self.connection = None
+            connection.close()
+
+    def poll_guess(self, timeout: float = 0) -> tuple[int, int] | None:
+        """
+        Returns the next guess of the remote player, waiting at most timeout seconds for it.
+        Returns None if the remote player has not guessed.
+        """
+        try:
+            seq, guess = self.guesses.get(timeout=timeout) if timeout else self.guesses.get_nowait()
+        except queue.Empty:
+            return None
+        self.last_guess_seq = seq
+        return guess
+
+    def send_result(self, player: int, guess: tuple[int, int], result: GuessReturn):
+        """
+        Sends the result of a guess by either player to the remote client.
+        """
+        if not in_coord_range(guess):
+            # a local guess the game rejected before recording it
+            return
+        ack = self.last_guess_seq if player == self.player else 0
+        self.send(Message.result, RESULT.pack(ack, player, *guess, RESULT_TO_CODE[result]))
+
+    def send_turn(self, player: int):
+        self.turn = player
+        self.send(Message.turn, bytes((player,)))
+
+    def ping(self):
+        """
+        Measures the round trip time to the client. The result is added to round_trips.
+        """
+        self.send(Message.ping, PING.pack(time.perf_counter()))
+
+    def send(self, kind: Message, payload: bytes):
+        connection = self.connection
+        if connection is not None:
+            self.loop.call_soon_threadsafe(connection.send, kind, payload)
+
+
+class RemotePlayerClient:
+    """
+    The remote side of a game. Sends guesses and keeps track of the state diffs sent by the server.
+
+    latencies holds the time from sending each guess until its result arrived,
+    round_trips the round trip times measured by pings.
+    """
+
+    def __init__(self) -> None:
+        self.connection: Connection | None = None
+        self.player: int | None = None
+        self.turn: int | None = None
+        self.results: list[tuple[int, tuple[int, int], GuessReturn]] = []
+        self.pending: dict[int, tuple[float, asyncio.Future]] = {}
+        self.latencies: list[float] = []
+        self.round_trips: list[float] = []
+        self.reading: asyncio.Task | None = None
+        self.ready = asyncio.Event()
+
+    async def connect(self, host: str, port: int):
+        reader, writer = await asyncio.open_connection(host, port)
+        self.connection = Connection(reader, writer)
+        self.reading = asyncio.create_task(self.read())
+        await self.ready.wait()
+
+    async def read(self):
+        try:
+            while True:
+                kind, _, payload = await self.connection.receive()
+                match kind:
+                    case Message.hello:
+                        self.player = payload[0]
+                        self.ready.set()
+                    case Message.turn:
+                        self.turn = payload[0]
+                    case Message.result:
+                        ack, player, x, y, code = RESULT.unpack(payload)
+                        result = CODE_TO_RESULT[code]
+                        self.results.append((player, (x, y), result))
+                        if ack in self.pending:
+                            sent, future = self.pending.pop(ack)
+                            self.latencies.append(time.perf_counter() - sent)
+                            future.set_result(result)
+                    case Message.ping:
+                        self.connection.send(Message.pong, payload)
+                    case Message.pong:
+                        (sent,) = PING.unpack(payload)
+                        self.round_trips.append(time.perf_counter() - sent)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, struct.error):
+            self.connection.close()
+            for _, future in self.pending.values():
+                future.cancel()
+
+    async def guess(self, coord: tuple[int, int]) -> GuessReturn:
+        """
+        Makes a guess for the remote player.
+
+        Returns the result of the guess.
+        Raises ValueError for a coordinate beyond the int16 fields of the protocol.
+        """
+        if not in_coord_range(coord):
+            raise ValueError(f"Guess {coord} is out of range")
+        future = asyncio.get_running_loop().create_future()
+        seq = self.connection.send(Message.guess, GUESS.pack(*coord))
+        self.pending[seq] = (time.perf_counter(), future)
+        return await future
+
+    def ping(self):
+        self.connection.send(Message.ping, PING.pack(time.perf_counter()))
+
+    async def close(self):
+        self.connection.close()
+        if self.reading is not None:
+            self.reading.cancel()
+
+
+async def play_remote(host: str, port: int):
+    """
+    Plays as the remote player from the terminal.
+    """
+    client = RemotePlayerClient()
+    await client.connect(host, port)
+    print(f"Connected as player {client.player}")
+    loop = asyncio.get_running_loop()
+    while True:
+        raw_input = await loop.run_in_executor(None, input, "Enter your guess (x,y): ")
+        try:
+            x_str, y_str = raw_input.strip().split(",")
+            guess = (int(x_str), int(y_str))
+        except ValueError:
+            print("Invalid input format. Please enter coordinates like '3,5'.\n")
+            continue
+        result = await client.guess(guess)
+        print(f"Guess at {guess}: {result.value} ({client.latencies[-1] * 1000:.1f} ms)")
+        if result == GuessReturn.finished_game:
+            break
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('host', help='Host running the game')
+    parser.add_argument('-port', type=int, default=7777, help='Port of the game')
+    args = parser.parse_args()
+
+    asyncio.run(play_remote(args.host, args.port))
@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from camera import CaptureError
+from camera_rig import open_cameras
+from capture_config import CaptureConfig
+from events import LEVELS, JsonLinesSink, events
+from game_controller import GameController
+from hardware_variables import CaptureFps, CaptureSize, TableActive, Tables
+from history import GameHistory
+from metrics import metrics
+from shift_valves import Table
+from tracing import tracer
+from ui import Interface
+
+
+class TableSession:
+    """
+    A game on one air table, with its own camera, table and UI window.
+
+    A session stopped by its camera or air table failing only ends the game on that table.
+    Any other error is logged with its traceback and raised, as it is a bug.
+    """
+
+    def __init__(self, name: str, controller: GameController, interface: Interface) -> None:
+        self.name = name
+        self.controller = controller
+        self.interface = interface
+
+    async def run(self, executor: ThreadPoolExecutor):
+        try:
+            await self.controller.play(self.interface, executor)
+        except (CaptureError, OSError) as e:
+            events.error(f"{self.name} stopped: {e!r}", "table_stopped", table=self.name, error=repr(e))
+        except Exception as e:
+            trace = traceback.format_exc()
+            events.error(f"{self.name} failed: {e!r}\n{trace}", "table_failed", table=self.name, error=repr(e), traceback=trace)
+            raise
+        finally:
+            self.interface.close()
+            self.controller.close()
+
+
+class Orchestrator:
+    """
+    Runs games on several air tables in a single asyncio process.
+
+    Capturing and detection of all tables share one pool of worker threads.
+    OpenCV releases the GIL while detecting, so the tables are processed in parallel
+    while game logic and rendering stay on the event loop.
+
+    The journal of every table is journal with {} replaced by the number of the table.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        preview: bool = False,
+        decode_scale: int = 1,
+        journal: str = "table{}.journal",
+        archive_dir: str | None = None,
+    ) -> None:
+        self.workers = workers or os.cpu_count() or 4
+        self.preview = preview
+        self.config = CaptureConfig(CaptureSize, CaptureFps, decode_scale=decode_scale)
+        self.journal = journal
+        self.archive_dir = archive_dir
+        # cameras as (camera number, columns of the board), air table port (None for the first Arduino found)
+        # and whether the table has valves
+        self.tables: list[tuple[list[tuple[int, tuple[int, int] | None]], str | None, bool]] = []
+
+    def add_table(self, cameras: list[tuple[int, tuple[int, int] | None]], port: str | None, active: bool = True):
+        """
+        Adds a table seen by the given cameras, like the Cameras of the hardware variables.
+        Several cameras are run as a camera rig.
+        """
+        self.tables.append((cameras, port, active))
+
+    async def run(self):
+        history = GameHistory()
+        sessions = []
+        for idx, (cameras, port, active) in enumerate(self.tables):
+            table = None
+            if active:
+                table = Table(port)
+                table.clear()
+            controller = GameController(
+                open_cameras(cameras, self.config, f"calibration/table{idx}_camera{{}}.json"),
+                False,
+                self.journal.format(idx),
+                table,
+                history=history,
+                archive_dir=self.archive_dir,
+            )
+            interface = Interface(self.preview)
+            interface.set_caption(f"Immersive battleships - table {idx}")
+            sessions.append(TableSession(f"Table {idx}", controller, interface))
+
+        try:
+            await self.play(sessions)
+        finally:
+            history.close()
+
+    async def play(self, sessions: list[TableSession]):
+        """
+        Plays the games of all sessions on the shared worker threads.
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            await asyncio.gather(*(session.run(executor) for session in sessions))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-workers', type=int, default=None, help='Number of vision worker threads')
+    parser.add_argument('-preview', action='store_true', help='Show the camera preview in the UI of every table')
+    parser.add_argument('-decode-scale', type=int, choices=(1, 2, 4, 8), default=1, help='Decode the camera frames at 1/N of their size')
+    parser.add_argument('-metrics', action='store_true', help='Record stage timings of all tables, written to metrics.json on exit')
+    parser.add_argument('-metrics-port', type=int, default=None, help='Port serving the stage timings for Prometheus')
+    parser.add_argument('-trace', action='store_true', help='Trace guesses of all tables into traces.jsonl')
+    parser.add_argument('-journal', default='table{}.journal', help='Game journal of every table, {} is replaced by the table number')
+    parser.add_argument('-archive', default='archive', help='Directory the journals of finished games are moved into')
+    parser.add_argument('-log-level', choices=list(LEVELS), default='info', help='Lowest level of the events printed')
+    parser.add_argument('-events', action='store_true', help='Write all events as JSON lines into events.jsonl')
+    args = parser.parse_args()
+
+    if args.metrics or args.metrics_port is not None:
+        metrics.enable('metrics.json')
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    if args.trace:
+        tracer.enable('traces.jsonl')
+    events.set_console_level(LEVELS[args.log_level])
+    if args.events:
+        events.add_sink(JsonLinesSink('events.jsonl'))
+
+    orchestrator = Orchestrator(args.workers, args.preview, args.decode_scale, args.journal, args.archive)
+    for cameras, port in Tables:
+        orchestrator.add_table(cameras, port, TableActive)
+    asyncio.run(orchestrator.run())
@@ -0,0 +1,174 @@
+import argparse
+import time
+from typing import TYPE_CHECKING
+
+from battleships import Game, GuessReturn
+from journal import CODE_TO_RESULT, Record, apply_snapshot, decode_fleet, decode_guess, read_journal
+from shift_valves import Table, ValveScheduler
+
+if TYPE_CHECKING:
+    from ui import Interface
+
+
+class Replay:
+    """
+    Replays a recorded game journal through Game, and optionally the UI and the air table.
+
+    speed is the playback speed relative to real time. None replays as fast as possible
+    and only renders the final state, without firing the valves.
+    The valves are fired through a ValveScheduler, so a burst never holds up the playback,
+    and seeking never fires them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        interface: "Interface | None" = None,
+        table: Table | None = None,
+        speed: float | None = 1.0,
+    ) -> None:
+        (self.board_size, _), records, _ = read_journal(path)
+        if not records or records[0][0] != Record.fleet:
+            raise ValueError(f"Journal {path} has no fleet")
+        self.path = path
+        self.interface = interface
+        self.valves = ValveScheduler(table) if table is not None and speed is not None else None
+        self.speed = speed
+        self.fleet = records[0][2]
+
+        # every guess as (t_ms, player, guess, recorded result)
+        self.moves: list[tuple[int, int, tuple[int, int], GuessReturn]] = []
+        # snapshots by the number of guesses made when they were taken
+        self.snapshots: dict[int, bytes] = {}
+        guess = None
+        for kind, t_ms, payload in records[1:]:
+            match kind:
+                case Record.guess:
+                    guess = decode_guess(payload)
+                case Record.result:
+                    player, coord = guess
+                    self.moves.append((t_ms, player, coord, CODE_TO_RESULT[payload[0]]))
+                case Record.snapshot:
+                    self.snapshots[len(self.moves)] = payload
+
+        self.divergences: list[tuple[int, GuessReturn, GuessReturn]] = []
+        self.game: Game
+        self.position = 0
+        self.seek(0)
+
+    def seek(self, position: int):
+        """
+        Brings the game to the state after the given number of guesses.
+
+        Starts from the latest snapshot before the position, so only the guesses after it are applied.
+        """
+        position = max(0, min(position, len(self.moves)))
+        if self.valves is not None:
+            self.valves.update(closing_all=True)
+        start = max((n for n in self.snapshots if n <= position), default=0)
+        self.game = Game(self.board_size, decode_fleet(self.fleet), table=None)
+        if start:
+            apply_snapshot(self.game, self.snapshots[start])
+        self.position = start
+        self.divergences = [d for d in self.divergences if d[0] < start]
+        while self.position < position:
+            self.step()
+
+        self.game.p1_board.table = self.valves
+        self.game.p2_board.table = self.valves
+        if self.interface is not None:
+            self.interface.reset()
+            for board in (self.game.p1_board, self.game.p2_board):
+                for coord in board.guesses:
+                    if coord in board.board:
+                        self.interface.hit(coord)
+                    else:
+                        self.interface.miss(coord)
+
+    def step(self) -> GuessReturn:
+        """
+        Applies the next recorded guess.
+
+        Returns the result of the guess. Results differing from the recorded ones are kept in divergences.
+        """
+        _, player, guess, expected = self.moves[self.position]
+        # keeps the recorded turn order, even if changed rules disagree with it
+        if player != self.game.current_player():
+            self.game.switch_turn()
+        result = self.game.make_guess(guess)
+        if result != expected:
+            self.divergences.append((self.position, expected, result))
+        self.position += 1
+        return result
+
+    def run(self, until: int | None = None):
+        """
+        Plays the guesses from the current position until the given position, or the end of the game.
+        """
+        until = len(self.moves) if until is None else min(until, len(self.moves))
+        began = time.perf_counter()
+        first_ms = self.moves[self.position][0] if self.position < until else 0
+        while self.position < until:
+            t_ms, _, guess, _ = self.moves[self.position]
+            if self.speed is not None:
+                self.wait(began + (t_ms - first_ms) / 1000 / self.speed)
+            result = self.step()
+            if self.interface is None:
+                continue
+            match result:
+                case GuessReturn.hit:
+                    self.interface.hit(guess)
+                case GuessReturn.miss:
+                    self.interface.miss(guess)
+            if self.speed is not None:
+                self.interface.next_frame()
+        if self.interface is not None:
+            self.interface.next_frame()
+        while self.valves is not None and self.valves.closing:
+            self.wait(time.perf_counter() + 0.01)
+
+    def wait(self, until: float):
+        """
+        Sleeps until the perf_counter time, closing the valves that are due meanwhile.
+        The window keeps handling its events, so it stays responsive between guesses.
+        """
+        while (left := until - time.perf_counter()) > 0:
+            if self.valves is not None:
+                self.valves.update()
+            if self.interface is not None:
+                self.interface.next_frame()
+            time.sleep(min(left, 0.01))
+        if self.valves is not None:
+            self.valves.update()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('journals', nargs='+', help='Game journals to replay')
+    parser.add_argument('-speed', type=float, default=1.0, help='Playback speed relative to real time')
+    parser.add_argument('-fast', action='store_true', help='Replay as fast as possible without a UI')
+    parser.add_argument('-seek', type=int, default=0, help='Number of guesses to skip before playing')
+    parser.add_argument('-valves', action='store_true', help='Fire the valves of the air table')
+    args = parser.parse_args()
+
+    interface = None
+    if not args.fast:
+        from ui import Interface
+
+        interface = Interface()
+    table = None
+    if args.valves:
+        from hardware_variables import Port
+
+        table = Table(Port)
+        table.clear()
+
+    diverged = 0
+    for path in args.journals:
+        replay = Replay(path, interface, table, None if args.fast else args.speed)
+        replay.seek(args.seek)
+        replay.run()
+        for position, expected, result in replay.divergences:
+            print(f"{path}: guess {position} was {expected.value}, replayed as {result.value}")
+        diverged += bool(replay.divergences)
+    print(f"Replayed {len(args.journals)} games, {diverged} diverged")
@@ -2,13 +2,19 @@
 This file has been copied from the repository: 
 https://github.com/fetlab/air_table_control
 """
+import threading
 import time
 
+import numpy as np
 import serial
 from bitarray import bitarray
 from cobs import cobs
+from serial.tools import list_ports
 
-from mappings import board19_mapping, flipped_mapping, normal_board_mapping
+from events import DEBUG, events
+from geometry import TABLE, TableGeometry
+from mappings import normal_board_mapping
+from metrics import metrics
 
 
 class Coord(object):
@@ -107,7 +113,7 @@ class Level(object):
     shift-register boards. Multiple Levels could in theory be used to speed up
     communication, but the Table object doesn't support that yet."""
 
-    def __init__(self, data_pin=11, layout=None):
+    def __init__(self, data_pin=11, layout=None, geometry=TABLE):
         """Set up a Level. Set data_pin to the data line that this level
         is attached to (all shift register boards can share the same
         latch/rck and clock/sck lines.)"""
@@ -117,28 +123,10 @@ class Level(object):
         if layout:
             self.layout = layout
         else:
+            # the boards of the table geometry, e.g. Board((12, 8), bid=0) first on the 14x12 table
             self.layout = [
-                Board((12, 8), bid=0),
-                Board((12, 4), bid=1),
-                Board((12, 0), bid=2, mapping=board19_mapping),
-                Board((10, 0), bid=3, mapping=flipped_mapping),
-                Board((10, 4), bid=4, mapping=flipped_mapping),
-                Board((10, 8), bid=5, mapping=flipped_mapping),
-                Board((8, 8), bid=6),
-                Board((8, 4), bid=7),
-                Board((8, 0), bid=8),
-                Board((6, 0), bid=9, mapping=flipped_mapping),
-                Board((6, 4), bid=10, mapping=flipped_mapping),
-                Board((6, 8), bid=11, mapping=flipped_mapping),
-                Board((4, 8), bid=12),
-                Board((4, 4), bid=13),
-                Board((4, 0), bid=14),
-                Board((2, 0), bid=15, mapping=flipped_mapping),
-                Board((2, 4), bid=16, mapping=flipped_mapping),
-                Board((2, 8), bid=17, mapping=flipped_mapping),
-                Board((0, 8), bid=18),
-                Board((0, 4), bid=19),
-                Board((0, 0), bid=20),
+                Board(offset, bid=bid, mapping=mapping)
+                for bid, (offset, mapping) in enumerate(geometry.layout)
             ]
 
         self.coord_to_board = {}
@@ -166,6 +154,13 @@ class Level(object):
     def repr_shift_string(self):
         return " ".join(map(repr, self.layout))
 
+    def load(self, shift_string):
+        """Set all boards from a shift string, as returned by
+        get_shift_string or TableGeometry.valve_frame."""
+        for board, byte in zip(reversed(self.layout), shift_string):
+            board.bits = bitarray()
+            board.bits.frombytes(bytes([byte]))
+
     def get_shift_string(self):
         """Return a binary string that represents the entire Level that
         can be shifted into the first board."""
@@ -181,39 +176,172 @@ class Level(object):
         return self.shift_str()
 
 
+# USB vendor ids of Arduinos and the serial chips of their clones
+ARDUINO_VIDS = {0x2341, 0x2A03, 0x1A86, 0x0403, 0x10C4}
+
+
+def arduino_ports():
+    """Return the serial ports that look like an Arduino."""
+    return [
+        port.device
+        for port in list_ports.comports()
+        if port.vid in ARDUINO_VIDS or "arduino" in (port.description or "").lower()
+    ]
+
+
 class Table:
-    def __init__(self, serial_port, baudrate=115200, data_pin=11, layout=None):
-        self.serial = serial.Serial(serial_port, baudrate=baudrate)
-        self.level = Level(data_pin=data_pin, layout=layout)
-        self.serial.write(cobs.encode(bytes([11]) + b"\x00") + b"\x00")
+    """The valves of an air table, driven over a serial link.
+
+    A write failing because the Arduino reset or the USB link dropped
+    does not stop the game: the link is reconnected in the background,
+    trying the port it was on first and then any Arduino found, while
+    the valves keep being set in the Level. Once connected again, the
+    initialisation frame and the whole Level are sent in one write.
+    serial_port None finds the Arduino the same way.
+
+    The table is written from the game loop, so a write blocks for at
+    most write_timeout seconds before the link counts as lost."""
+
+    def __init__(self, serial_port, baudrate=115200, data_pin=11, layout=None, geometry: TableGeometry = TABLE,
+                 retry_interval=0.05, write_timeout=0.005):
+        self.port = serial_port
+        self.baudrate = baudrate
+        self.geometry = geometry
+        self.level = Level(data_pin=data_pin, layout=layout, geometry=geometry)
+        self.retry_interval = retry_interval
+        self.write_timeout = write_timeout
+        # guards the serial link, which the reconnect thread replaces, and
+        # the Level, which it sends to restore the valves
+        self.lock = threading.RLock()
+        self.reconnecting = None
+        self.closed = False
+        self.serial = None
+        try:
+            self.serial = self.open(serial_port if serial_port is not None else self.ports()[0])
+        except (serial.SerialException, OSError, IndexError) as e:
+            self.lost(e)
+            return
+        self.write(self.init_frame())
+
+    def init_frame(self):
+        return cobs.encode(bytes([self.level.data_pin]) + b"\x00") + b"\x00"
+
+    def open(self, port):
+        """Open the port without toggling DTR, which would reset the
+        Arduino into its bootloader for a second or two."""
+        link = serial.serial_for_url(port, baudrate=self.baudrate, write_timeout=self.write_timeout, do_not_open=True)
+        link.dtr = False
+        link.open()
+        return link
+
+    def ports(self):
+        """Return the ports to try, the one the table was on first."""
+        ports = arduino_ports()
+        if self.port is not None:
+            ports = [self.port] + [port for port in ports if port != self.port]
+        return ports
+
+    def write(self, data):
+        """Write to the table. Returns False if the link is down, in
+        which case the data is sent with the Level once reconnected."""
+        with self.lock:
+            if self.serial is None:
+                return False
+            try:
+                self.serial.write(data)
+                return True
+            except (serial.SerialException, OSError) as e:
+                self.lost(e)
+                return False
+
+    def lost(self, error):
+        """Drop the link and start reconnecting in the background."""
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except (serial.SerialException, OSError):
+                pass
+            self.serial = None
+        events.error(f"Lost the table on {self.port}: {error}", "table_lost", port=self.port, error=str(error))
+        if self.reconnecting is None and not self.closed:
+            self.reconnecting = threading.Thread(target=self.reconnect, name="table-reconnect", daemon=True)
+            self.reconnecting.start()
+
+    def reconnect(self):
+        lost_at = time.perf_counter()
+        while not self.closed:
+            for port in self.ports():
+                try:
+                    link = self.open(port)
+                except (serial.SerialException, OSError):
+                    continue
+                with self.lock:
+                    if self.closed:
+                        link.close()
+                        return
+                    try:
+                        link.write(self.init_frame() + self.level.shift_str())
+                    except (serial.SerialException, OSError):
+                        link.close()
+                        continue
+                    self.serial = link
+                    self.port = port
+                    self.reconnecting = None
+                elapsed = time.perf_counter() - lost_at
+                events.info(
+                    f"Reconnected to the table on {port} after {elapsed * 1000:.0f} ms",
+                    "table_reconnected", port=port, seconds=elapsed,
+                )
+                return
+            time.sleep(self.retry_interval)
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            if self.serial is not None:
+                self.serial.close()
+                self.serial = None
 
     def set(self, coord, value):
-        self.serial.write(self.level.set_and_shift(coord, value))
+        with self.lock:
+            self.write(self.level.set_and_shift(coord, value))
+
+    def set_frame(self, open_cells):
+        """Open the valves of the cells set in open_cells, an array
+        indexed [y, x] like the geometry, and close all others in one write."""
+        with self.lock:
+            self.level.load(self.geometry.valve_frame(open_cells))
+            self.send()
 
     def fill(self):
         """Open all valves."""
-        self.level.fill()
-        self.serial.write(self.level.shift_str())
+        with self.lock:
+            self.level.fill()
+            self.write(self.level.shift_str())
 
     def clear(self):
         """Close all valves."""
-        self.level.clear()
-        self.serial.write(self.level.shift_str())
+        with self.lock:
+            self.level.clear()
+            self.write(self.level.shift_str())
 
     def send(self):
-        self.serial.write(self.level.shift_str())
+        with self.lock:
+            self.write(self.level.shift_str())
 
     def cycle_board(self, board, delay=1):
         """Toggle on/off all valves in a board."""
         while True:
             print(f"Clear board {board}")
-            self.level.layout[board].clear()
-            self.send()
+            with self.lock:
+                self.level.layout[board].clear()
+                self.send()
             time.sleep(delay)
 
             print(f"Fill board {board}")
-            self.level.layout[board].fill()
-            self.send()
+            with self.lock:
+                self.level.layout[board].fill()
+                self.send()
             time.sleep(delay)
 
     def burst(self, coord, delay=1):
@@ -222,6 +350,44 @@ class Table:
         self.set(coord, 0)
 
 
+class ValveScheduler:
+    """
+    Fires valve bursts on an air table without sleeping in between.
+
+    The valve is opened right away and closed by update, which is called periodically,
+    e.g. by the valve task of the game controller. All valves closing in one update are sent in a single write
+    of the whole frame of valves still open.
+    """
+
+    def __init__(self, table: Table) -> None:
+        self.table = table
+        self.closing: dict[tuple[int, int], float] = {}
+        # the valves open now, indexed [y, x]
+        self.open = np.zeros((table.geometry.height, table.geometry.width), dtype=bool)
+        # perf_counter time the latest valve was opened at
+        self.last_burst: float | None = None
+
+    def burst(self, coord: tuple[int, int], delay: float = 1):
+        with metrics.span("valve_write"):
+            self.table.set(coord, 1)
+        self.open[coord[1], coord[0]] = True
+        self.last_burst = time.perf_counter()
+        self.closing[coord] = time.monotonic() + delay
+        events.emit("valve", f"Opened valve {coord} for {delay} s", DEBUG, coord=coord, open=True, delay=delay)
+
+    def update(self, closing_all: bool = False):
+        now = time.monotonic()
+        closed = [coord for coord, at in self.closing.items() if closing_all or at <= now]
+        if not closed:
+            return
+        for coord in closed:
+            del self.closing[coord]
+            self.open[coord[1], coord[0]] = False
+        with metrics.span("valve_write"):
+            self.table.set_frame(self.open)
+        events.emit("valve", f"Closed valves {closed}", DEBUG, coords=closed, open=False)
+
+
 if __name__ == "__main__":
     import sys
 
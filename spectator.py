@@ -0,0 +1,235 @@
+import asyncio
+import json
+from collections import deque
+
+from events import INFO, Event
+from geometry import TABLE, TableGeometry
+from network import network_loop
+
+# the events that change what spectators see
+STATUS_KINDS = {"turn", "ship_sunk", "game_over", "resumed"}
+MARKED = ("hit", "miss", "finished_game")
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Immersive battleships</title>
+<style>
+body { background: #000; color: #fff; font-family: sans-serif; text-align: center; }
+.boards { display: flex; justify-content: center; gap: 40px; }
+.board { display: grid; gap: 2px; }
+.cell { width: 28px; height: 28px; background: #235; }
+.hit { background: #e22; }
+.miss { background: #ddd; }
+.sunk { background: #800; }
+#status { font-size: 28px; margin: 20px; }
+#guesses { list-style: none; padding: 0; }
+</style>
+</head>
+<body>
+<div class="boards"><div class="board" id="board2"></div><div class="board" id="board1"></div></div>
+<div id="status"></div>
+<ul id="guesses"></ul>
+<script>
+const [columns, rows] = [COLUMNS, ROWS];
+for (const board of [1, 2]) {
+  const grid = document.getElementById("board" + board);
+  grid.style.gridTemplateColumns = `repeat(${columns}, 28px)`;
+  // rows are listed from the top, while the UI boards count y from the bottom
+  for (let y = rows - 1; y >= 0; y--) {
+    for (let x = 0; x < columns; x++) {
+      const cell = document.createElement("div");
+      cell.className = "cell";
+      cell.id = `c${board}-${x}-${y}`;
+      grid.appendChild(cell);
+    }
+  }
+}
+const recent = [];
+function apply(diff) {
+  if (diff.snapshot) {
+    document.querySelectorAll(".cell").forEach(cell => cell.className = "cell");
+    recent.length = 0;
+  }
+  for (const [board, x, y, mark] of diff.cells || []) {
+    document.getElementById(`c${board}-${x}-${y}`).className = "cell " + mark;
+  }
+  if (diff.status !== undefined) document.getElementById("status").textContent = diff.status;
+  for (const guess of diff.guesses || []) {
+    recent.unshift(`Player ${guess.player}: (${guess.guess}) ${guess.result}`);
+  }
+  recent.length = Math.min(recent.length, RECENT);
+  document.getElementById("guesses").innerHTML = recent.map(line => `<li>${line}</li>`).join("");
+}
+new EventSource("/events").onmessage = message => apply(JSON.parse(message.data));
+</script>
+</body>
+</html>
+"""
+
+
+class SpectatorServer:
+    """
+    Serves a web view of both boards, the status and the latest guesses to spectators over HTTP.
+
+    The server is a sink of the event bus, so the game thread only emits the events it emits anyway.
+    The events written in one drain of the bus are turned into a single diff of the marked cells,
+    the status and the new guesses, which is encoded once and sent to every spectator as a
+    Server-Sent Event. A spectator is sent the whole state when connecting, and dropped if it
+    falls more than max_buffer bytes behind. A resumed game carries its restored guesses, which
+    replace the state. Networking runs on the shared network loop.
+    """
+
+    def __init__(
+        self,
+        host: str = "0.0.0.0",
+        port: int = 8080,
+        recent: int = 10,
+        max_buffer: int = 1 << 16,
+        geometry: TableGeometry = TABLE,
+    ) -> None:
+        self.level = INFO
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.geometry = geometry
+        self.loop = network_loop()
+        self.server: asyncio.Server | None = None
+        self.clients: set[asyncio.StreamWriter] = set()
+        # the state shown, only changed on the network loop
+        self.cells: dict[tuple[int, int, int], str] = {}
+        self.status = "Awaiting for players to be ready."
+        self.guesses: deque[dict] = deque(maxlen=recent)
+        self.seq = 0
+        # the diff of the events written since the last flush, only used on the thread of the event bus
+        self.batch: dict = {}
+        columns, rows = geometry.ui_size
+        self.page = (
+            PAGE.replace("COLUMNS", str(columns)).replace("ROWS", str(rows)).replace("RECENT", str(recent)).encode()
+        )
+
+    def start(self):
+        """
+        Starts serving the spectators.
+        """
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle_client, self.host, self.port), self.loop
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def write(self, event: Event):
+        if event.kind == "resumed":
+            # the restored guesses were never emitted, so the whole state is replaced
+            self.batch = {"snapshot": True, "cells": [], "guesses": []}
+            for player, guess, result in event.fields["moves"]:
+                self.mark(player, guess, result.value)
+            for sections in event.fields["sunk"]:
+                self.mark_sunk(sections)
+        elif event.kind == "result" and event.fields["result"].value in MARKED:
+            self.mark(event.fields["player"], event.fields["guess"], event.fields["result"].value)
+        elif event.kind == "ship_sunk":
+            self.mark_sunk(event.fields["sections"])
+        if event.kind in STATUS_KINDS:
+            self.batch["status"] = event.message.strip()
+
+    def mark(self, player: int, guess: tuple[int, int], result: str):
+        if result not in MARKED:
+            return
+        board, (x, y) = self.geometry.to_ui(guess)
+        self.batch.setdefault("cells", []).append([board, x, y, "miss" if result == "miss" else "hit"])
+        self.batch.setdefault("guesses", []).append({"player": player, "guess": list(guess), "result": result})
+
+    def mark_sunk(self, sections: list[tuple[int, int]]):
+        for coord in sections:
+            board, (x, y) = self.geometry.to_ui(coord)
+            self.batch.setdefault("cells", []).append([board, x, y, "sunk"])
+
+    def flush(self):
+        if self.batch:
+            diff, self.batch = self.batch, {}
+            self.loop.call_soon_threadsafe(self.apply, diff)
+
+    def close(self):
+        if self.server is not None:
+            self.loop.call_soon_threadsafe(self.server.close)
+        for writer in list(self.clients):
+            self.loop.call_soon_threadsafe(writer.close)
+
+    def apply(self, diff: dict):
+        """
+        Applies a diff to the state and sends it to the spectators.
+        A snapshot diff replaces the state.
+        """
+        if diff.get("snapshot"):
+            self.cells.clear()
+            self.guesses.clear()
+        changed = []
+        for board, x, y, mark in diff.get("cells", []):
+            # the hit sinking a ship is written after the ship was sunk
+            if self.cells.get((board, x, y)) != "sunk":
+                self.cells[board, x, y] = mark
+                changed.append([board, x, y, mark])
+        diff["cells"] = changed
+        if "status" in diff:
+            self.status = diff["status"]
+        self.guesses.extend(diff.get("guesses", []))
+        self.seq += 1
+        message = self.message(diff)
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.drop(writer)
+            else:
+                writer.write(message)
+
+    def snapshot(self) -> dict:
+        return {
+            "snapshot": True,
+            "cells": [[*cell, mark] for cell, mark in self.cells.items()],
+            "status": self.status,
+            "guesses": list(self.guesses),
+        }
+
+    def message(self, diff: dict) -> bytes:
+        data = json.dumps(diff, separators=(",", ":"))
+        return f"id: {self.seq}\ndata: {data}\n\n".encode()
+
+    def drop(self, writer: asyncio.StreamWriter):
+        self.clients.discard(writer)
+        writer.close()
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            writer.close()
+            return
+        parts = request.split()
+        path = parts[1].decode(errors="replace") if len(parts) > 1 else ""
+        if path == "/":
+            self.respond(writer, "200 OK", "text/html; charset=utf-8", self.page)
+        elif path == "/state":
+            self.respond(writer, "200 OK", "application/json", json.dumps(self.snapshot()).encode())
+        elif path == "/events":
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                b"Connection: keep-alive\r\n\r\n" + self.message(self.snapshot())
+            )
+            self.clients.add(writer)
+            try:
+                # spectators send nothing more, so this only returns once they disconnect
+                await reader.read()
+            except ConnectionError:
+                pass
+            self.drop(writer)
+        else:
+            self.respond(writer, "404 Not Found", "text/plain", b"Not found")
+
+    def respond(self, writer: asyncio.StreamWriter, status: str, content_type: str, body: bytes):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        writer.close()
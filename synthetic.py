@@ -0,0 +1,312 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+from cv2 import aruco
+
+import aruco_map
+from battleships import Ship
+from camera import COLOR_TO_BGR, Camera, MarkerTracker
+from geometry import TABLE
+from metrics import metrics
+
+COORD = tuple[int, int]
+
+# aruco ids of the dials of each player: the dial setting the x coordinate, the one setting y, and confirm
+DIALS = {
+    1: (
+        aruco_map.PLAYER1_VERTICAL_Y_COORD_TO_ARUCO_ID,
+        aruco_map.PLAYER1_HORIZONTAL_X_COORD_TO_ARUCO_ID,
+        aruco_map.PLAYER1_GUESS_CONFIRM,
+    ),
+    2: (
+        aruco_map.PLAYER2_VERTICAL_Y_COORD_TO_ARUCO_ID,
+        aruco_map.PLAYER2_HORIZONTAL_X_COORD_TO_ARUCO_ID,
+        aruco_map.PLAYER2_GUESS_CONFIRM,
+    ),
+}
+
+BOARD_COLOR = (205, 205, 200)
+HOLE_COLOR = (40, 40, 40)
+
+
+def random_fleet(
+    rng: np.random.Generator, lengths: tuple[int, ...] = (2, 3, 4, 5), board_size: COORD = TABLE.size
+) -> dict[str, list[COORD]]:
+    """
+    Places a straight ship of every length for both players, one color per length.
+    Each color holds the ship of player 1 on the left half and the ship of player 2 on the right half.
+
+    Returns the color to the board coordinates of its pegs.
+    """
+    half = board_size[0] // 2
+    fleet: dict[str, list[COORD]] = {}
+    taken: set[COORD] = set()
+    for color, length in zip(COLOR_TO_BGR, lengths):
+        fleet[color] = []
+        for offset in (0, half):
+            while True:
+                if rng.random() < 0.5:
+                    x = int(rng.integers(0, half - length + 1))
+                    y = int(rng.integers(0, board_size[1]))
+                    sections = [(offset + x + i, y) for i in range(length)]
+                else:
+                    x = int(rng.integers(0, half))
+                    y = int(rng.integers(0, board_size[1] - length + 1))
+                    sections = [(offset + x, y + i) for i in range(length)]
+                if taken.isdisjoint(sections):
+                    break
+            taken.update(sections)
+            fleet[color] += sections
+    return fleet
+
+
+def fleet_ships(fleet: dict[str, list[COORD]], board_size: COORD = TABLE.size) -> list[Ship]:
+    """
+    Returns the ships of a fleet as GameController.get_ships finds them.
+    """
+    half = board_size[0] // 2
+    ships = []
+    for sections in fleet.values():
+        ships.append(Ship([c for c in sections if c[0] < half], 1))
+        ships.append(Ship([c for c in sections if c[0] >= half], 2))
+    return ships
+
+
+class SyntheticFrames:
+    """
+    Renders camera frames of the air table with known content.
+
+    A frame shows the hole grid, the pegs of the fleet in their colors and the dials of both players.
+    The board is drawn like the camera sees it: board x grows to the left of the image and board y downwards.
+    Perspective, noise, blur and lighting are applied on top to look like a real camera.
+
+    columns limits the frame to those columns of the board, and players to the dials of those players,
+    like a camera of a CameraRig sees the table.
+    perspective moves every corner of the frame by up to that fraction of its size,
+    noise is the standard deviation of the gaussian pixel noise, blur the size of the
+    gaussian blur kernel, and lighting the strength of a brightness gradient across the frame.
+    """
+
+    def __init__(
+        self,
+        fleet: dict[str, list[COORD]] | None = None,
+        size: COORD = (1280, 720),
+        pitch: int = 40,
+        board_size: COORD = TABLE.size,
+        columns: range | None = None,
+        players: tuple[int, ...] = (1, 2),
+        perspective: float = 0.0,
+        noise: float = 0.0,
+        blur: int = 0,
+        lighting: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.size = size
+        self.pitch = pitch
+        self.board_size = board_size
+        self.columns = columns or range(board_size[0])
+        self.players = players
+        self.perspective = perspective
+        self.noise = noise
+        self.blur = blur | 1 if blur else 0
+        self.lighting = lighting
+        self.rng = np.random.default_rng(seed)
+        self.dictionary = aruco.getPredefinedDictionary(aruco.DICT_4X4_250)
+        self.marker_size = pitch * 2
+        self.marker_images: dict[int, np.ndarray] = {}
+        # top left corner of the board in the image
+        self.origin = (
+            (size[0] - len(self.columns) * pitch) // 2,
+            (size[1] - board_size[1] * pitch) // 2,
+        )
+        self.set_fleet(fleet or {})
+
+    def set_fleet(self, fleet: dict[str, list[COORD]]):
+        """
+        Draws the board with the pegs of the fleet, which every frame starts from.
+        """
+        self.fleet = fleet
+        width, height = self.size
+        base = np.full((height, width, 3), BOARD_COLOR, dtype=np.uint8)
+        pegs = {coord: color for color, coords in fleet.items() for coord in coords}
+        for x in self.columns:
+            for y in range(self.board_size[1]):
+                center = self.hole_center((x, y))
+                if (x, y) in pegs:
+                    cv2.circle(base, center, self.pitch // 5, COLOR_TO_BGR[pegs[(x, y)]], -1, cv2.LINE_AA)
+                else:
+                    cv2.circle(base, center, self.pitch // 10, HOLE_COLOR, -1, cv2.LINE_AA)
+        self.base = base
+
+    def hole_center(self, coord: COORD) -> COORD:
+        """
+        Returns the image coordinates of the hole at the board coordinate.
+        """
+        column = self.columns[-1] - coord[0]
+        return (
+            self.origin[0] + column * self.pitch + self.pitch // 2,
+            self.origin[1] + coord[1] * self.pitch + self.pitch // 2,
+        )
+
+    def dial_ids(self, player: int, guess: COORD | None, confirmed: bool) -> list[int]:
+        """
+        Returns the aruco ids the dials of the player show for the guess.
+        Dials without a guess show their zero position.
+        """
+        x_map, y_map, confirm = DIALS[player]
+        if guess is None:
+            ids = [min(x_map), min(y_map)]
+        else:
+            x_ids = {coord: id for id, coord in x_map.items()}
+            y_ids = {coord: id for id, coord in y_map.items()}
+            if guess[0] not in x_ids or guess[1] not in y_ids:
+                raise ValueError(f"Player {player} can not dial {guess}")
+            ids = [x_ids[guess[0]], y_ids[guess[1]]]
+        if confirmed:
+            ids.append(confirm)
+        return ids
+
+    def marker(self, id: int) -> np.ndarray:
+        image = self.marker_images.get(id)
+        if image is None:
+            marker = aruco.generateImageMarker(self.dictionary, id, self.marker_size)
+            image = cv2.cvtColor(marker, cv2.COLOR_GRAY2BGR)
+            quiet = self.marker_size // 6
+            image = cv2.copyMakeBorder(image, quiet, quiet, quiet, quiet, cv2.BORDER_CONSTANT, value=(255, 255, 255))
+            self.marker_images[id] = image
+        return image
+
+    def render(self, dials: dict[int, tuple[COORD | None, bool]] | None = None) -> np.ndarray:
+        """
+        Renders a frame with the dials of every player set to (guess, confirmed).
+        Players not in dials show their zero position without confirming.
+
+        Returns the frame in BGR.
+        """
+        frame = self.base.copy()
+        width, height = self.size
+        spacing = self.marker_size * 3 // 2
+        for player in self.players:
+            guess, confirmed = (dials or {}).get(player, (None, False))
+            # player 1 sits on the left half of the board, which is drawn on the right of the image
+            center_x = width - self.origin[0] // 2 if player == 1 else self.origin[0] // 2
+            for slot, id in enumerate(self.dial_ids(player, guess, confirmed)):
+                marker = self.marker(id)
+                top = height // 2 + (slot - 1) * spacing - marker.shape[0] // 2
+                left = center_x - marker.shape[1] // 2
+                frame[top : top + marker.shape[0], left : left + marker.shape[1]] = marker
+        return self.distort(frame)
+
+    def distort(self, frame: np.ndarray) -> np.ndarray:
+        width, height = self.size
+        if self.perspective:
+            corners = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+            shift = self.rng.uniform(-self.perspective, self.perspective, (4, 2)) * (width, height)
+            matrix = cv2.getPerspectiveTransform(corners, np.float32(corners + shift))
+            frame = cv2.warpPerspective(frame, matrix, self.size, borderValue=BOARD_COLOR)
+        if self.lighting:
+            angle = self.rng.uniform(0, 2 * np.pi)
+            xs = np.linspace(-0.5, 0.5, width, dtype=np.float32) * np.cos(angle)
+            ys = np.linspace(-0.5, 0.5, height, dtype=np.float32) * np.sin(angle)
+            gain = 1 + self.lighting * (ys[:, None] + xs[None, :])
+            frame = cv2.multiply(frame, np.dstack([gain] * 3), dtype=cv2.CV_8U)
+        if self.blur:
+            frame = cv2.GaussianBlur(frame, (self.blur, self.blur), 0)
+        if self.noise:
+            noise = self.rng.normal(0, self.noise, frame.shape).astype(np.float32)
+            frame = cv2.add(frame, noise, dtype=cv2.CV_8U)
+        return frame
+
+
+class SyntheticCamera(Camera):
+    """
+    Camera rendering synthetic frames instead of capturing them, at most fps frames per second.
+
+    The dials are set with set_dial, so the game can be played without a table.
+    """
+
+    def __init__(self, frames: SyntheticFrames, fps: float | None = 30) -> None:
+        self.frames = frames
+        self.fps = fps
+        self.columns = frames.columns
+        self.dials: dict[int, tuple[COORD | None, bool]] = {}
+        self.next_frame = time.perf_counter()
+        self.seq = 0
+        self.captured = 0.0
+        self.tracker = MarkerTracker(frames.dictionary)
+        self.profile = None
+        self.profile_path = None
+        self.markers: dict[int, np.ndarray] = {}
+        self.pegs: dict[str, list[tuple[int, int]]] = {}
+
+    def close(self):
+        pass
+
+    def set_dial(self, player: int, guess: COORD | None, confirmed: bool = True):
+        self.dials[player] = (guess, confirmed)
+
+    def get_image(self) -> np.ndarray:
+        if self.fps:
+            now = time.perf_counter()
+            if self.next_frame > now:
+                time.sleep(self.next_frame - now)
+            self.next_frame = max(now, self.next_frame) + 1 / self.fps
+        self.captured = time.perf_counter()
+        with metrics.span("capture"):
+            image = self.frames.render(self.dials)
+        metrics.count("frames")
+        return image
+
+
+def benchmark(frames: SyntheticFrames, count: int, seed: int | None = None):
+    """
+    Detects the ships and guesses of count random frames and prints the accuracy and throughput.
+    """
+    from game_controller import GameController
+
+    rng = np.random.default_rng(seed)
+    camera = SyntheticCamera(frames, fps=None)
+    controller = GameController(camera, False)
+
+    ships_ok = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        frames.set_fleet(random_fleet(rng))
+        ships = controller.get_ships(camera.capture())
+        expected = sorted((ship.player, sorted(ship.filled)) for ship in fleet_ships(frames.fleet))
+        if ships is not None and sorted((ship.player, sorted(ship.filled)) for ship in ships) == expected:
+            ships_ok += 1
+    ships_time = time.perf_counter() - started
+
+    guesses_ok = 0
+    started = time.perf_counter()
+    for _ in range(count):
+        player = int(rng.integers(1, 3))
+        x_map, y_map, _ = DIALS[player]
+        guess = (int(rng.choice(list(x_map.values()))), int(rng.choice(list(y_map.values()))))
+        camera.set_dial(player, guess)
+        if controller.get_guess(camera.capture(), player) == guess:
+            guesses_ok += 1
+        camera.set_dial(player, None, False)
+    guesses_time = time.perf_counter() - started
+
+    print(f"get_ships: {ships_ok}/{count} correct, {count / ships_time:.1f} frames/s")
+    print(f"get_guess: {guesses_ok}/{count} correct, {count / guesses_time:.1f} frames/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-frames', type=int, default=100, help='Number of frames per detector')
+    parser.add_argument('-perspective', type=float, default=0.02, help='Largest corner shift as a fraction of the frame')
+    parser.add_argument('-noise', type=float, default=4, help='Standard deviation of the pixel noise')
+    parser.add_argument('-blur', type=int, default=3, help='Size of the blur kernel')
+    parser.add_argument('-lighting', type=float, default=0.3, help='Strength of the brightness gradient')
+    parser.add_argument('-seed', type=int, default=None, help='Seed of the random fleets, guesses and distortions')
+    args = parser.parse_args()
+
+    frames = SyntheticFrames(
+        perspective=args.perspective, noise=args.noise, blur=args.blur, lighting=args.lighting, seed=args.seed
+    )
+    benchmark(frames, args.frames, args.seed)
@@ -0,0 +1,60 @@
+import contextlib
+import io
+import unittest
+from aruco_map import *
+from events import DEBUG, events
+
+class EventSink:
+    level = DEBUG
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class TestDecodeDials(unittest.TestCase):
+    def test_both_players(self):
+        dials = decode_dials([14, 20, 100, 32, 43, 7, 249])
+        self.assertEqual(dials, {1: ((9, 3), True), 2: ((2, 5), False)})
+
+    def test_every_dial_id(self):
+        for player, x_map, y_map, confirm in (
+            (1, PLAYER1_VERTICAL_Y_COORD_TO_ARUCO_ID, PLAYER1_HORIZONTAL_X_COORD_TO_ARUCO_ID, PLAYER1_GUESS_CONFIRM),
+            (2, PLAYER2_VERTICAL_Y_COORD_TO_ARUCO_ID, PLAYER2_HORIZONTAL_X_COORD_TO_ARUCO_ID, PLAYER2_GUESS_CONFIRM),
+        ):
+            for x_id, x in x_map.items():
+                for y_id, y in y_map.items():
+                    self.assertEqual(decode_dials([y_id, confirm, x_id])[player], ((x, y), True))
+
+    def test_incomplete(self):
+        self.assertEqual(decode_dials([]), {1: (None, False), 2: (None, False)})
+        self.assertEqual(decode_dials([10, 101, 300, -1]), {1: (None, False), 2: (None, True)})
+        # two markers on one dial
+        self.assertEqual(decode_dials([10, 11, 17, 100])[1], (None, True))
+
+    def test_ambiguous_dial_warns_on_change(self):
+        sink = EventSink()
+        events.add_sink(sink)
+        ambiguous = set()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for ids in ([10, 11, 17, 100],) * 3 + ([10, 17, 100],) * 2 + ([10, 11, 17, 100],):
+                    decode_dials(ids, ambiguous)
+                events.drain()
+        finally:
+            events.remove_sink(sink)
+        self.assertEqual(
+            [(event.kind, event.fields["player"]) for event in sink.events],
+            [("detection_failure", 1), ("detection_recovered", 1), ("detection_failure", 1)],
+        )
+        self.assertEqual(ambiguous, {1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from calibration import *
+from camera import FrameAnalysis
+from synthetic import *
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fleet = random_fleet(np.random.default_rng(13))
+        self.frames = SyntheticFrames(self.fleet, noise=2, blur=3, seed=5)
+        self.camera = SyntheticCamera(self.frames, fps=None)
+        self.camera.profile_path = os.path.join(self.dir.name, "calibration", "camera.json")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_calibrate(self):
+        self.assertTrue(self.camera.calibrate(self.camera.capture(), (14, 12)))
+        profile = CalibrationProfile.load(self.camera.profile_path)
+        np.testing.assert_allclose(profile.homography, self.camera.profile.homography)
+        self.assertAlmostEqual(profile.pitch, 40, delta=1)
+        self.assertEqual(set(profile.hsv_ranges), {"blue", "green", "magenta", "red"})
+
+        cells = profile.cell_centers(range(14), 12)
+        for coord in ((0, 0), (13, 11), (6, 4)):
+            center = self.frames.hole_center(coord)
+            self.assertLessEqual(np.abs(np.subtract(cells[coord], center)).max(), 1)
+            self.assertEqual(profile.board_coord(center), coord)
+
+        # pegs are placed by the homography, without counting holes
+        self.camera.set_dial(1, (9, 3))
+        frame = self.camera.capture()
+        self.assertEqual({color: sorted(coords) for color, coords in frame.board_pegs((14, 12)).items()},
+                         {color: sorted(coords) for color, coords in self.fleet.items()})
+        self.assertIsNone(profile.drift(frame))
+
+    def test_drift(self):
+        self.camera.calibrate(self.camera.capture(), (14, 12))
+        profile = self.camera.profile
+        image = self.camera.get_image()
+        self.assertIsNone(profile.drift(FrameAnalysis(self.camera, image, 1)))
+        darker = (image * 0.6).astype(np.uint8)
+        self.assertIn("lighting", profile.drift(FrameAnalysis(self.camera, darker, 2)))
+        moved = np.roll(image, 40, axis=1)
+        self.assertIn("moved", profile.drift(FrameAnalysis(self.camera, moved, 3)))
+
+if __name__ == '__main__':
+    unittest.main()
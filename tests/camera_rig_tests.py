@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+from camera_rig import *
+from synthetic import *
+
+class TestCameraRig(unittest.TestCase):
+    def setUp(self):
+        self.fleet = random_fleet(np.random.default_rng(7))
+        self.frames = [
+            SyntheticFrames(self.fleet, size=(640, 720), columns=range(0, 7), players=(1,), noise=2, blur=3, seed=1),
+            SyntheticFrames(self.fleet, size=(640, 720), columns=range(7, 14), players=(2,), noise=2, blur=3, seed=2),
+        ]
+        self.rig = CameraRig([SyntheticCamera(frames, fps=None) for frames in self.frames])
+
+    def tearDown(self):
+        self.rig.close()
+
+    def test_fused_pegs(self):
+        frame = self.rig.capture()
+        self.assertEqual(frame.seq, 1)
+        pegs = frame.board_pegs((14, 12))
+        self.assertEqual({color: sorted(coords) for color, coords in pegs.items()},
+                         {color: sorted(coords) for color, coords in self.fleet.items()})
+
+    def test_fused_dials(self):
+        self.rig.cameras[0].set_dial(1, (9, 3))
+        self.rig.cameras[1].set_dial(2, (2, 5), confirmed=False)
+        self.assertEqual(sorted(self.rig.capture().arucos()), [14, 20, 32, 43, 100])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import cv2
+import numpy as np
+from capture_config import *
+
+class TestCaptureConfig(unittest.TestCase):
+    def test_backend(self):
+        self.assertEqual(backend("win32"), cv2.CAP_DSHOW)
+        self.assertEqual(backend("linux"), cv2.CAP_V4L2)
+        self.assertEqual(backend("darwin"), cv2.CAP_AVFOUNDATION)
+        self.assertEqual(backend("sunos5"), cv2.CAP_ANY)
+
+    def test_manual_exposure(self):
+        self.assertEqual(manual_exposure("V4L2"), 1)
+        self.assertEqual(manual_exposure("DSHOW"), 0.25)
+
+    def test_fourcc_name(self):
+        self.assertEqual(fourcc_name(cv2.VideoWriter.fourcc(*"MJPG")), "MJPG")
+        self.assertEqual(fourcc_name(float(cv2.VideoWriter.fourcc(*"YUYV"))), "YUYV")
+
+    def test_decode_scale(self):
+        with self.assertRaises(ValueError):
+            CaptureConfig(decode_scale=3)
+
+    def test_decode_frame(self):
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.circle(image, (320, 240), 100, (0, 0, 255), -1)
+        _, buffer = cv2.imencode(".jpg", image)
+        # backends handing out MJPEG return the buffer as a single row
+        frame = buffer.reshape(1, -1)
+        self.assertEqual(decode_frame(frame, 1).shape, (480, 640, 3))
+        reduced = decode_frame(frame, 4)
+        self.assertEqual(reduced.shape, (120, 160, 3))
+        self.assertGreater(reduced[60, 80, 2], 200)
+        self.assertIs(decode_frame(image, 2), image)
+
+if __name__ == '__main__':
+    unittest.main()
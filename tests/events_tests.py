@@ -0,0 +1,55 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from battleships import GuessReturn
+from events import *
+
+class TestEventBus(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "events.jsonl")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_sinks(self):
+        bus = EventBus(interval=60)
+        bus.add_sink(JsonLinesSink(self.path))
+        output = io.StringIO()
+        with redirect_stdout(output):
+            bus.emit("result", "Guess at (9, 3): hit", player=1, guess=(9, 3), result=GuessReturn.hit)
+            bus.debug("Opened valve", "valve", coord=(9, 3), open=True)
+            bus.close()
+        # the console only prints from info up, the file gets every event
+        self.assertEqual(output.getvalue(), "Guess at (9, 3): hit\n")
+        with open(self.path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["kind"] for line in lines], ["result", "valve"])
+        self.assertEqual(lines[0]["guess"], [9, 3])
+        self.assertEqual(lines[0]["result"], "hit")
+        self.assertEqual(lines[1]["level"], "debug")
+        self.assertEqual([event.seq for event in bus.recent], [1, 2])
+
+    def test_level_filter(self):
+        bus = EventBus(interval=60)
+        bus.set_console_level(WARNING)
+        bus.info("not recorded")
+        bus.warning("recorded", "detection_failure", reason="hole_count")
+        self.assertEqual([event.kind for event in bus.pending], ["detection_failure"])
+        with redirect_stdout(io.StringIO()):
+            bus.close()
+
+    def test_drops_oldest(self):
+        bus = EventBus(size=2, interval=60)
+        for idx in range(5):
+            bus.info(str(idx))
+        self.assertEqual([event.message for event in bus.pending], ["3", "4"])
+        self.assertEqual(bus.dropped, 3)
+        with redirect_stdout(io.StringIO()):
+            bus.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from fleet_tracker import *
+from synthetic import *
+
+class TestFleetTracker(unittest.TestCase):
+    def setUp(self):
+        self.fleet = random_fleet(np.random.default_rng(11))
+        self.frames = SyntheticFrames({}, noise=2, blur=3, seed=4)
+        self.camera = SyntheticCamera(self.frames, fps=None)
+
+    def test_incremental_placement(self):
+        tracker = FleetTracker(stable_frames=2)
+        self.assertFalse(tracker.update(self.camera.capture()))
+        self.assertTrue(tracker.settled())
+        self.assertEqual(tracker.pegs(), {})
+
+        placed = {}
+        for color, coords in self.fleet.items():
+            placed[color] = coords
+            self.frames.set_fleet(dict(placed))
+            self.assertFalse(tracker.update(self.camera.capture()))
+            self.assertFalse(tracker.settled())
+            self.assertTrue(tracker.update(self.camera.capture()))
+            self.assertTrue(tracker.settled())
+            self.assertEqual({c: sorted(coords) for c, coords in tracker.pegs().items()},
+                             {c: sorted(coords) for c, coords in placed.items()})
+
+        # nothing changed, so no cell is classified again
+        self.assertEqual(tracker.changed_cells(cv2.cvtColor(self.camera.get_image(), cv2.COLOR_BGR2GRAY)), [])
+
+    def test_flicker_is_ignored(self):
+        tracker = FleetTracker(stable_frames=3)
+        tracker.update(self.camera.capture())
+        self.frames.set_fleet(self.fleet)
+        tracker.update(self.camera.capture())
+        self.frames.set_fleet({})
+        tracker.update(self.camera.capture())
+        self.assertEqual(tracker.pegs(), {})
+        self.assertTrue(tracker.settled())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+import pyglet
+pyglet.options['headless'] = True
+from battleships import GuessReturn
+from camera import VideoRecorder
+from game_controller import *
+from network import FRAME, RemotePlayerClient, RemotePlayerServer
+from synthetic import *
+from ui import Interface
+
+async def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.01)
+
+class TestPlay(unittest.TestCase):
+    def setUp(self):
+        fleet = random_fleet(np.random.default_rng(5))
+        self.ships = fleet_ships(fleet)
+        self.camera = SyntheticCamera(SyntheticFrames(fleet), fps=30)
+        # the dials are at zero, so the game starts once the ships are detected
+        self.camera.set_dial(1, None, False)
+        self.camera.set_dial(2, None, False)
+
+    def guess(self, player, hit):
+        """
+        Returns the first cell player can guess which hits a ship, or misses every ship.
+        """
+        targets = {coord for ship in self.ships if ship.player != player for coord in ship.filled}
+        columns = range(7, 14) if player == 1 else range(0, 7)
+        return next((x, y) for x in columns for y in range(TABLE.size[1]) if ((x, y) in targets) == hit)
+
+    def play(self, controller, script):
+        """
+        Plays with the controller once the game started, until script returns, and returns its result.
+        """
+        interface = Interface()
+
+        async def play():
+            game = asyncio.create_task(controller.play(interface))
+            await wait_for(lambda: controller.game is not None, timeout=30)
+            result = await script()
+            game.cancel()
+            return result
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(play())
+            events.drain()
+        interface.close()
+        controller.close()
+        return result
+
+    def test_camera_game(self):
+        directory = tempfile.TemporaryDirectory()
+        recorder = VideoRecorder(os.path.join(directory.name, "game.avi"))
+        controller = GameController(self.camera, False, recorder=recorder)
+        plan = [
+            (1, self.guess(1, True), GuessReturn.hit),
+            (2, self.guess(2, False), GuessReturn.miss),
+            (1, self.guess(1, False), GuessReturn.miss),
+        ]
+
+        async def script():
+            turns = [controller.game.current_player()]
+            for count, (player, coord, _) in enumerate(plan, 1):
+                self.camera.set_dial(player, coord)
+                await wait_for(lambda: len(controller.game.moves) == count)
+                turns.append(controller.game.current_player())
+            return turns
+
+        turns = self.play(controller, script)
+        self.assertEqual(
+            sorted((ship.player, sorted(ship.filled)) for ship in controller.ships),
+            sorted((ship.player, sorted(ship.filled)) for ship in self.ships),
+        )
+        self.assertEqual(controller.game.moves, plan)
+        # a hit or a miss passes the turn
+        self.assertEqual(turns, [1, 2, 1, 2])
+        # the frames of the game are recorded without reading the camera a second time
+        self.assertGreater(os.path.getsize(recorder.path), 0)
+        directory.cleanup()
+
+    def test_early_guess_trace(self):
+        controller = GameController(self.camera, False)
+
+        async def script():
+            # player 2 confirms their guess while player 1 is still guessing
+            confirmed = time.perf_counter()
+            self.camera.set_dial(2, self.guess(2, False))
+            # the confirm marker is found by a full detection, which runs at least every refresh frames
+            seq = self.camera.seq
+            await wait_for(lambda: self.camera.seq > seq + 2 * self.camera.tracker.refresh)
+            turn_began = time.perf_counter()
+            self.camera.set_dial(1, self.guess(1, False))
+            await wait_for(lambda: len(controller.game.moves) == 2)
+            return confirmed, turn_began
+
+        tracer.enabled = True
+        try:
+            confirmed, turn_began = self.play(controller, script)
+        finally:
+            tracer.enabled = False
+        trace = next(trace for trace in tracer.traces if trace.player == 2)
+        tracer.traces.clear()
+        # the trace starts at the frame the guess was confirmed on, not the one its turn began on
+        self.assertGreater(trace.hops["capture"], confirmed)
+        self.assertLess(trace.hops["capture"], turn_began)
+        self.assertGreater(trace.hops["decoded"], turn_began)
+
+class TestRemoteGuesses(unittest.TestCase):
+    def test_remote_guess_latency(self):
+        server = RemotePlayerServer(2, host="127.0.0.1", port=0)
+        server.start()
+        camera = SyntheticCamera(SyntheticFrames({}), fps=None)
+        controller = GameController(camera, True, remote=server)
+        interface = Interface()
+
+        async def play():
+            game = asyncio.create_task(controller.play(interface))
+            client = RemotePlayerClient()
+            await client.connect("127.0.0.1", server.port)
+            await wait_for(lambda: client.turn == 1)
+            # sent before the turn of the remote player, and made once it begins
+            early = asyncio.create_task(client.guess((5, 5)))
+            await asyncio.sleep(0.05)
+            self.assertFalse(early.done())
+            controller.queue_local_guess((7, 7))
+            self.assertEqual(await early, GuessReturn.miss)
+            controller.queue_local_guess((13, 0))
+            await wait_for(lambda: client.turn == 2)
+            for guess, local in [((0, 0), (7, 8)), ((0, 1), (7, 9))]:
+                self.assertEqual(await client.guess(guess), GuessReturn.hit)
+                controller.queue_local_guess(local)
+                await wait_for(lambda: client.turn == 2)
+            latencies = client.latencies[1:]
+            await client.close()
+            game.cancel()
+            return latencies
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies = asyncio.run(play())
+            events.drain()
+        server.close()
+        interface.close()
+        self.assertEqual(len(latencies), 2)
+        # the guess is made and answered within a frame of the UI
+        self.assertLess(max(latencies), 1 / GameController.render_fps)
+
+    def test_malformed_message(self):
+        server = RemotePlayerServer(2, host="127.0.0.1", port=0)
+        server.start()
+
+        async def send():
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            await reader.readexactly(FRAME.size + 1)
+            writer.write(FRAME.pack(0, 99, 1))
+            # the server closes the connection instead of dying on the unknown kind
+            rest = await asyncio.wait_for(reader.read(), 2)
+            writer.close()
+            return rest
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(asyncio.run(send()), b"")
+            events.drain()
+        self.assertIsNone(server.connection)
+        server.close()
+
+class EventSink:
+    level = DEBUG
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class TestResume(unittest.TestCase):
+    def test_resumed_event_carries_moves(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "battleships.journal")
+            ships = [Ship([(0,0),(0,1)], 1), Ship([(0,3),(0,4)], 1), Ship([(8,9),(9,9)], 2)]
+            game = Game(TABLE.size, ships, journal=GameJournal(path))
+            sink = EventSink()
+            events.add_sink(sink)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for guess in ((8, 8), (0, 0), (8, 9), (0, 1)):
+                        game.make_guess(guess)
+                    game.journal.close()
+                    controller = GameController(None, True, journal_path=path)
+                    interface = Interface()
+                    controller.try_resume(interface)
+                    controller.journal.close()
+                    interface.close()
+                    events.drain()
+            finally:
+                events.remove_sink(sink)
+        resumed = next(event for event in sink.events if event.kind == "resumed")
+        self.assertEqual(resumed.fields["moves"], game.moves)
+        self.assertEqual(resumed.fields["sunk"], [[(0, 0), (0, 1)]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+import numpy as np
+from geometry import *
+from shift_valves import Level
+
+class TestTableGeometry(unittest.TestCase):
+    def test_ui(self):
+        for x in range(14):
+            for y in range(12):
+                if x < 7:
+                    self.assertEqual(TABLE.to_ui((x, y)), (1, (11 - y, x)))
+                else:
+                    self.assertEqual(TABLE.to_ui((x, y)), (2, (y, 13 - x)))
+
+    def test_ui_board(self):
+        values = np.arange(14 * 12).reshape(12, 14)
+        for player in (1, 2):
+            board = TABLE.ui_board(values, player)
+            self.assertEqual(board.shape, (7, 12))
+            for (y, x), value in np.ndenumerate(values):
+                owner, (ui_x, ui_y) = TABLE.to_ui((x, y))
+                if owner == player:
+                    self.assertEqual(board[ui_y, ui_x], value)
+
+    def test_dials(self):
+        self.assertEqual(TABLE.dial(1, X_DIAL), {10 + idx: 13 - idx for idx in range(7)})
+        self.assertEqual(TABLE.dial(1, Y_DIAL), {17 + idx: idx for idx in range(12)})
+        self.assertEqual(TABLE.dial(2, X_DIAL), {30 + idx: idx for idx in range(7)})
+        self.assertEqual(TABLE.dial(2, Y_DIAL), {37 + idx: 11 - idx for idx in range(12)})
+        self.assertEqual(TABLE.decode[100].tolist(), [1, CONFIRM, 0])
+        self.assertEqual(TABLE.decode[14].tolist(), [1, X_DIAL, 9])
+
+    def test_valve_frame(self):
+        level = Level()
+        self.assertEqual([offset for offset, _ in TABLE.layout[:4]], [(12, 8), (12, 4), (12, 0), (10, 0)])
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            cells = rng.random((12, 14)) < 0.3
+            level.clear()
+            for y, x in zip(*np.nonzero(cells)):
+                level.set((int(x), int(y)), 1)
+            frame = TABLE.valve_frame(cells)
+            self.assertEqual(level.get_shift_string(), frame)
+            level.clear()
+            level.load(frame)
+            self.assertEqual(level.get_shift_string(), frame)
+
+    def test_other_size(self):
+        geometry = TableGeometry((10, 8), {1: (0, 20, 100), 2: (40, 60, 101)}, valve_mappings={})
+        # every cell has exactly one valve
+        self.assertEqual(len(geometry.layout), 10)
+        self.assertTrue((geometry.valve_byte >= 0).all())
+        self.assertEqual(len(set(zip(geometry.valve_byte.flat, geometry.valve_mask.flat))), 80)
+        self.assertEqual(geometry.ui_size, (8, 5))
+        self.assertEqual(geometry.to_ui((9, 0)), (2, (0, 0)))
+        self.assertEqual(geometry.dial(2, X_DIAL), {40 + idx: idx for idx in range(5)})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from battleships import *
+from history import *
+
+def play_game(guesses):
+    game = Game((10,10), [Ship([(0,0),(0,1)], 1), Ship([(8,9),(9,9)], 2)])
+    for guess in guesses:
+        game.make_guess(guess)
+    return game
+
+class TestGameHistory(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.history = GameHistory(os.path.join(self.dir.name, "history.sqlite"))
+
+    def tearDown(self):
+        self.history.close()
+        self.dir.cleanup()
+
+    def test_add_game(self):
+        self.history.add_game(play_game([(8,8), (0,0), (8,9), (1,1), (9,9)]))
+        self.history.add_game(play_game([(5,5), (0,0), (8,9), (0,1)]))
+
+        self.assertEqual(self.history.average_shots_to_win(), 2.5)
+        self.assertEqual(self.history.average_shots_to_win(1), 3)
+        self.assertEqual(list(self.history.shots_to_win()), [3, 2])
+
+        first_hits = self.history.heatmap("first_hits", player=2, board_size=(10,10))
+        self.assertEqual(first_hits[0, 0], 2)
+        self.assertEqual(first_hits.sum(), 2)
+        hits = self.history.heatmap("hits", board_size=(10,10))
+        self.assertEqual(hits[9, 8], 2)
+        self.assertEqual(hits[1, 0], 1)
+        guesses = self.history.heatmap("guesses", player=1, board_size=(10,10))
+        self.assertEqual(guesses.sum(), 5)
+        ships = self.history.heatmap("ships", board_size=(10,10))
+        self.assertEqual(ships.sum(), 8)
+
+        with self.assertRaises(ValueError):
+            self.history.heatmap("misses")
+
+    def test_shots_skip_invalid_guesses(self):
+        # player 1 repeats a guess and guesses off the board before winning
+        self.history.add_game(play_game([(8,8), (0,0), (8,8), (10,3), (8,9), (1,1), (9,9)]))
+        self.assertEqual(list(self.history.shots_to_win()), [3])
+        guesses = self.history.heatmap("guesses", player=1, board_size=(10,10))
+        self.assertEqual(guesses.sum(), 3)
+
+    def test_heatmap_reads_one_row_per_cell(self):
+        game = play_game([(8,8), (0,2), (8,9), (0,0), (9,9)])
+        self.history.add_game(game)
+        rows = self.history.db.execute("SELECT COUNT(*) FROM cell_counts").fetchone()[0]
+        for _ in range(99):
+            self.history.add_game(game)
+        self.assertEqual(self.history.db.execute("SELECT COUNT(*) FROM cell_counts").fetchone()[0], rows)
+        self.assertEqual(self.history.heatmap("ships", board_size=(10,10)).sum(), 400)
+
+        plan = self.history.db.execute(
+            "EXPLAIN QUERY PLAN SELECT x, y, SUM(n) FROM cell_counts WHERE kind = ? AND player = ? GROUP BY x, y",
+            ("hits", 1),
+        ).fetchall()
+        self.assertIn("USING PRIMARY KEY", plan[0][3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from battleships import *
+from journal import *
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "game.journal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def new_game(self):
+        ships = [Ship([(0,0),(0,1)], 1), Ship([(8,9),(9,9)], 2)]
+        return Game((10,10), ships, journal=GameJournal(self.path))
+
+    def test_restore_game(self):
+        game = self.new_game()
+        game.make_guess((8, 8))
+        game.make_guess((0, 0))
+        game.make_guess((8, 9))
+        game.journal.close()
+
+        journal = GameJournal(self.path)
+        restored, moves = restore_game(journal)
+        self.assertEqual(moves, [
+            (1, (8, 8), GuessReturn.miss),
+            (2, (0, 0), GuessReturn.hit),
+            (1, (8, 9), GuessReturn.hit),
+        ])
+        self.assertEqual(restored.current_player(), 2)
+        self.assertEqual(restored.p2_board.guesses, {(8, 8), (8, 9)})
+        self.assertEqual(restored.p1_board.board[(0, 1)].lives, 1)
+
+        self.assertEqual(restored.make_guess((0, 1)), GuessReturn.finished_game)
+        journal.close()
+        self.assertIsNone(restore_game(GameJournal(self.path)))
+
+    def test_out_of_range_guess(self):
+        game = self.new_game()
+        self.assertEqual(game.make_guess((200, 3)), GuessReturn.out_of_bounds)
+        # beyond the int16 journal fields, so rejected before it is recorded
+        self.assertEqual(game.make_guess((-70000, 3)), GuessReturn.out_of_bounds)
+        game.make_guess((8, 8))
+        game.journal.close()
+
+        journal = GameJournal(self.path)
+        _, moves = restore_game(journal)
+        journal.close()
+        self.assertEqual(moves, [
+            (1, (200, 3), GuessReturn.out_of_bounds),
+            (1, (8, 8), GuessReturn.miss),
+        ])
+
+    def test_restore_from_snapshot(self):
+        ships = [Ship([(0,0),(0,1)], 1), Ship([(8,9),(9,9)], 2)]
+        game = Game((10,10), ships, journal=GameJournal(self.path, snapshot_every=2))
+        for guess in [(8, 8), (1, 1), (8, 9), (2, 2), (7, 7)]:
+            game.make_guess(guess)
+        game.journal.close()
+        _, records, _ = read_journal(self.path)
+        self.assertEqual(sum(kind == Record.snapshot for kind, _, _ in records), 2)
+
+        journal = GameJournal(self.path)
+        replayed = []
+        make_guess = Game.make_guess
+        with mock.patch.object(Game, "make_guess", lambda game, guess: replayed.append(guess) or make_guess(game, guess)):
+            restored, moves = restore_game(journal)
+        # only the guess after the last snapshot is replayed
+        self.assertEqual(replayed, [(7, 7)])
+        self.assertEqual(moves, game.moves)
+        self.assertEqual(restored.moves, game.moves)
+        self.assertEqual(restored.current_player(), 2)
+        self.assertEqual(restored.p2_board.guesses, {(8, 8), (8, 9), (7, 7)})
+        self.assertEqual(restored.p2_board.board[(9, 9)].lives, 1)
+        self.assertEqual(restored.make_guess((0, 0)), GuessReturn.hit)
+        journal.close()
+
+    def test_periodic_sync(self):
+        journal = GameJournal(self.path, fsync_every=100, fsync_interval=100)
+        Game((10,10), [Ship([(0,0),(0,1)], 1), Ship([(8,9),(9,9)], 2)], journal=journal).make_guess((8, 8))
+        self.assertGreater(journal.pending, 0)
+        journal.sync()
+        self.assertEqual(journal.pending, 0)
+        journal.close()
+
+    def test_archive(self):
+        archive = os.path.join(self.dir.name, "archive")
+        game = Game((10,10), [Ship([(0,0),(0,1)], 1), Ship([(8,9),(9,9)], 2)], journal=GameJournal(self.path, archive_dir=archive))
+        for guess in [(8, 9), (3, 3), (9, 9)]:
+            game.make_guess(guess)
+        archived = game.journal.finish()
+        self.assertEqual(os.path.dirname(archived), archive)
+        self.assertTrue(os.path.basename(archived).startswith("game-"))
+        self.assertFalse(os.path.exists(self.path))
+        _, records, _ = read_journal(archived)
+        self.assertEqual(records[-1][0], Record.result)
+
+    def test_torn_record(self):
+        game = self.new_game()
+        game.make_guess((8, 8))
+        game.journal.close()
+        with open(self.path, "ab") as f:
+            f.write(b"\x02\x03")
+
+        journal = GameJournal(self.path)
+        restored, moves = restore_game(journal)
+        self.assertEqual(len(moves), 1)
+        restored.make_guess((0, 0))
+        journal.close()
+        _, records, _ = read_journal(self.path)
+        self.assertEqual([kind for kind, _, _ in records], [
+            Record.fleet, Record.turn,
+            Record.guess, Record.result, Record.turn,
+            Record.guess, Record.result, Record.turn,
+        ])
+
+    def test_no_journal(self):
+        self.assertIsNone(restore_game(GameJournal(self.path)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+from metrics import *
+
+class TestMetrics(unittest.TestCase):
+    def test_disabled(self):
+        m = Metrics()
+        with m.span("capture"):
+            pass
+        m.count("frames")
+        self.assertEqual(m.summary(), {"stages": {}, "counters": {}})
+
+    def test_span(self):
+        m = Metrics()
+        m.enable()
+        for seconds in (0.001, 0.002, 0.003, 0.1):
+            m.observe("capture", seconds)
+        with m.span("make_guess"):
+            pass
+        m.count("frames", 3)
+        summary = m.summary()
+        capture = summary["stages"]["capture"]
+        self.assertEqual(capture["count"], 4)
+        self.assertEqual(capture["max"], 0.1)
+        self.assertTrue(0.002 <= capture["p50"] < 0.004)
+        self.assertTrue(capture["p99"] >= 0.1)
+        self.assertEqual(summary["stages"]["make_guess"]["count"], 1)
+        self.assertEqual(summary["counters"], {"frames": 3})
+
+    def test_exports(self):
+        m = Metrics()
+        m.enable()
+        m.observe("capture", 0.001)
+        m.count("frames")
+        text = m.prometheus()
+        self.assertIn('battleships_stage_seconds_count{stage="capture"} 1', text)
+        self.assertIn('battleships_stage_seconds_bucket{stage="capture",le="+Inf"} 1', text)
+        self.assertIn('battleships_events_total{event="frames"} 1', text)
+
+        m.serve(0)
+        port = m.server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            self.assertEqual(response.read().decode(), text)
+        m.server.shutdown()
+
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "metrics.json")
+            m.dump_json(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)["counters"], {"frames": 1})
+
+if __name__ == '__main__':
+    unittest.main()
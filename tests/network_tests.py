@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import unittest
+from battleships import *
+from network import *
+
+def serve_game(server, game):
+    """
+    Serves the guesses of the remote player like the game controller, passing the turns of the local player.
+    """
+    server.send_turn(game.current_player())
+    while True:
+        guess = server.poll_guess(timeout=1)
+        if guess is None:
+            return
+        player = game.current_player()
+        result = game.make_guess(guess)
+        server.send_result(player, guess, result)
+        if result in (GuessReturn.hit, GuessReturn.miss):
+            game.switch_turn()
+            server.send_turn(game.current_player())
+        if result == GuessReturn.finished_game:
+            return
+
+class TestRemotePlayer(unittest.TestCase):
+    def start_game(self):
+        server = RemotePlayerServer(1, host="127.0.0.1", port=0)
+        server.start()
+        game = Game((10,10), [Ship([(0,0),(0,1)], 1), Ship([(8,9),(9,9)], 2)])
+        thread = threading.Thread(target=serve_game, args=(server, game))
+        thread.start()
+        return server, thread
+
+    def test_loopback_game(self):
+        server, thread = self.start_game()
+
+        async def play():
+            client = RemotePlayerClient()
+            await client.connect("127.0.0.1", server.port)
+            self.assertEqual(client.player, 1)
+            self.assertEqual(await client.guess((8, 8)), GuessReturn.miss)
+            self.assertEqual(await client.guess((8, 8)), GuessReturn.dupe_guess)
+            self.assertEqual(await client.guess((300, 8)), GuessReturn.out_of_bounds)
+            with self.assertRaises(ValueError):
+                await client.guess((8, 99999))
+            self.assertEqual(await client.guess((8, 9)), GuessReturn.hit)
+            self.assertEqual(await client.guess((9, 9)), GuessReturn.finished_game)
+            self.assertEqual(client.turn, 1)
+            self.assertEqual(client.results[0], (1, (8, 8), GuessReturn.miss))
+            self.assertEqual(client.connection.gaps, 0)
+            await client.close()
+            return client.latencies
+
+        latencies = asyncio.run(play())
+        thread.join()
+        # a local guess the game rejected is not sent
+        server.send_result(2, (-70000, 3), GuessReturn.out_of_bounds)
+        server.close()
+        self.assertEqual(len(latencies), 5)
+
+    def test_concurrent_games(self):
+        games = [self.start_game() for _ in range(20)]
+
+        async def play(server):
+            client = RemotePlayerClient()
+            await client.connect("127.0.0.1", server.port)
+            for guess in [(8, 8), (8, 9), (9, 9)]:
+                await client.guess(guess)
+            await client.close()
+            return max(client.latencies)
+
+        async def play_all():
+            return await asyncio.gather(*(play(server) for server, _ in games))
+
+        latencies = asyncio.run(play_all())
+        for server, thread in games:
+            thread.join()
+            server.close()
+        self.assertLess(max(latencies), 1 / 60)
+
+if __name__ == '__main__':
+    unittest.main()
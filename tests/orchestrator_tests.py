@@ -0,0 +1,93 @@
+import asyncio
+import contextlib
+import io
+import unittest
+import numpy as np
+import pyglet
+pyglet.options['headless'] = True
+from camera import CaptureError
+from events import DEBUG, events
+from game_controller import GameController
+from orchestrator import *
+from shift_valves import Table
+from synthetic import *
+from ui import Interface
+
+class UnpluggedCamera(SyntheticCamera):
+    def __init__(self, frames, error):
+        super().__init__(frames, fps=30)
+        self.error = error
+
+    def get_image(self):
+        raise self.error
+
+class EventSink:
+    level = DEBUG
+
+    def __init__(self):
+        self.events = []
+
+    def write(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class TestOrchestrator(unittest.TestCase):
+    def setUp(self):
+        self.fleet = random_fleet(np.random.default_rng(5))
+        self.sink = EventSink()
+        events.add_sink(self.sink)
+
+    def tearDown(self):
+        events.remove_sink(self.sink)
+
+    def session(self, name, camera):
+        controller = GameController(camera, False, table=Table("loop://"))
+        return TableSession(name, controller, Interface())
+
+    def kinds(self):
+        return [event.kind for event in self.sink.events]
+
+    def test_failed_table_does_not_stop_others(self):
+        camera = SyntheticCamera(SyntheticFrames(self.fleet), fps=30)
+        camera.set_dial(1, None, False)
+        camera.set_dial(2, None, False)
+        working = self.session("Table 0", camera)
+        failing = self.session("Table 1", UnpluggedCamera(SyntheticFrames(self.fleet), CaptureError("Could not capture image")))
+
+        async def play():
+            games = asyncio.create_task(Orchestrator(workers=2).play([working, failing]))
+            controller = working.controller
+            while controller.game is None:
+                self.assertFalse(games.done())
+                await asyncio.sleep(0.01)
+            camera.set_dial(1, (9, 3))
+            while not controller.game.moves:
+                self.assertFalse(games.done())
+                await asyncio.sleep(0.01)
+            games.cancel()
+            return controller.game.moves
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            moves = asyncio.run(asyncio.wait_for(play(), 30))
+            events.drain()
+        self.assertEqual(moves[0][1], (9, 3))
+        self.assertIsNone(failing.controller.game)
+        self.assertIn("table_stopped", self.kinds())
+        self.assertNotIn("table_failed", self.kinds())
+
+    def test_bug_is_raised(self):
+        failing = self.session("Table 0", UnpluggedCamera(SyntheticFrames(self.fleet), ZeroDivisionError()))
+        with contextlib.redirect_stdout(io.StringIO()):
+            with self.assertRaises(ZeroDivisionError):
+                asyncio.run(Orchestrator(workers=1).play([failing]))
+            events.drain()
+        failed = next(event for event in self.sink.events if event.kind == "table_failed")
+        self.assertIn("ZeroDivisionError", failed.fields["traceback"])
+
+if __name__ == '__main__':
+    unittest.main()
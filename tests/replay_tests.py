@@ -0,0 +1,90 @@
+import os
+import time
+import tempfile
+import unittest
+from battleships import *
+from journal import *
+from replay import *
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "game.journal")
+        ships = [Ship([(0,0),(0,1),(0,2)], 1), Ship([(8,9),(9,9)], 2)]
+        game = Game((10,10), ships, journal=GameJournal(self.path, snapshot_every=2))
+        for guess in [(8,8), (0,0), (8,9), (0,1), (8,9), (9,9)]:
+            game.make_guess(guess)
+        game.journal.close()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_replay(self):
+        replay = Replay(self.path, speed=None)
+        self.assertEqual(len(replay.moves), 6)
+        self.assertEqual(sorted(replay.snapshots), [2, 4, 6])
+        replay.run()
+        self.assertEqual(replay.divergences, [])
+        self.assertEqual(replay.game.p2_board.guesses, {(8,8), (8,9), (9,9)})
+        self.assertEqual(len(replay.game.p2_board.dead_ships), 1)
+
+    def test_seek(self):
+        replay = Replay(self.path, speed=None)
+        for position in range(7):
+            replay.seek(position)
+            full = Replay(self.path, speed=None)
+            full.snapshots.clear()
+            full.seek(position)
+            self.assertEqual(replay.position, position)
+            self.assertEqual(replay.game.current_player(), full.game.current_player())
+            for board, full_board in ((replay.game.p1_board, full.game.p1_board), (replay.game.p2_board, full.game.p2_board)):
+                self.assertEqual(board.guesses, full_board.guesses)
+                self.assertEqual([ship.lives for ship in board.ships], [ship.lives for ship in full_board.ships])
+
+    def test_seek_then_run(self):
+        replay = Replay(self.path, speed=None)
+        replay.seek(3)
+        replay.run()
+        self.assertEqual(replay.divergences, [])
+        self.assertEqual(replay.position, 6)
+
+    def test_valves_do_not_block(self):
+        table = Table("loop://")
+        replay = Replay(self.path, table=table, speed=1000)
+        replay.seek(2)
+        self.assertFalse(replay.valves.closing)
+        began = time.perf_counter()
+        replay.run()
+        # the valves of the last guesses stay open for their burst
+        self.assertLess(time.perf_counter() - began, 1.5)
+        self.assertFalse(replay.valves.closing)
+        self.assertFalse(replay.valves.open.any())
+        table.close()
+
+    def test_window_responsive_while_waiting(self):
+        class CountingInterface:
+            frames = 0
+
+            def next_frame(self):
+                self.frames += 1
+                return False
+
+            def hit(self, coord):
+                pass
+
+            def miss(self, coord):
+                pass
+
+            def reset(self):
+                pass
+
+        interface = CountingInterface()
+        replay = Replay(self.path, interface, speed=1)
+        t_ms, player, guess, result = replay.moves[1]
+        replay.moves[1] = (replay.moves[0][0] + 200, player, guess, result)
+        replay.run(until=2)
+        # the window handles its events throughout the gap between the guesses
+        self.assertGreater(interface.frames, 10)
+
+if __name__ == '__main__':
+    unittest.main()
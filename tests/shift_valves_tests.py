@@ -0,0 +1,90 @@
+import contextlib
+import io
+import threading
+import time
+import unittest
+import serial
+from shift_valves import *
+
+class BrokenLink:
+    def write(self, data):
+        raise serial.SerialException("device reports readiness to read but returned no data")
+
+    def close(self):
+        pass
+
+class TestTable(unittest.TestCase):
+    def setUp(self):
+        self.table = Table("loop://", retry_interval=0.01)
+
+    def tearDown(self):
+        self.table.close()
+
+    def read(self, link, size):
+        link.timeout = 1
+        return link.read(size)
+
+    def wait_reconnected(self):
+        deadline = time.monotonic() + 2
+        while self.table.serial is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNotNone(self.table.serial)
+
+    def test_init_frame(self):
+        frame = self.table.init_frame()
+        self.assertEqual(self.read(self.table.serial, len(frame)), frame)
+        self.table.set((0, 0), 1)
+        self.assertEqual(self.read(self.table.serial, len(self.table.level.shift_str())), self.table.level.shift_str())
+
+    def test_reconnect_restores_valves(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.table.serial = BrokenLink()
+            self.table.set((0, 0), 1)
+            # the valves still change while the link is down
+            self.table.set((13, 11), 1)
+            self.wait_reconnected()
+            self.assertNotIsInstance(self.table.serial, BrokenLink)
+            expected = self.table.init_frame() + self.table.level.shift_str()
+            self.assertEqual(self.read(self.table.serial, len(expected)), expected)
+            events.drain()
+        self.assertTrue(self.table.level.coord_to_board[(0, 0)].bits.any())
+        self.assertEqual(self.table.port, "loop://")
+
+    def test_write_while_down(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.table.close()
+            self.assertFalse(self.table.write(b"\x00"))
+            events.drain()
+
+    def test_write_does_not_block_the_loop(self):
+        self.assertLessEqual(self.table.serial.write_timeout, 0.01)
+
+    def test_level_changes_wait_for_restore(self):
+        held, release = threading.Event(), threading.Event()
+
+        def restore():
+            # like the reconnect thread sending the Level
+            with self.table.lock:
+                held.set()
+                release.wait(2)
+
+        thread = threading.Thread(target=restore)
+        thread.start()
+        held.wait(2)
+        setter = threading.Thread(target=self.table.set, args=((0, 0), 1))
+        setter.start()
+        setter.join(0.05)
+        self.assertFalse(self.table.level.coord_to_board[(0, 0)].bits.any())
+        release.set()
+        setter.join(2)
+        thread.join(2)
+        self.assertTrue(self.table.level.coord_to_board[(0, 0)].bits.any())
+
+class TestArduinoPorts(unittest.TestCase):
+    def test_ports_configured_first(self):
+        table = Table("loop://")
+        self.assertEqual(table.ports()[0], "loop://")
+        table.close()
+
+if __name__ == '__main__':
+    unittest.main()
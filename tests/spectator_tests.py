@@ -0,0 +1,124 @@
+import asyncio
+import json
+import unittest
+from battleships import GuessReturn
+from events import EventBus
+from spectator import *
+
+async def request(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    return reader, writer
+
+async def read_headers(reader):
+    lines = []
+    while (line := await reader.readline()) != b"\r\n":
+        lines.append(line)
+    return lines
+
+async def read_message(reader):
+    data = None
+    while (line := await asyncio.wait_for(reader.readline(), 2)) != b"\n":
+        if line.startswith(b"data: "):
+            data = json.loads(line[6:])
+    return data
+
+def ui_cell(coord):
+    board, (x, y) = TABLE.to_ui(coord)
+    return board, x, y
+
+class TestSpectatorServer(unittest.TestCase):
+    def setUp(self):
+        self.server = SpectatorServer(host="127.0.0.1", port=0)
+        self.server.start()
+        self.bus = EventBus()
+        self.bus.remove_sink(self.bus.sinks[0])
+        self.bus.add_sink(self.server)
+
+    def tearDown(self):
+        self.bus.close()
+        self.server.close()
+
+    def test_page(self):
+        async def get():
+            reader, writer = await request(self.server.port, "/")
+            body = await reader.read()
+            writer.close()
+            return body
+        body = asyncio.run(get())
+        self.assertTrue(body.startswith(b"HTTP/1.1 200 OK"))
+        self.assertIn(b"EventSource", body)
+
+    def test_diffs(self):
+        async def watch():
+            reader, writer = await request(self.server.port, "/events")
+            headers = await read_headers(reader)
+            self.assertIn(b"Content-Type: text/event-stream\r\n", headers)
+            snapshot = await read_message(reader)
+            self.assertTrue(snapshot["snapshot"])
+            self.assertEqual(snapshot["cells"], [])
+
+            self.bus.info("Guess at (9, 3): miss", "result", player=1, guess=(9, 3), result=GuessReturn.miss)
+            self.bus.info("Player 2's turn", "turn", player=2)
+            self.bus.drain()
+            diff = await read_message(reader)
+            board, cell = TABLE.to_ui((9, 3))
+            self.assertEqual(diff["cells"], [[board, *cell, "miss"]])
+            self.assertEqual(diff["status"], "Player 2's turn")
+            self.assertEqual(diff["guesses"], [{"player": 1, "guess": [9, 3], "result": "miss"}])
+            self.assertNotIn("snapshot", diff)
+
+            # a spectator connecting later gets the whole state
+            late_reader, late_writer = await request(self.server.port, "/events")
+            await read_headers(late_reader)
+            snapshot = await read_message(late_reader)
+            self.assertEqual(snapshot["cells"], [[board, *cell, "miss"]])
+            self.assertEqual(snapshot["status"], "Player 2's turn")
+            writer.close()
+            late_writer.close()
+        asyncio.run(watch())
+
+    def test_sunk_ship(self):
+        self.bus.info("A ship has been sunk", "ship_sunk", coord=(1, 0), sections=[(0, 0), (1, 0)])
+        self.bus.info("Guess at (1, 0): hit", "result", player=2, guess=(1, 0), result=GuessReturn.hit)
+        self.bus.drain()
+
+        async def state():
+            reader, writer = await request(self.server.port, "/state")
+            body = await reader.read()
+            writer.close()
+            return json.loads(body.split(b"\r\n\r\n", 1)[1])
+        snapshot = asyncio.run(state())
+        self.assertEqual(sorted(mark for *_, mark in snapshot["cells"]), ["sunk", "sunk"])
+        self.assertEqual(snapshot["status"], "A ship has been sunk")
+
+    def test_resumed_game(self):
+        self.bus.info("Guess at (5, 5): miss", "result", player=1, guess=(5, 5), result=GuessReturn.miss)
+        self.bus.drain()
+        moves = [
+            (1, (9, 3), GuessReturn.miss),
+            (2, (0, 0), GuessReturn.hit),
+            (1, (9, 3), GuessReturn.dupe_guess),
+            (1, (1, 0), GuessReturn.hit),
+        ]
+        self.bus.info(
+            "Resumed game from journal after 4 guesses", "resumed",
+            guesses=4, moves=moves, sunk=[[(0, 0), (1, 0)]],
+        )
+        self.bus.drain()
+
+        async def watch():
+            reader, writer = await request(self.server.port, "/events")
+            await read_headers(reader)
+            snapshot = await read_message(reader)
+            writer.close()
+            return snapshot
+        snapshot = asyncio.run(watch())
+        self.assertTrue(snapshot["snapshot"])
+        cells = {(board, x, y): mark for board, x, y, mark in snapshot["cells"]}
+        self.assertEqual(cells, {ui_cell((9, 3)): "miss", ui_cell((0, 0)): "sunk", ui_cell((1, 0)): "sunk"})
+        self.assertEqual([guess["guess"] for guess in snapshot["guesses"]], [[9, 3], [0, 0], [1, 0]])
+        self.assertEqual(snapshot["status"], "Resumed game from journal after 4 guesses")
+
+if __name__ == '__main__':
+    unittest.main()
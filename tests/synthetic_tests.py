@@ -0,0 +1,103 @@
+import time
+import unittest
+import cv2
+import numpy as np
+from camera import MarkerTracker
+from synthetic import *
+
+class TestSyntheticFrames(unittest.TestCase):
+    def setUp(self):
+        self.fleet = random_fleet(np.random.default_rng(3))
+        self.frames = SyntheticFrames(self.fleet, perspective=0.01, noise=2, blur=3, lighting=0.2, seed=3)
+        self.camera = SyntheticCamera(self.frames, fps=None)
+
+    def test_fleet(self):
+        ships = fleet_ships(self.fleet)
+        self.assertEqual(len(ships), 8)
+        self.assertEqual(sorted(len(ship.filled) for ship in ships), [2, 2, 3, 3, 4, 4, 5, 5])
+        coords = [coord for coords in self.fleet.values() for coord in coords]
+        self.assertEqual(len(set(coords)), len(coords))
+
+    def test_pegs_and_holes(self):
+        img = self.camera.get_image()
+        holes = self.camera.detect_holes(img)
+        colors = self.camera.detect_colors(img, show_img=False)
+        self.assertEqual({color: len(coords) for color, coords in colors.items()},
+                         {color: len(coords) for color, coords in self.fleet.items()})
+        self.assertEqual(len(holes), 14 * 12 - 28)
+
+    def test_frame_analysis(self):
+        frame = self.camera.capture()
+        self.assertEqual(frame.seq, 1)
+        self.assertIs(frame.markers(), frame.markers())
+        self.assertIs(frame.colors(), frame.colors())
+        # color detection must leave the pixels for hole detection untouched
+        self.assertEqual(len(frame.holes()), 14 * 12 - 28)
+        self.assertEqual(self.camera.capture().seq, 2)
+
+    def test_dials(self):
+        self.camera.set_dial(1, (9, 3))
+        self.assertEqual(sorted(self.camera.get_ids_of_detected_arucos(self.camera.get_image())),
+                         [14, 20, 30, 37, 100])
+        self.camera.set_dial(1, (9, 3), confirmed=False)
+        self.camera.set_dial(2, (2, 5), confirmed=True)
+        self.assertEqual(sorted(self.camera.get_ids_of_detected_arucos(self.camera.get_image())),
+                         [14, 20, 32, 43, 101])
+        with self.assertRaises(ValueError):
+            self.camera.set_dial(1, (0, 0))
+            self.camera.get_image()
+
+    def test_marker_tracking(self):
+        frames = SyntheticFrames(self.fleet, noise=2, blur=3, lighting=0.2, seed=3)
+        tracker = MarkerTracker(frames.dictionary, refresh=5)
+        full = []
+        tracker.detect_all = lambda image, detect_all=tracker.detect_all: full.append(1) or detect_all(image)
+        for dials, ids in (
+            ({1: ((9, 3), True)}, [14, 20, 30, 37, 100]),
+            ({1: ((9, 4), True)}, [14, 21, 30, 37, 100]),
+            ({1: ((10, 4), True)}, [13, 21, 30, 37, 100]),
+            ({1: ((10, 4), False)}, [13, 21, 30, 37]),
+            ({1: ((10, 4), True)}, [13, 21, 30, 37, 100]),
+            ({1: ((10, 4), True), 2: ((2, 5), False)}, [13, 21, 32, 43, 100]),
+        ):
+            self.assertEqual(sorted(tracker.detect(frames.render(dials))), ids)
+        # the first frame, and the frame the confirm marker disappeared on
+        self.assertEqual(len(full), 2)
+
+    def test_pyramid_detection(self):
+        frames = SyntheticFrames(self.fleet, noise=2, blur=3, lighting=0.2, perspective=0.01, seed=3)
+        image = frames.render({1: ((9, 3), True), 2: ((2, 5), True)})
+        full = MarkerTracker(frames.dictionary, pyramid=False).detect_all(image)
+        tracker = MarkerTracker(frames.dictionary)
+        self.assertEqual(tracker.detect_all(image).keys(), full.keys())
+        # the markers are about 80 pixels wide on the synthetic frames
+        self.assertEqual(tracker.scale, 4)
+        markers = tracker.detect_all(image)
+        self.assertEqual(sorted(markers), sorted(full))
+        for id, corners in markers.items():
+            self.assertLess(np.abs(corners - full[id]).max(), 2)
+        self.assertEqual(tracker.detect_all(np.full_like(image, 255)), {})
+
+    def test_capture_time(self):
+        class BufferedCapture:
+            def __init__(self, stamp):
+                self.stamp = stamp
+
+            def get(self, prop):
+                return self.stamp if prop == cv2.CAP_PROP_POS_MSEC else 0
+
+        # V4L2 stamps the buffers with the monotonic clock when the frame was captured
+        self.camera.cam = BufferedCapture((time.monotonic() - 0.2) * 1000)
+        self.assertAlmostEqual(self.camera.capture_time(0.0), time.perf_counter() - 0.2, delta=0.05)
+        # positions of other backends are not capture times
+        for stamp in (0, 5000, (time.monotonic() + 10) * 1000):
+            self.camera.cam = BufferedCapture(stamp)
+            self.assertEqual(self.camera.capture_time(1.5), 1.5)
+
+        before = time.perf_counter()
+        frame = self.camera.capture()
+        self.assertLessEqual(before, frame.captured)
+        self.assertEqual(frame.captured, self.camera.captured)
+
+if __name__ == '__main__':
+    unittest.main()
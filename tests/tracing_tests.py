@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+from tracing import *
+
+class TestTracer(unittest.TestCase):
+    def test_disabled(self):
+        tracer = Tracer()
+        self.assertIsNone(tracer.start(1, (0, 0), 0.0))
+
+    def test_summary_and_file(self):
+        with tempfile.TemporaryDirectory() as dir:
+            path = os.path.join(dir, "traces.jsonl")
+            tracer = Tracer(size=4)
+            tracer.enable(path)
+            for i in range(1, 11):
+                trace = tracer.start(1, (i, 0), 100.0)
+                trace.hop("make_guess", 100.0 + i / 1000)
+                trace.hop("ui", 100.0 + i / 100)
+                tracer.finish(trace)
+            tracer.close()
+
+            self.assertEqual(len(tracer.traces), 4)
+            self.assertEqual([trace.id for trace in tracer.traces], [7, 8, 9, 10])
+            summary = tracer.summary()
+            self.assertEqual(summary["capture"]["p50"], 0.0)
+            self.assertAlmostEqual(summary["make_guess"]["p50"], 0.0085)
+
+            latencies = read_traces(path)
+            self.assertEqual(len(latencies), 10)
+            summary = summarize(latencies)
+            self.assertEqual(summary["ui"]["count"], 10)
+            self.assertAlmostEqual(summary["ui"]["p50"], 0.055)
+            self.assertAlmostEqual(summary["ui"]["p99"], 0.0991)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+import pyglet
+pyglet.options['headless'] = True
+from ui import *
+
+class TestInterface(unittest.TestCase):
+    def setUp(self):
+        self.interface = Interface()
+        self.interface.next_frame()
+
+    def tearDown(self):
+        self.interface.close()
+
+    def assertDirty(self, dirty):
+        self.assertEqual(self.interface.dirty, dirty)
+        self.interface.dirty = False
+
+    def test_markers_dirty_only_on_change(self):
+        interface = self.interface
+        self.assertDirty(False)
+        interface.hit((0, 0))
+        self.assertDirty(True)
+        board, cell = TABLE.to_ui((0, 0))
+        self.assertTrue(interface.boards[board].hits[cell].visible)
+        interface.hit((0, 0))
+        self.assertDirty(False)
+        interface.miss((13, 5))
+        self.assertDirty(True)
+        interface.miss((13, 5))
+        self.assertDirty(False)
+
+        interface.show_pegs({"blue": [(2, 3), (2, 4)]})
+        self.assertDirty(True)
+        interface.show_pegs({"blue": [(2, 3), (2, 4)]})
+        self.assertDirty(False)
+        interface.show_pegs({"red": [(2, 3), (2, 4)]})
+        self.assertDirty(True)
+        interface.show_pegs({})
+        self.assertDirty(True)
+        interface.show_pegs({})
+        self.assertDirty(False)
+
+    def test_next_frame_draws_only_when_dirty(self):
+        interface = self.interface
+        self.assertFalse(interface.next_frame())
+        interface.handle_game_status(GameStatus.await_player2_guess)
+        self.assertTrue(interface.next_frame())
+        self.assertFalse(interface.next_frame())
+        interface.hit((0, 0))
+        self.assertTrue(interface.next_frame())
+        self.assertFalse(interface.dirty)
+        self.assertFalse(interface.next_frame())
+
+    def test_preview(self):
+        interface = Interface(preview=True)
+        interface.next_frame()
+        preview = interface.preview
+        self.assertFalse(interface.next_frame())
+
+        frame = np.zeros((120, 160, 3), dtype=np.uint8)
+        corners = np.array([[[0, 0], [10, 0], [10, 10], [0, 10]]], dtype=np.float32)
+        preview.show(frame, {1: corners}, {"blue": [(50, 60)]})
+        self.assertTrue(interface.next_frame())
+        self.assertEqual((preview.texture.width, preview.texture.height), (160, 120))
+        self.assertEqual(sum(dot.visible for dot in preview.marker_dots), 4)
+        self.assertEqual(sum(dot.visible for dot in preview.peg_dots), 1)
+
+        # a frame shown before the panel is due waits for it
+        texture = preview.texture
+        preview.show(frame, {}, {})
+        self.assertFalse(interface.next_frame())
+        preview.last_upload -= preview.interval
+        self.assertTrue(interface.next_frame())
+        self.assertIs(preview.texture, texture)
+        self.assertFalse(any(dot.visible for dot in (*preview.marker_dots, *preview.peg_dots)))
+        interface.close()
+
+if __name__ == '__main__':
+    unittest.main()
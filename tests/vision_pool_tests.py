@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+import numpy as np
+from synthetic import *
+from vision_pool import *
+
+class TestVisionPool(unittest.TestCase):
+    def setUp(self):
+        self.fleet = random_fleet(np.random.default_rng(7))
+        self.camera = SyntheticCamera(SyntheticFrames(self.fleet, noise=2, blur=3, seed=1), fps=None)
+
+    def run_pool(self, workers, frames, detections=DETECTIONS):
+        async def run():
+            pool = VisionPool(workers)
+            try:
+                submitted = [frame for frame in frames if pool.submit(frame, detections)]
+                results = []
+                async for frame in pool.results():
+                    results.append(frame)
+                    if len(results) == len(submitted):
+                        return submitted, results
+            finally:
+                pool.close()
+        return asyncio.run(run())
+
+    def test_detections(self):
+        frames = [self.camera.capture() for _ in range(2)]
+        submitted, results = self.run_pool(2, frames)
+        self.assertEqual(len(submitted), 2)
+        self.assertEqual([frame.seq for frame in results], [1, 2])
+        # the detections of the workers are the ones the frame would have run itself
+        expected = FrameAnalysis(self.camera, frames[0].image, 0)
+        self.assertEqual(results[0].holes(), expected.holes())
+        self.assertEqual(results[0].colors(), expected.colors())
+        self.assertEqual(self.camera.pegs, expected.colors())
+        self.assertEqual(results[0].board_pegs((14, 12)).keys(), self.fleet.keys())
+
+    def test_skip_and_order(self):
+        frames = [self.camera.capture() for _ in range(3)]
+        # the frame without detections queues behind the one still detected, and the busy worker skips the last one
+        async def run():
+            pool = VisionPool(1)
+            try:
+                self.assertTrue(pool.submit(frames[0]))
+                self.assertTrue(pool.submit(frames[1], ()))
+                self.assertFalse(pool.submit(frames[2]))
+                results = []
+                async for frame in pool.results():
+                    results.append(frame.seq)
+                    if len(results) == 2:
+                        return results
+            finally:
+                pool.close()
+        self.assertEqual(asyncio.run(run()), [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import argparse
+import atexit
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class Trace:
+    """
+    Timestamps of one guess on its way from the camera frame to the valves and the UI.
+
+    Every hop is stored as a time.perf_counter() timestamp, the first one being the capture of the frame.
+    """
+
+    __slots__ = ("id", "player", "guess", "result", "hops")
+
+    def __init__(self, id: int, player: int, guess: tuple[int, int], captured: float) -> None:
+        self.id = id
+        self.player = player
+        self.guess = guess
+        self.result: str | None = None
+        self.hops: dict[str, float] = {"capture": captured}
+
+    def hop(self, name: str, at: float | None = None):
+        self.hops[name] = time.perf_counter() if at is None else at
+
+    def latencies(self) -> dict[str, float]:
+        """
+        Returns the time in seconds from the capture of the frame to every hop.
+        """
+        captured = self.hops["capture"]
+        return {name: at - captured for name, at in self.hops.items()}
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "player": self.player,
+            "guess": list(self.guess),
+            "result": self.result,
+            "latencies_ms": {name: round(s * 1000, 3) for name, s in self.latencies().items()},
+        }
+
+
+class Tracer:
+    """
+    Keeps the traces of the latest guesses in a ring buffer and appends them to a JSON lines file.
+
+    While disabled, start returns None and no trace is kept.
+    """
+
+    def __init__(self, size: int = 1024) -> None:
+        self.enabled = False
+        self.traces: deque[Trace] = deque(maxlen=size)
+        self.ids = itertools.count(1)
+        self.file = None
+        self.lock = threading.Lock()
+
+    def enable(self, path: str | None = None):
+        """
+        Starts tracing. If path is given, every finished trace is appended to it.
+        """
+        self.enabled = True
+        if path is not None:
+            self.file = open(path, "a", buffering=1)
+            atexit.register(self.close)
+
+    def start(self, player: int, guess: tuple[int, int], captured: float) -> Trace | None:
+        """
+        Starts the trace of a guess seen on a frame captured at the given time.
+        """
+        if not self.enabled:
+            return None
+        return Trace(next(self.ids), player, guess, captured)
+
+    def finish(self, trace: Trace):
+        with self.lock:
+            self.traces.append(trace)
+            if self.file is not None:
+                self.file.write(json.dumps(trace.to_json()) + "\n")
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        Returns count, p50 and p99 in seconds from the capture of the frame to every hop.
+        """
+        with self.lock:
+            traces = list(self.traces)
+        return summarize([trace.latencies() for trace in traces])
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def summarize(latencies: list[dict[str, float]]) -> dict[str, dict[str, float]]:
+    """
+    Returns count, p50 and p99 per hop of the given latencies.
+    """
+    per_hop: dict[str, list[float]] = {}
+    for trace in latencies:
+        for name, seconds in trace.items():
+            per_hop.setdefault(name, []).append(seconds)
+    return {
+        name: {
+            "count": len(values),
+            "p50": float(np.percentile(values, 50)),
+            "p99": float(np.percentile(values, 99)),
+        }
+        for name, values in per_hop.items()
+    }
+
+
+def read_traces(path: str) -> list[dict[str, float]]:
+    """
+    Reads the latencies in seconds of the traces in a JSON lines file.
+    """
+    latencies = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                trace = json.loads(line)
+                latencies.append({name: ms / 1000 for name, ms in trace["latencies_ms"].items()})
+    return latencies
+
+
+tracer = Tracer()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('traces', nargs='+', help='Trace files written by main.py -trace')
+    args = parser.parse_args()
+
+    latencies = [trace for path in args.traces for trace in read_traces(path)]
+    for name, stats in summarize(latencies).items():
+        print(f"{name}: n={stats['count']} p50={stats['p50'] * 1000:.1f}ms p99={stats['p99'] * 1000:.1f}ms")
@@ -2,8 +2,24 @@ import time
 from enum import Enum, auto
 from random import randint
 
+import numpy as np
 import pyglet
-from pyglet import image, shapes, sprite, text
+from pyglet import gl, graphics, image, shapes, sprite, text
+
+from geometry import TABLE
+from metrics import metrics
+
+BACKGROUND = graphics.Group(order=0)
+FOREGROUND = graphics.Group(order=1)
+MARKERS = graphics.Group(order=2)
+OVERLAY = graphics.Group(order=3)
+
+PEG_COLORS = {
+    "blue": (20, 20, 255, 255),
+    "magenta": (252, 0, 236, 255),
+    "green": (20, 255, 20, 255),
+    "red": (255, 20, 20, 255),
+}
 
 
 class GameStatus(Enum):
@@ -23,19 +39,27 @@ class GameStatus(Enum):
 
 
 class InterfaceBoard:
+    """
+    The board of one player, drawn as part of the batch of the Interface.
+
+    Hit and miss markers are created for every cell up front and only made visible when guessed.
+    The pegs placed on the table while the ships are set up are shown the same way.
+    """
+
     def __init__(
         self,
         corner: tuple[int, int],
         size: tuple[int, int],
         dim: tuple[int, int],
         player_num: int,
+        batch: graphics.Batch,
     ) -> None:
         x_size, y_size = size
         width, height = dim
 
         board_corner_x, board_corner_y = corner
         self.board = shapes.BorderedRectangle(
-            board_corner_x, board_corner_y, width, height
+            board_corner_x, board_corner_y, width, height, batch=batch, group=BACKGROUND
         )
         self.xnumbers = [
             text.Label(
@@ -43,8 +67,10 @@ class InterfaceBoard:
                 board_corner_x + idx * 45 + 40,
                 board_corner_y + 20,
                 color=(0, 0, 0, 255),
+                batch=batch,
+                group=FOREGROUND,
             )
-            for idx, x in enumerate(range(12))
+            for idx, x in enumerate(range(x_size))
         ]
         self.xnumbers.append(
             text.Label(
@@ -52,6 +78,8 @@ class InterfaceBoard:
                 board_corner_x + x_size * 45 + 40,
                 board_corner_y + 20,
                 color=(0, 0, 0, 255),
+                batch=batch,
+                group=FOREGROUND,
             )
         )
         self.ynumbers = [
@@ -60,6 +88,8 @@ class InterfaceBoard:
                 board_corner_x + 20,
                 board_corner_y + y * 45 + 60,
                 color=(0, 0, 0, 255),
+                batch=batch,
+                group=FOREGROUND,
             )
             for y in range(y_size)
         ]
@@ -69,6 +99,8 @@ class InterfaceBoard:
                 board_corner_x + 20,
                 board_corner_y + y_size * 45 + 40,
                 color=(0, 0, 0, 255),
+                batch=batch,
+                group=FOREGROUND,
             )
         )
         self.board_coordinate_to_dot = {
@@ -77,6 +109,8 @@ class InterfaceBoard:
                 board_corner_y + y * 45 + 60 + 5,
                 2,
                 color=(0, 0, 0, 255),
+                batch=batch,
+                group=FOREGROUND,
             )
             for x in range(x_size)
             for y in range(y_size)
@@ -88,66 +122,193 @@ class InterfaceBoard:
             100,
             color=(255, 255, 255, 255),
             font_size=40,
+            batch=batch,
+            group=FOREGROUND,
         )
 
-        self.misses: list[shapes.ShapeBase] = []
-        self.hits: list[text.DocumentLabel] = []
+        self.misses: dict[tuple[int, int], shapes.Circle] = {}
+        self.hits: dict[tuple[int, int], text.Label] = {}
+        self.pegs: dict[tuple[int, int], shapes.Circle] = {}
+        for coord, node in self.board_coordinate_to_dot.items():
+            self.pegs[coord] = shapes.Circle(node.x, node.y, 10, batch=batch, group=MARKERS)
+            self.misses[coord] = shapes.Circle(
+                node.x, node.y, 5, color=(20, 20, 255, 255), batch=batch, group=MARKERS
+            )
+            self.hits[coord] = text.Label(
+                "X",
+                node.x - 1,
+                node.y + 5,
+                anchor_x="center",
+                anchor_y="center",
+                font_size=20,
+                color=(255, 20, 20, 255),
+                batch=batch,
+                group=MARKERS,
+            )
+        self.reset()
 
-    def miss(self, coord: tuple[int, int]):
+    def miss(self, coord: tuple[int, int]) -> bool:
         """
         Draw miss on board.
 
         Note that coord is in coordinates the player gives as guess (12x7).
+
+        Returns True if the board changed.
         """
-        miss_node = self.board_coordinate_to_dot[coord]
-        self.misses.append(
-            shapes.Circle(miss_node.x, miss_node.y, 5, color=(20, 20, 255, 255))
-        )
+        changed = not self.misses[coord].visible
+        self.misses[coord].visible = True
+        return changed
 
-    def hit(self, coord: tuple[int, int]):
+    def hit(self, coord: tuple[int, int]) -> bool:
         """
         Draw hit on board.
 
         Note that coord is in coordinates the player gives as guess (12x7).
+
+        Returns True if the board changed.
         """
-        hit_node = self.board_coordinate_to_dot[coord]
-        self.hits.append(
-            text.Label(
-                "X",
-                hit_node.x - 1,
-                hit_node.y + 5,
-                anchor_x="center",
-                anchor_y="center",
-                font_size=20,
-                color=(255, 20, 20, 255),
-            )
-        )
+        changed = not self.hits[coord].visible
+        self.hits[coord].visible = True
+        return changed
+
+    def peg(self, coord: tuple[int, int], color: str | None) -> bool:
+        """
+        Shows a peg of the color on the board, or removes it if color is None.
+
+        Returns True if the board changed.
+        """
+        peg = self.pegs[coord]
+        if color is None:
+            changed = peg.visible
+            peg.visible = False
+            return changed
+        changed = not peg.visible or tuple(peg.color) != PEG_COLORS[color]
+        peg.visible = True
+        peg.color = PEG_COLORS[color]
+        return changed
+
+    def reset(self):
+        """
+        Removes all hits, misses and pegs from the board.
+        """
+        for marker in (*self.misses.values(), *self.hits.values(), *self.pegs.values()):
+            marker.visible = False
+
+
+class CameraPreview:
+    """
+    Panel showing the latest camera frame with the detected markers and pegs on top.
+
+    Frames are uploaded straight from the NumPy buffer into one reused texture,
+    at most fps times per second, when the Interface draws a frame.
+    """
 
-    def figures(self):
-        return [
-            self.board,
-            self.player_num,
-            *self.xnumbers,
-            *self.ynumbers,
-            *self.board_coordinate_to_dot.values(),
-            *self.misses,
-            *self.hits,
+    def __init__(
+        self,
+        corner: tuple[int, int],
+        dim: tuple[int, int],
+        batch: graphics.Batch,
+        fps: float = 10,
+        max_overlays: int = 64,
+    ) -> None:
+        self.x, self.y = corner
+        self.width, self.height = dim
+        self.batch = batch
+        self.interval = 1 / fps
+        self.last_upload = 0.0
+        self.texture: image.Texture | None = None
+        self.sprite: sprite.Sprite | None = None
+        self.frame: np.ndarray | None = None
+        self.markers: dict[int, np.ndarray] = {}
+        self.pegs: dict[str, list[tuple[int, int]]] = {}
+        self.marker_dots = [
+            shapes.Circle(0, 0, 4, color=(255, 200, 0, 255), batch=batch, group=OVERLAY)
+            for _ in range(max_overlays)
         ]
+        self.peg_dots = [
+            shapes.Circle(0, 0, 3, batch=batch, group=OVERLAY) for _ in range(max_overlays)
+        ]
+        for dot in (*self.marker_dots, *self.peg_dots):
+            dot.visible = False
+
+    def show(
+        self,
+        frame: np.ndarray,
+        markers: dict[int, np.ndarray],
+        pegs: dict[str, list[tuple[int, int]]],
+    ):
+        """
+        Sets the frame and detections to show. The frame is only uploaded when the panel is next drawn.
+        """
+        self.frame = frame
+        self.markers = markers
+        self.pegs = pegs
+
+    def update(self) -> bool:
+        """
+        Uploads the latest frame if one is pending and the panel is due.
+
+        Returns True if the panel changed.
+        """
+        now = time.perf_counter()
+        if self.frame is None or now - self.last_upload < self.interval:
+            return False
+        frame = np.ascontiguousarray(self.frame, dtype=np.uint8)
+        self.frame = None
+        self.last_upload = now
+        height, width = frame.shape[:2]
+
+        if self.texture is None or (self.texture.width, self.texture.height) != (width, height):
+            self.texture = image.Texture.create(width, height)
+            region = self.texture.get_transform(flip_y=True)
+            if self.sprite is not None:
+                self.sprite.delete()
+            self.sprite = sprite.Sprite(region, self.x, self.y + self.height, batch=self.batch, group=MARKERS)
+            self.sprite.scale_x = self.width / width
+            self.sprite.scale_y = self.height / height
 
-    def draw(self):
-        for fig in self.figures():
-            fig.draw()
+        gl.glBindTexture(self.texture.target, self.texture.id)
+        gl.glPixelStorei(gl.GL_UNPACK_ALIGNMENT, 1)
+        pixel_format = gl.GL_BGR if frame.ndim == 3 else gl.GL_RED
+        gl.glTexSubImage2D(
+            self.texture.target, 0, 0, 0, width, height,
+            pixel_format, gl.GL_UNSIGNED_BYTE, frame.ctypes.data,
+        )
+
+        scale_x, scale_y = self.width / width, self.height / height
+        corners = [corner for marker in self.markers.values() for corner in marker.reshape(-1, 2)]
+        for dot, corner in zip(self.marker_dots, corners):
+            dot.position = (self.x + corner[0] * scale_x, self.y + self.height - corner[1] * scale_y)
+        centers = [(clr, center) for clr, lst in self.pegs.items() for center in lst]
+        for dot, (clr, center) in zip(self.peg_dots, centers):
+            dot.position = (self.x + center[0] * scale_x, self.y + self.height - center[1] * scale_y)
+            dot.color = PEG_COLORS.get(clr, (255, 255, 255, 255))
+        for idx, dot in enumerate(self.marker_dots):
+            dot.visible = idx < len(corners)
+        for idx, dot in enumerate(self.peg_dots):
+            dot.visible = idx < len(centers)
+        return True
 
 
 class Interface(pyglet.window.Window):
-    def __init__(self):
+    """
+    The window showing both boards and the game status.
+
+    The window is only redrawn when something on it changed.
+    Otherwise a frame just handles the window events.
+
+    F3 toggles an overlay with the stage timings, when metrics are enabled.
+    """
+
+    def __init__(self, preview: bool = False):
         super().__init__()
         self.set_size(1800, 600)
         self.key_handler = pyglet.window.key.KeyStateHandler()
         self.push_handlers(self.key_handler)
+        self.batch = graphics.Batch()
+        self.dirty = True
 
-        x_size = 12
-        y_size = 7
+        x_size, y_size = TABLE.ui_size
         width = x_size * 50
         height = y_size * 55
 
@@ -159,6 +320,7 @@ class Interface(pyglet.window.Window):
             (x_size, y_size),
             (width, height),
             1,
+            self.batch,
         )
 
         self.board2 = InterfaceBoard(
@@ -169,7 +331,9 @@ class Interface(pyglet.window.Window):
             (x_size, y_size),
             (width, height),
             2,
+            self.batch,
         )
+        self.boards = {1: self.board1, 2: self.board2}
 
         self.status_text: text.DocumentLabel = text.Label(
             "",
@@ -181,54 +345,119 @@ class Interface(pyglet.window.Window):
             align="center",
             multiline=True,
             font_size=30,
+            batch=self.batch,
+            group=FOREGROUND,
         )
 
-    def next_frame(self):
-        self.dispatch_events()
-        self.clear()
-        self.board1.draw()
-        self.board2.draw()
-        self.status_text.draw()
-        self.flip()
-
-    def hit(self, player_num: int, coord: tuple[int, int]):
-        # coordinates are flipped because for the player it is flipped to the airtable
-        # when making guess on board2, we need to offset it, because given are full airtable coords
-        if player_num == 1:
-            self.board2.hit((coord[1], 13 - coord[0]))
-        else:
-            self.board1.hit((11 - coord[1], coord[0]))
+        self.metrics_text = text.Label(
+            "",
+            10,
+            self.height - 10,
+            width=900,
+            multiline=True,
+            anchor_y="top",
+            font_size=10,
+            color=(255, 255, 0, 255),
+            batch=self.batch,
+            group=OVERLAY,
+        )
+        self.metrics_text.visible = False
+        self.metrics_updated = 0.0
 
-    def miss(self, player_num: int, coord: tuple[int, int]):
-        if player_num == 1:
-            self.board2.miss((coord[1], 13 - coord[0]))
+        self.preview = None
+        if preview:
+            self.preview = CameraPreview(
+                (self.width // 2 - 220, self.height - 350), (440, 330), self.batch
+            )
+
+    def on_expose(self):
+        self.dirty = True
+
+    def on_key_press(self, symbol: int, modifiers: int):
+        if symbol == pyglet.window.key.F3 and metrics.enabled:
+            self.metrics_text.visible = not self.metrics_text.visible
+            self.dirty = True
         else:
-            self.board1.miss((11 - coord[1], coord[0]))
+            super().on_key_press(symbol, modifiers)
+
+    def on_resize(self, width: int, height: int):
+        super().on_resize(width, height)
+        self.dirty = True
+
+    def next_frame(self) -> bool:
+        """
+        Handles the window events and draws the window if anything changed.
+
+        Returns True if the window was drawn.
+        """
+        self.switch_to()
+        self.dispatch_events()
+        if self.preview is not None:
+            self.dirty |= self.preview.update()
+        if self.metrics_text.visible and time.perf_counter() - self.metrics_updated > 0.5:
+            self.metrics_updated = time.perf_counter()
+            self.metrics_text.text = metrics.overlay_text()
+            self.dirty = True
+        if not self.dirty:
+            return False
+        self.dirty = False
+        with metrics.span("ui_frame"):
+            self.clear()
+            self.batch.draw()
+            self.flip()
+        return True
+
+    def hit(self, coord: tuple[int, int]):
+        # the guess is shown on the board of the player owning the cell
+        board, cell = TABLE.to_ui(coord)
+        self.dirty |= self.boards[board].hit(cell)
+
+    def miss(self, coord: tuple[int, int]):
+        board, cell = TABLE.to_ui(coord)
+        self.dirty |= self.boards[board].miss(cell)
+
+    def show_pegs(self, pegs: dict[str, list[tuple[int, int]]]):
+        """
+        Shows the pegs placed on the table, given as color to board coordinates, and removes all others.
+        """
+        cells = {coord: color for color, coords in pegs.items() for coord in coords}
+        for (y, x), owner in np.ndenumerate(TABLE.owner):
+            cell = (int(TABLE.ui_x[y, x]), int(TABLE.ui_y[y, x]))
+            self.dirty |= self.boards[owner].peg(cell, cells.get((x, y)))
+
+    def reset(self):
+        self.board1.reset()
+        self.board2.reset()
+        self.dirty = True
 
     def handle_game_status(self, status: GameStatus):
         match status:
             case GameStatus.await_player1_guess:
-                self.status_text.text = "Awaiting guess from player 1"
+                status_text = "Awaiting guess from player 1"
             case GameStatus.await_player2_guess:
-                self.status_text.text = "Awaiting guess from player 2"
+                status_text = "Awaiting guess from player 2"
             case GameStatus.repeat_guess:
-                self.status_text.text = "Repeat guess, please guess again"
+                status_text = "Repeat guess, please guess again"
             case GameStatus.sunk_ship:
-                self.status_text.text = "A ship has been sunk"
+                status_text = "A ship has been sunk"
             case GameStatus.processing:
-                self.status_text.text = "Processing..."
+                status_text = "Processing..."
             case GameStatus.await_ship_confirmation:
-                self.status_text.text = (
+                status_text = (
                     "Awaiting for players to be ready.\n"
                     "Both players must set their guessing dials to 0,0 when ready."
                 )
+        if status_text != self.status_text.text:
+            # the label lays out into the current GL context, which is another window's when several tables run
+            self.switch_to()
+            self.status_text.text = status_text
+            self.dirty = True
 
 
 if __name__ == "__main__":
     i = Interface()
     last_time = time.perf_counter()
     filled = set()
-    player_num = 1
     game_state = GameStatus.await_player1_guess
     idx = 0
     state_lst = list(GameStatus)
@@ -240,20 +469,16 @@ if __name__ == "__main__":
             if idx >= len(state_lst):
                 idx = 0
             game_state = list(GameStatus)[idx]
-        if i.key_handler[pyglet.window.key._1]:
-            player_num = 1
-        if i.key_handler[pyglet.window.key._2]:
-            player_num = 2
         if i.key_handler[pyglet.window.key.M]:
             guess = (randint(0, 11), randint(0, 6))
             while guess in filled:
                 guess = (randint(0, 11), randint(0, 6))
-            i.miss(player_num, guess)
+            i.miss(guess)
         if i.key_handler[pyglet.window.key.H]:
             guess = (randint(0, 11), randint(0, 6))
             while guess in filled:
                 guess = (randint(0, 11), randint(0, 6))
-            i.hit(player_num, guess)
+            i.hit(guess)
         i.handle_game_status(game_state)
         elapsed_time = time.perf_counter() - last_time
         if elapsed_time > 1 / 60:
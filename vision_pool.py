@@ -0,0 +1,208 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from calibration import CalibrationProfile
+from camera import Camera, FrameAnalysis
+from events import events
+from metrics import metrics
+
+# the detections a worker can run on a frame. The markers are tracked from frame to frame,
+# so they are detected in the game process, where every frame is seen in order
+DETECTIONS = ("holes", "colors")
+
+
+class Detections:
+    """
+    Results of the detectors run on one frame in a worker, small enough to send back instead of the frame.
+
+    A detection that was not asked for is None.
+    """
+
+    __slots__ = ("holes", "colors")
+
+    def __init__(
+        self,
+        holes: list[tuple[float, float]] | None = None,
+        colors: dict[str, list[tuple[int, int]]] | None = None,
+    ) -> None:
+        self.holes = holes
+        self.colors = colors
+
+
+class FrameRing:
+    """
+    Frames of one camera in shared memory, in slots of a fixed shape the workers read by index.
+
+    A slot is busy from write until release, so a frame is never overwritten while a worker reads it.
+    """
+
+    def __init__(self, slots: int, shape: tuple[int, ...]) -> None:
+        self.shape = shape
+        self.memory = SharedMemory(create=True, size=slots * int(np.prod(shape)))
+        self.frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=self.memory.buf)
+        self.free = list(range(slots))
+        self.lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def write(self, image: np.ndarray) -> int | None:
+        """
+        Copies the image into a free slot.
+
+        Returns the slot, or None if every slot is busy.
+        """
+        with self.lock:
+            if not self.free:
+                return None
+            slot = self.free.pop()
+        self.frames[slot] = image
+        return slot
+
+    def release(self, slot: int):
+        with self.lock:
+            self.free.append(slot)
+
+    def close(self):
+        del self.frames
+        self.memory.close()
+        self.memory.unlink()
+
+
+class DetectorCamera(Camera):
+    """
+    The detectors of a camera in a worker process, without the camera itself.
+    """
+
+    def __init__(self, columns: range | None) -> None:
+        self.columns = columns
+        self.profile = None
+        self.profile_path = None
+        self.pegs: dict[str, list[tuple[int, int]]] = {}
+
+
+# state of a worker process: the rings it attached to and a detector per camera
+_rings: dict[str, tuple[SharedMemory, np.ndarray]] = {}
+_cameras: dict[int, DetectorCamera] = {}
+
+
+def _attach(name: str, slots: int, shape: tuple[int, ...]) -> np.ndarray:
+    if name not in _rings:
+        # the workers share the resource tracker of the pool, which unlinks the ring when it closes
+        memory = SharedMemory(name=name)
+        _rings[name] = (memory, np.ndarray((slots, *shape), dtype=np.uint8, buffer=memory.buf))
+    return _rings[name][1]
+
+
+def _detect(
+    name: str,
+    slots: int,
+    shape: tuple[int, ...],
+    slot: int,
+    key: int,
+    columns: range | None,
+    profile: CalibrationProfile | None,
+    detections: tuple[str, ...],
+) -> Detections:
+    """
+    Runs the detections on the frame in a slot of a ring. Runs in a worker process.
+    """
+    if key not in _cameras:
+        _cameras[key] = DetectorCamera(columns)
+    camera = _cameras[key]
+    camera.profile = profile
+    frame = FrameAnalysis(camera, _attach(name, slots, shape)[slot], 0)
+    return Detections(
+        frame.holes() if "holes" in detections else None,
+        frame.colors() if "colors" in detections else None,
+    )
+
+
+class VisionPool:
+    """
+    Runs the detectors in worker processes, so they use every core and do not stall the UI.
+
+    A captured frame is copied into a shared memory ring of its camera and the workers are
+    only sent the index of its slot, and send back the small Detections. Those fill the
+    detections of the frame, so reading them in the game process costs nothing.
+    Frames come out of results in the order they were submitted. A frame captured while
+    every slot is busy is skipped, so the workers falling behind never delays the newest frame.
+    """
+
+    def __init__(self, workers: int = 2) -> None:
+        self.workers = workers
+        # spawned workers start the same on every platform, and do not inherit the camera or the UI
+        self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        self.rings: dict[int, FrameRing] = {}
+        self.pending: asyncio.Queue[tuple[object, list[tuple[FrameAnalysis, Future]]]] = asyncio.Queue()
+
+    def ring(self, view: FrameAnalysis) -> FrameRing:
+        key = id(view.camera)
+        ring = self.rings.get(key)
+        if ring is None or ring.shape != view.image.shape:
+            if ring is not None:
+                ring.close()
+            ring = self.rings[key] = FrameRing(self.workers, view.image.shape)
+        return ring
+
+    def submit(self, frame, detections: tuple[str, ...] = DETECTIONS) -> bool:
+        """
+        Sends the views of a frame to the workers to run the given detections on.
+        A frame without detections to run is only queued, to come out of results in order.
+
+        Returns False if the frame is skipped because the workers are busy.
+        """
+        if not detections:
+            self.pending.put_nowait((frame, []))
+            return True
+        views = frame.views()
+        rings = [self.ring(view) for view in views]
+        slots = []
+        for ring, view in zip(rings, views):
+            slot = ring.write(view.image)
+            if slot is None:
+                for ring, slot in zip(rings, slots):
+                    ring.release(slot)
+                metrics.count("frames_skipped")
+                return False
+            slots.append(slot)
+
+        jobs = []
+        for ring, slot, view in zip(rings, slots, views):
+            camera = view.camera
+            future = self.executor.submit(
+                _detect, ring.name, self.workers, ring.shape, slot,
+                id(camera), camera.columns, camera.profile, detections,
+            )
+            future.add_done_callback(lambda _, ring=ring, slot=slot: ring.release(slot))
+            jobs.append((view, future))
+        self.pending.put_nowait((frame, jobs))
+        return True
+
+    async def results(self):
+        """
+        Yields the submitted frames in order, once their detections are done.
+        A frame a worker failed on is skipped.
+        """
+        while True:
+            frame, jobs = await self.pending.get()
+            try:
+                with metrics.span("vision_pool_wait"):
+                    for view, future in jobs:
+                        view.set_detections(await asyncio.wrap_future(future))
+            except Exception as e:
+                events.error(f"Vision worker failed on frame {frame.seq}: {e!r}", "vision_failed", seq=frame.seq, error=repr(e))
+                continue
+            yield frame
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+        for ring in self.rings.values():
+            ring.close()
+        self.rings.clear()